@@ -1,9 +1,21 @@
 import os
+import re
 import xml.etree.ElementTree as ET
-from transformers import MarianMTModel, MarianTokenizer
-import torch
 from xml.sax.saxutils import unescape, escape # Для работы с экранированным текстом
 import time # Для индикатора прогресса
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor # Пул процессов с репликами модели для CPU
+from translation_memory import TranslationMemory # Постоянная память переводов
+from translation_journal import TranslationJournal # Журнал для продолжения прерванного перевода
+import run_metrics # Метрики запуска (фазы, токены/с и паддинг по батчам)
+import glossary # Глоссарий терминов: точные совпадения без модели, термины в тексте под метками
+from segmentation import SentenceSegmenter # Разбиение длинных текстов на предложения
+from source_filter import SourceFilter # Отбор английских строк: русские, числа, идентификаторы - без модели
+from output_checks import find_degenerate_reason # Проверка вывода модели на зацикливание и выбросы по длине
+from translation_server import TranslationClient, CLIENT_TEXTS_PER_REQUEST # Клиент локального сервиса перевода
+# torch и transformers импортируются только там, где нужна модель (их импорт занимает секунды)
 
 # --- Конфигурация ---
 INPUT_XML_FILE = "translation_output_for_extractor/strings_for_translation.xml"
@@ -19,93 +31,610 @@ ATTEMPT_MODEL_TRANSLATION = True # True для перевода, False для "
 # \n для новой строки. Вы можете использовать что-то вроде " --- Original: " если хотите.
 TEXT_SEPARATOR = "\n---\n" # \n добавит перенос строки до и после
 
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {DEVICE}")
+# --- Память переводов (TM) ---
+# Переводы сохраняются по ключу (модель, нормализованный исходный текст) и переиспользуются
+# при следующих запусках: в модель попадают только строки, которых еще нет в памяти.
+USE_TRANSLATION_MEMORY = True
+TRANSLATION_MEMORY_FILE = "translation_output_final/translation_memory.sqlite"
+TRANSLATION_MEMORY_MAX_ENTRIES = 500000 # Сверх этого вытесняются давно не использованные записи (None = без ограничения)
+
+# --- Глоссарий ---
+# Тексты, целиком совпадающие с термином глоссария, переводятся без модели; термины внутри
+# длинных текстов заменяются метками и подставляются после перевода (см. glossary.py).
+# Нет файла - глоссарий не используется.
+USE_GLOSSARY = True
+GLOSSARY_FILE = glossary.GLOSSARY_FILE
+
+# --- Разбиение на предложения ---
+# Тексты длиннее SEGMENT_MIN_CHARS символов переводятся по предложениям и собираются обратно
+# (см. segmentation.py): длинные описания не обрезаются на MAX_INPUT_TOKENS, не раздувают паддинг батчей,
+# а повторяющиеся предложения переводятся один раз и находятся в памяти переводов.
+USE_SEGMENTATION = True
+SEGMENT_MIN_CHARS = 200
+
+# --- Отбор исходных строк ---
+# В модель идут только английские тексты; уже русские, числа, идентификаторы, строки из одной разметки
+# и тексты на других алфавитах остаются без изменений (см. source_filter.py). Число строк по категориям -
+# в отчете запуска (счетчики source_*).
+USE_SOURCE_FILTER = True
+
+# --- Журнал прогресса ---
+# Каждый переведенный батч сразу дописывается в журнал на диске. Если запуск упал или был остановлен,
+# следующий запуск с тем же входным файлом пропустит уже переведенное. После успешной записи XML журнал удаляется.
+# Журнал лежит рядом с выходным файлом (выходной файл + суффикс), поэтому шарды extract_text.py --shard-by
+# можно переводить независимо и параллельно - у каждого свой журнал.
+USE_TRANSLATION_JOURNAL = True
+TRANSLATION_JOURNAL_SUFFIX = ".journal.jsonl"
+
+# --- Батчи по длине ---
+# Тексты сортируются по длине в токенах и собираются в батчи по бюджету токенов
+# (число строк * длина самой длинной строки в батче), а не по фиксированному числу строк.
+# Короткие названия идут большими батчами, длинные описания - маленькими, меньше вычислений уходит на паддинг.
+# None - прежние батчи по BATCH_MAX_SENTENCES строк в исходном порядке.
+BATCH_MAX_TOKENS = 1024 # Меньше для CPU, больше для GPU
+BATCH_MAX_SENTENCES = 64 # Верхняя граница числа строк в одном батче
+MAX_INPUT_TOKENS = 512 # Длина, после которой вход обрезается токенизатором
+
+# --- Профили генерации ---
+# Параметры model.generate по имени профиля. Длина вывода ограничена длиной входа:
+# max_new_tokens = (самый длинный вход батча в токенах) * max_new_tokens_ratio + max_new_tokens_extra,
+# но не больше MAX_INPUT_TOKENS - зацикленный вывод обрывается, а не тянется до max_length модели.
+# "greedy"        - жадный поиск, основной быстрый путь;
+# "beam"          - поиск лучом с запретом повторов, для повторного перевода подозрительных строк;
+# "model_default" - настройки генерации из конфигурации модели (прежнее поведение), только с ограничением длины.
+GENERATION_PROFILES = {
+    "greedy": {"num_beams": 1, "max_new_tokens_ratio": 2.0, "max_new_tokens_extra": 10},
+    "beam": {"num_beams": 4, "no_repeat_ngram_size": 3, "repetition_penalty": 1.2, "max_new_tokens_ratio": 2.0, "max_new_tokens_extra": 10},
+    "model_default": {"max_new_tokens_ratio": 2.0, "max_new_tokens_extra": 10},
+}
+GENERATION_PROFILE = "greedy"
+# Переводы с зацикливанием, пустые или с подозрительной длиной (см. output_checks.py) переводятся заново
+# с этим профилем; новый перевод берется, только если он проходит проверку. None - без повтора.
+RETRY_GENERATION_PROFILE = "beam"
+
+# --- Пул процессов для CPU ---
+# Каждый процесс загружает свою копию модели и работает с THREADS_PER_WORKER потоками torch.
+# На многоядерных CPU несколько реплик масштабируются лучше, чем внутренние потоки одной модели.
+# 1 - перевод в текущем процессе (прежнее поведение). Переопределяется через --workers / --threads-per-worker.
+INFERENCE_WORKERS = 1
+THREADS_PER_WORKER = None # None = число ядер / INFERENCE_WORKERS
+PIN_WORKER_CPUS = True # Закреплять процессы за своими ядрами (только Linux)
+
+# --- Бэкенд инференса ---
+# "pytorch"      - MarianMTModel в fp32 (прежнее поведение)
+# "pytorch_int8" - та же модель с динамической int8-квантизацией Linear-слоев (только CPU)
+# "onnx"         - экспорт в ONNX и запуск через ONNX Runtime (нужен пакет optimum[onnxruntime])
+# Переопределяется через --backend. Сравнение скорости и расхождения переводов: benchmark_backends.py
+INFERENCE_BACKEND = "pytorch"
+# Сюда сохраняются экспортированные модели - в подпапку на каждую модель (см. onnx_model_dir),
+# чтобы после смены MODEL_NAME не загрузился экспорт прежней модели
+ONNX_MODEL_DIR = "translation_output_final/onnx_model"
+MODEL_LOCAL_FILES_ONLY = False # True - не ходить в сеть, брать модель только из локального кэша
+
+# --- Локальный сервис перевода ---
+# Адрес запущенного translation_server.py (например, "http://127.0.0.1:8765"). Если задан и сервер отвечает,
+# модель в этом процессе не загружается - тексты для модели уходят на сервер. Переопределяется через --server.
+TRANSLATION_SERVER_URL = None
+
+_device = None
+
+def get_device():
+    """Устройство для модели (cuda, если доступна); torch импортируется при первом вызове."""
+    global _device
+    if _device is None:
+        import torch
+        _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"Using device: {_device}")
+    return _device
 
 # --- Функции для модели (load_model_and_tokenizer без изменений) ---
-def load_model_and_tokenizer(model_name):
+def onnx_model_dir(model_name):
+    """Папка ONNX-экспорта модели: ONNX_MODEL_DIR/<имя модели без "/" и прочих недопустимых символов>."""
+    return os.path.join(ONNX_MODEL_DIR, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+
+def _load_onnx_model(model_name):
+    """Загружает ONNX-версию модели из onnx_model_dir(model_name), при первом запуске экспортирует ее туда."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    export_dir = onnx_model_dir(model_name)
+    if os.path.isdir(export_dir) and os.listdir(export_dir):
+        print(f"Loading ONNX model from {export_dir}...")
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+
+    print(f"Exporting {model_name} to ONNX (one-time) into {export_dir}...")
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, local_files_only=MODEL_LOCAL_FILES_ONLY)
+    model.save_pretrained(export_dir)
+    return model
+
+def load_model_and_tokenizer(model_name, backend=None):
+    backend = backend or INFERENCE_BACKEND
     print(f"Loading tokenizer for {model_name}...")
     try:
-        tokenizer = MarianTokenizer.from_pretrained(model_name)
-        print(f"Loading model {model_name}...")
-        model = MarianMTModel.from_pretrained(model_name)
-        model.to(DEVICE)
-        model.eval()
+        import torch
+        from transformers import MarianMTModel, MarianTokenizer
+        tokenizer = MarianTokenizer.from_pretrained(model_name, local_files_only=MODEL_LOCAL_FILES_ONLY)
+        print(f"Loading model {model_name} (backend: {backend})...")
+        if backend == "onnx":
+            model = _load_onnx_model(model_name)
+        else:
+            model = MarianMTModel.from_pretrained(model_name, local_files_only=MODEL_LOCAL_FILES_ONLY)
+            if backend == "pytorch_int8":
+                if get_device().type != "cpu":
+                    print("Warning: dynamic int8 quantization runs on CPU only, the model stays on CPU.")
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            elif backend == "pytorch":
+                model.to(get_device())
+            else:
+                raise ValueError(f"Unknown inference backend: {backend}")
+            model.eval()
         print("Model and tokenizer loaded.")
         return model, tokenizer
     except Exception as e:
         print(f"Error loading model/tokenizer: {e}")
         print("Ensure you have an internet connection for the first download, or the model is cached.")
         print("Try: pip install sentencepiece sacremoses")
+        if backend == "onnx":
+            print("The ONNX backend also needs: pip install optimum[onnxruntime]")
         return None, None
 
-def translate_texts_batch(texts_to_translate, model, tokenizer, batch_size=8):
-    if not model or not tokenizer:
+def load_tokenizer(model_name):
+    print(f"Loading tokenizer for {model_name}...")
+    try:
+        from transformers import MarianTokenizer
+        return MarianTokenizer.from_pretrained(model_name, local_files_only=MODEL_LOCAL_FILES_ONLY)
+    except Exception as e:
+        print(f"Error loading tokenizer: {e}")
+        print("Ensure you have an internet connection for the first download, or the model is cached.")
+        print("Try: pip install sentencepiece sacremoses")
+        return None
+
+# --- Пул процессов с репликами модели ---
+_worker_model = None
+_worker_tokenizer = None
+
+def _init_inference_worker(model_name, backend, threads_per_worker, worker_counter):
+    """Инициализатор процесса пула: ограничивает потоки, закрепляет ядра и загружает реплику модели."""
+    global _worker_model, _worker_tokenizer
+    import torch
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+
+    torch.set_num_threads(threads_per_worker)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass # Уже задано в этом процессе
+
+    if PIN_WORKER_CPUS and hasattr(os, "sched_setaffinity"):
+        available_cpus = sorted(os.sched_getaffinity(0))
+        first_cpu = (worker_index * threads_per_worker) % len(available_cpus)
+        worker_cpus = {available_cpus[(first_cpu + i) % len(available_cpus)] for i in range(threads_per_worker)}
+        os.sched_setaffinity(0, worker_cpus)
+
+    _worker_model, _worker_tokenizer = load_model_and_tokenizer(model_name, backend)
+
+def _translate_batch_in_worker(batch_texts, generation_profile=None):
+    """Переводит один батч в процессе пула. Возвращает список переводов или None при ошибке."""
+    if not _worker_model or not _worker_tokenizer:
+        print("Model or tokenizer not loaded in worker process.")
+        return None
+    try:
+        return _generate_batch(batch_texts, _worker_model, _worker_tokenizer, generation_profile)
+    except Exception as e:
+        print(f"Error translating batch starting with '{batch_texts[0][:30]}...' in worker: {e}")
+        return None
+
+def create_inference_pool(model_name, workers, threads_per_worker=None, backend=None):
+    """Создает пул из workers процессов, в каждом - своя копия модели."""
+    if not threads_per_worker:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Starting inference pool: {workers} workers x {threads_per_worker} threads...")
+    worker_counter = multiprocessing.Value("i", 0)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_inference_worker,
+        initargs=(model_name, backend or INFERENCE_BACKEND, threads_per_worker, worker_counter),
+    )
+
+def plan_length_batches(token_lengths, max_batch_tokens, max_batch_size):
+    """Группирует индексы текстов в батчи по длине.
+
+    Индексы сортируются по убыванию длины, батч растет, пока (число строк) * (длина первой,
+    самой длинной строки) укладывается в max_batch_tokens и строк не больше max_batch_size.
+    """
+    order = sorted(range(len(token_lengths)), key=lambda i: -token_lengths[i])
+    batches = []
+    current_batch = []
+    current_max_length = 0
+    for index in order:
+        length = max(token_lengths[index], 1)
+        if current_batch and ((len(current_batch) + 1) * current_max_length > max_batch_tokens
+                              or len(current_batch) >= max_batch_size):
+            batches.append(current_batch)
+            current_batch = []
+        if not current_batch:
+            current_max_length = length
+        current_batch.append(index)
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+def load_glossary():
+    """Глоссарий по настройкам USE_GLOSSARY / GLOSSARY_FILE или None."""
+    return glossary.load_glossary(GLOSSARY_FILE) if USE_GLOSSARY else None
+
+def create_source_filter():
+    """Отбор исходных строк по настройке USE_SOURCE_FILTER или None."""
+    return SourceFilter() if USE_SOURCE_FILTER else None
+
+def create_segmenter():
+    """Разбиение на предложения по настройкам USE_SEGMENTATION / SEGMENT_MIN_CHARS или None."""
+    return SentenceSegmenter(SEGMENT_MIN_CHARS) if USE_SEGMENTATION else None
+
+def connect_translation_server(server_url=None):
+    """Клиент сервиса перевода, если адрес задан (аргументом или TRANSLATION_SERVER_URL) и сервер отвечает, иначе None.
+
+    Сервер с другой моделью не используется: его переводы попали бы в память переводов под ключом MODEL_NAME.
+    """
+    server_url = server_url or TRANSLATION_SERVER_URL
+    if not server_url:
+        return None
+    client = TranslationClient(server_url)
+    server_info = client.health()
+    if server_info is None:
+        print(f"Translation server {server_url} is not responding, the model will be loaded locally.")
+        return None
+    if server_info.get("model") != MODEL_NAME:
+        print(f"Translation server {server_url} runs {server_info.get('model')}, not {MODEL_NAME}; the model will be loaded locally.")
+        return None
+    print(f"Using translation server {server_url} (model {server_info.get('model')}, backend {server_info.get('backend')}).")
+    return client
+
+def translate_texts_batch(texts_to_translate, model, tokenizer, batch_size=8, translation_memory=None, max_batch_tokens=None, inference_pool=None, on_batch_translated=None, glossary=None, translation_client=None, segmenter=None, source_filter=None):
+    """Переводит тексты; при наличии translation_memory в модель уходят только промахи TM.
+
+    Если передан inference_pool (см. create_inference_pool), батчи переводятся в его процессах,
+    а model может быть None - в текущем процессе нужен только токенизатор.
+
+    Если задан max_batch_tokens, батчи собираются по длине в токенах (см. plan_length_batches),
+    а batch_size ограничивает число строк в батче. Порядок результатов совпадает с входным.
+    Одинаковые исходные строки переводятся один раз, результат раздается всем их вхождениям.
+    on_batch_translated(indices, translations) вызывается после каждого успешно переведенного батча
+    с индексами во входном списке - например, для журнала прогресса (см. translation_journal.py).
+    Если передан glossary (см. glossary.py), совпадения с терминами переводятся без модели,
+    а термины внутри текстов переводятся по глоссарию.
+    Если передан translation_client (см. connect_translation_server), тексты для модели
+    переводит локальный сервис, а model и tokenizer не нужны.
+    Если передан segmenter (см. segmentation.py), длинные тексты переводятся по предложениям
+    (глоссарий, дедупликация и память переводов работают уже с предложениями).
+    Если передан source_filter (см. source_filter.py), в перевод идут только английские тексты,
+    остальные возвращаются без изменений.
+    """
+    if source_filter is not None:
+        def translate_english_texts(texts, on_translated):
+            return translate_texts_batch(texts, model, tokenizer, batch_size, translation_memory, max_batch_tokens, inference_pool, on_translated, glossary, translation_client, segmenter)
+        stats_before = dict(source_filter.stats)
+        translations = source_filter.translate(texts_to_translate, translate_english_texts, on_batch_translated)
+        run_metrics.add_counts(**{f"source_{category}": value - stats_before[category] for category, value in source_filter.stats.items()})
+        return translations
+    if segmenter is not None:
+        def translate_without_segmentation(texts, on_translated):
+            return translate_texts_batch(texts, model, tokenizer, batch_size, translation_memory, max_batch_tokens, inference_pool, on_translated, glossary, translation_client)
+        stats_before = dict(segmenter.stats)
+        translations = segmenter.translate(texts_to_translate, translate_without_segmentation, on_batch_translated)
+        run_metrics.add_counts(**{f"segmentation_{name}": value - stats_before[name] for name, value in segmenter.stats.items()})
+        return translations
+    if glossary is not None and len(glossary):
+        def translate_without_glossary(texts, on_translated):
+            return translate_texts_batch(texts, model, tokenizer, batch_size, translation_memory, max_batch_tokens, inference_pool, on_translated, translation_client=translation_client)
+        stats_before = dict(glossary.stats)
+        translations = glossary.translate(texts_to_translate, translate_without_glossary, on_batch_translated)
+        run_metrics.add_counts(**{f"glossary_{name}": value - stats_before[name] for name, value in glossary.stats.items()})
+        return translations
+    unique_texts, occurrence_indices = deduplicate_texts(texts_to_translate)
+    if len(unique_texts) < len(texts_to_translate):
+        saved_count = len(texts_to_translate) - len(unique_texts)
+        print(f"Deduplication: {len(texts_to_translate)} texts -> {len(unique_texts)} unique ({saved_count} duplicate translations saved).")
+        unique_callback = None
+        if on_batch_translated is not None:
+            input_indices_by_unique = [[] for _ in unique_texts]
+            for input_index, unique_index in enumerate(occurrence_indices):
+                input_indices_by_unique[unique_index].append(input_index)
+
+            def unique_callback(unique_indices, translations):
+                fanned_indices, fanned_translations = [], []
+                for unique_index, translated_text in zip(unique_indices, translations):
+                    for input_index in input_indices_by_unique[unique_index]:
+                        fanned_indices.append(input_index)
+                        fanned_translations.append(translated_text)
+                on_batch_translated(fanned_indices, fanned_translations)
+
+        unique_translations = _translate_unique_texts(unique_texts, model, tokenizer, batch_size, translation_memory, max_batch_tokens, inference_pool, unique_callback, translation_client)
+        return [unique_translations[i] for i in occurrence_indices]
+    return _translate_unique_texts(texts_to_translate, model, tokenizer, batch_size, translation_memory, max_batch_tokens, inference_pool, on_batch_translated, translation_client)
+
+def deduplicate_texts(texts):
+    """Возвращает (уникальные тексты в порядке первого появления, индекс уникального текста для каждого входа)."""
+    unique_index_by_text = {}
+    unique_texts = []
+    occurrence_indices = []
+    for text in texts:
+        unique_index = unique_index_by_text.get(text)
+        if unique_index is None:
+            unique_index = len(unique_texts)
+            unique_index_by_text[text] = unique_index
+            unique_texts.append(text)
+        occurrence_indices.append(unique_index)
+    return unique_texts, occurrence_indices
+
+def _translate_unique_texts(texts_to_translate, model, tokenizer, batch_size, translation_memory, max_batch_tokens, inference_pool, on_batch_translated=None, translation_client=None):
+    if translation_memory is None:
+        return _translate_texts_with_model(texts_to_translate, model, tokenizer, batch_size, max_batch_tokens, inference_pool, on_batch_translated, translation_client)
+
+    translations = translation_memory.lookup_many(texts_to_translate)
+    miss_indices = [i for i, translation in enumerate(translations) if translation is None]
+    print(f"Translation memory: {len(texts_to_translate) - len(miss_indices)} hits, {len(miss_indices)} texts left for the model.")
+    if on_batch_translated is not None:
+        hit_indices = [i for i, translation in enumerate(translations) if translation is not None]
+        if hit_indices:
+            on_batch_translated(hit_indices, [translations[i] for i in hit_indices])
+    if not miss_indices:
+        return translations
+
+    miss_texts = [texts_to_translate[i] for i in miss_indices]
+    miss_callback = None
+    if on_batch_translated is not None:
+        def miss_callback(local_indices, batch_translations):
+            on_batch_translated([miss_indices[i] for i in local_indices], batch_translations)
+    miss_translations = _translate_texts_with_model(miss_texts, model, tokenizer, batch_size, max_batch_tokens, inference_pool, miss_callback, translation_client)
+    new_pairs = []
+    for index, source_text, translated_text in zip(miss_indices, miss_texts, miss_translations):
+        translations[index] = translated_text
+        # Маркеры ошибок, пустые результаты и вырожденные переводы, которые не исправил повтор,
+        # в память не попадают - иначе они отдавались бы как попадания без проверки
+        if (translated_text and not translated_text.startswith(("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]"))
+                and find_degenerate_reason(source_text, translated_text) is None):
+            new_pairs.append((source_text, translated_text))
+    translation_memory.store_many(new_pairs)
+    return translations
+
+def generation_options(generation_profile, source_length):
+    """Аргументы model.generate для профиля из GENERATION_PROFILES и длины входа в токенах."""
+    options = dict(GENERATION_PROFILES[generation_profile])
+    ratio = options.pop("max_new_tokens_ratio", None)
+    extra = options.pop("max_new_tokens_extra", 0)
+    if ratio:
+        options["max_new_tokens"] = min(int(source_length * ratio) + extra, MAX_INPUT_TOKENS)
+    return options
+
+def _generate_batch(batch_texts, model, tokenizer, generation_profile=None):
+    """Прогоняет один батч через модель и возвращает переводы в том же порядке."""
+    try:
+        import torch
+        inference_context = torch.no_grad()
+    except ImportError:
+        inference_context = contextlib.nullcontext() # Без torch модель - не модуль torch (заглушки в benchmark_pipeline.py)
+    tokenized_batch = tokenizer(batch_texts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_TOKENS).to(model.device)
+    # Длина дополненного батча; len() работает и с тензорами, и со списками (заглушки токенизатора)
+    options = generation_options(generation_profile or GENERATION_PROFILE, len(tokenized_batch["input_ids"][0]))
+    with inference_context:
+        translated_tokens = model.generate(**tokenized_batch, **options)
+    return tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)
+
+def _translate_texts_with_server(texts_to_translate, translation_client, on_batch_translated=None):
+    """Переводит тексты через локальный сервис частями по CLIENT_TEXTS_PER_REQUEST (батчи по длине собирает сервер)."""
+    total_texts = len(texts_to_translate)
+    translations = [""] * total_texts
+    indices_to_translate = [i for i, text in enumerate(texts_to_translate) if text.strip()]
+    print(f"Sending {len(indices_to_translate)} texts to the translation server in requests of up to {CLIENT_TEXTS_PER_REQUEST}...")
+    start_time_total = time.time()
+    processed_count = total_texts - len(indices_to_translate)
+    for start in range(0, len(indices_to_translate), CLIENT_TEXTS_PER_REQUEST):
+        request_indices = indices_to_translate[start:start + CLIENT_TEXTS_PER_REQUEST]
+        request_texts = [texts_to_translate[i] for i in request_indices]
+        processed_count += len(request_indices)
+        try:
+            start_time_request = time.time()
+            request_translations = translation_client.translate(request_texts)
+            for index, translated_text in zip(request_indices, request_translations):
+                translations[index] = translated_text
+            if on_batch_translated is not None:
+                # Сервер отвечает 200 и при ошибке батча на своей стороне - тексты с маркерами ошибок
+                # в журнал не передаются, как и неудачные батчи при переводе в этом процессе
+                reported = [(index, translated_text) for index, translated_text in zip(request_indices, request_translations)
+                            if not translated_text.startswith(("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]"))]
+                if reported:
+                    on_batch_translated([index for index, _ in reported], [translated_text for _, translated_text in reported])
+            elapsed_total = time.time() - start_time_total
+            print(f"  Progress: {processed_count}/{total_texts} ({processed_count / total_texts * 100:.2f}%) | Request: {len(request_indices)} texts | Request time: {time.time() - start_time_request:.2f}s | Total time: {elapsed_total:.2f}s")
+        except Exception as e:
+            print(f"Error translating request starting with '{request_texts[0][:30]}...' on the server: {e}")
+            for index, text in zip(request_indices, request_texts):
+                translations[index] = f"[TRANSLATION_ERROR] {text}"
+    print(f"Translation finished for {total_texts} texts. Total time: {time.time() - start_time_total:.2f}s")
+    return translations
+
+def _translate_texts_with_model(texts_to_translate, model, tokenizer, batch_size=8, max_batch_tokens=None, inference_pool=None, on_batch_translated=None, translation_client=None, generation_profile=None, retry_degenerate=True):
+    """Переводит тексты моделью (или сервисом перевода) батчами.
+
+    generation_profile - имя профиля из GENERATION_PROFILES (по умолчанию GENERATION_PROFILE).
+    Если retry_degenerate, вырожденные переводы (см. output_checks.py) переводятся заново
+    с RETRY_GENERATION_PROFILE; on_batch_translated получает их уже после повтора.
+    """
+    if translation_client is not None:
+        return _translate_texts_with_server(texts_to_translate, translation_client, on_batch_translated)
+    if not tokenizer or (not model and inference_pool is None):
         print("Model or tokenizer not loaded, skipping translation.")
         return [f"[MODEL_NOT_LOADED] {text}" for text in texts_to_translate]
 
-    translations = []
     total_texts = len(texts_to_translate)
-    print(f"Starting translation for {total_texts} texts with batch_size={batch_size}...")
+    translations = [""] * total_texts
+    # Пустые строки в модель не отправляем
+    indices_to_translate = [i for i, text in enumerate(texts_to_translate) if text.strip()]
+
+    if max_batch_tokens:
+        texts_for_lengths = [texts_to_translate[i] for i in indices_to_translate]
+        token_lengths = [min(len(ids), MAX_INPUT_TOKENS) for ids in tokenizer(texts_for_lengths, truncation=True, max_length=MAX_INPUT_TOKENS)["input_ids"]] if texts_for_lengths else []
+        batches = [[indices_to_translate[j] for j in batch] for batch in plan_length_batches(token_lengths, max_batch_tokens, batch_size)]
+        print(f"Starting translation for {total_texts} texts in {len(batches)} length-sorted batches (max {max_batch_tokens} tokens, max {batch_size} texts per batch)...")
+    else:
+        batches = [indices_to_translate[i:i+batch_size] for i in range(0, len(indices_to_translate), batch_size)]
+        print(f"Starting translation for {total_texts} texts with batch_size={batch_size}...")
     start_time_total = time.time()
+    processed_count = total_texts - len(indices_to_translate)
+    retry_profile = RETRY_GENERATION_PROFILE if retry_degenerate and RETRY_GENERATION_PROFILE != (generation_profile or GENERATION_PROFILE) else None
+    degenerate_indices = []
+    degenerate_reasons = {}
 
-    for i in range(0, total_texts, batch_size):
-        batch_original_texts = texts_to_translate[i:i+batch_size]
-        
-        if not any(t.strip() for t in batch_original_texts):
-            translations.extend([""] * len(batch_original_texts))
-            if i + batch_size >= total_texts: # Прогресс для последнего батча, если он пустой
-                elapsed_total = time.time() - start_time_total
-                print(f"  Progress: {total_texts}/{total_texts} (100.00%) | Total time: {elapsed_total:.2f}s")
-            continue
+    batch_texts_list = [[texts_to_translate[i] for i in batch_indices] for batch_indices in batches]
+    if run_metrics.is_active():
+        # Длины в токенах для метрик батчей (при батчах по длине они уже посчитаны)
+        if max_batch_tokens:
+            token_length_by_index = dict(zip(indices_to_translate, token_lengths))
+        else:
+            texts_for_lengths = [texts_to_translate[i] for i in indices_to_translate]
+            measured_lengths = tokenizer(texts_for_lengths, truncation=True, max_length=MAX_INPUT_TOKENS)["input_ids"] if texts_for_lengths else []
+            token_length_by_index = {index: len(ids) for index, ids in zip(indices_to_translate, measured_lengths)}
+    if inference_pool is not None:
+        # Батчи уже отсортированы от длинных к коротким - длинные уходят в работу первыми,
+        # процессы разбирают их по мере освобождения, map возвращает результаты по порядку.
+        batch_results = inference_pool.map(_translate_batch_in_worker, batch_texts_list, [generation_profile] * len(batch_texts_list))
+    else:
+        batch_results = None
 
+    for batch_number, batch_indices in enumerate(batches):
+        batch_original_texts = batch_texts_list[batch_number]
+        processed_count += len(batch_indices)
         try:
             start_time_batch = time.time()
-            tokenized_batch = tokenizer(batch_original_texts, return_tensors="pt", padding=True, truncation=True, max_length=512).to(DEVICE)
-            with torch.no_grad():
-                translated_tokens = model.generate(**tokenized_batch)
-            batch_translations = tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)
-            translations.extend(batch_translations)
+            if batch_results is not None:
+                batch_translations = next(batch_results)
+                if batch_translations is None:
+                    raise RuntimeError("batch failed in worker process")
+            else:
+                batch_translations = _generate_batch(batch_original_texts, model, tokenizer, generation_profile)
+            reported_indices = []
+            for index, translated_text in zip(batch_indices, batch_translations):
+                translations[index] = translated_text
+                reason = find_degenerate_reason(texts_to_translate[index], translated_text) if retry_profile else None
+                if reason:
+                    degenerate_indices.append(index)
+                    degenerate_reasons[reason] = degenerate_reasons.get(reason, 0) + 1
+                else:
+                    reported_indices.append(index)
+            if on_batch_translated is not None and reported_indices:
+                on_batch_translated(reported_indices, [translations[i] for i in reported_indices])
             
             # Индикатор прогресса
-            processed_count = min(i + batch_size, total_texts)
             percentage = (processed_count / total_texts) * 100
             elapsed_batch = time.time() - start_time_batch
+            if run_metrics.is_active():
+                _record_batch_metrics(batch_number, [token_length_by_index[i] for i in batch_indices], elapsed_batch)
             elapsed_total = time.time() - start_time_total
-            
-            # Печатаем прогресс каждые N батчей или в конце
-            # (i // batch_size) + 1 -- это номер текущего батча (начиная с 1)
-            if (i // batch_size + 1) % 1 == 0 or processed_count == total_texts: # Печатать для каждого батча
-                print(f"  Progress: {processed_count}/{total_texts} ({percentage:.2f}%) | Batch time: {elapsed_batch:.2f}s | Total time: {elapsed_total:.2f}s")
+            print(f"  Progress: {processed_count}/{total_texts} ({percentage:.2f}%) | Batch: {len(batch_indices)} texts | Batch time: {elapsed_batch:.2f}s | Total time: {elapsed_total:.2f}s")
 
         except Exception as e:
             print(f"Error translating batch starting with '{batch_original_texts[0][:30]}...': {e}")
-            translations.extend([f"[TRANSLATION_ERROR] {text}" for text in batch_original_texts])
+            for index, text in zip(batch_indices, batch_original_texts):
+                translations[index] = f"[TRANSLATION_ERROR] {text}"
             # Обновляем прогресс даже при ошибке
-            processed_count = min(i + batch_size, total_texts)
             percentage = (processed_count / total_texts) * 100
             elapsed_total = time.time() - start_time_total
             print(f"  Progress: {processed_count}/{total_texts} ({percentage:.2f}%) | ERROR IN BATCH | Total time: {elapsed_total:.2f}s")
 
     print(f"Translation finished for {total_texts} texts. Total time: {time.time() - start_time_total:.2f}s")
+    if degenerate_indices:
+        _retry_degenerate_translations(texts_to_translate, translations, degenerate_indices, degenerate_reasons, retry_profile,
+                                       model, tokenizer, batch_size, max_batch_tokens, inference_pool, on_batch_translated)
     return translations
 
+def _retry_degenerate_translations(texts_to_translate, translations, degenerate_indices, degenerate_reasons, retry_profile,
+                                   model, tokenizer, batch_size, max_batch_tokens, inference_pool, on_batch_translated):
+    """Переводит вырожденные переводы заново профилем retry_profile и заменяет те, что прошли проверку."""
+    reasons_text = ", ".join(f"{reason}: {count}" for reason, count in sorted(degenerate_reasons.items()))
+    print(f"Degenerate outputs: {len(degenerate_indices)} flagged ({reasons_text}), retrying with generation profile '{retry_profile}'...")
+    retry_texts = [texts_to_translate[i] for i in degenerate_indices]
+    retried = _translate_texts_with_model(retry_texts, model, tokenizer, batch_size, max_batch_tokens, inference_pool,
+                                          generation_profile=retry_profile, retry_degenerate=False)
+    fixed_count = 0
+    for index, source_text, retried_text in zip(degenerate_indices, retry_texts, retried):
+        if not retried_text.startswith(("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]")) and find_degenerate_reason(source_text, retried_text) is None:
+            translations[index] = retried_text
+            fixed_count += 1
+    if on_batch_translated is not None:
+        on_batch_translated(degenerate_indices, [translations[i] for i in degenerate_indices])
+    run_metrics.add_counts(degenerate_outputs=len(degenerate_indices), degenerate_fixed=fixed_count)
+    print(f"Degenerate outputs: {fixed_count} of {len(degenerate_indices)} fixed by the retry, the rest keep the first translation.")
+
+def _record_batch_metrics(batch_number, token_lengths, seconds):
+    tokens = sum(token_lengths)
+    padded_tokens = len(token_lengths) * max(token_lengths)
+    run_metrics.record(
+        "batches", batch=batch_number, texts=len(token_lengths), tokens=tokens, padded_tokens=padded_tokens,
+        padding_ratio=round(1 - tokens / padded_tokens, 4) if padded_tokens else 0.0,
+        seconds=round(seconds, 4), tokens_per_second=round(tokens / seconds, 1) if seconds else None,
+    )
+    run_metrics.add_counts(batches=1, tokens=tokens, padded_tokens=padded_tokens)
+
+def translate_with_journal(original_texts, model, tokenizer, journal, **translate_options):
+    """Переводит только то, чего еще нет в журнале, и собирает итог из журнала."""
+    journaled_translations = journal.load(original_texts)
+    pending_indices = [i for i in range(len(original_texts)) if i not in journaled_translations]
+    if journaled_translations:
+        print(f"Resuming from journal {journal.journal_path}: {len(journaled_translations)} of {len(original_texts)} texts already translated, {len(pending_indices)} left.")
+
+    pending_texts = [original_texts[i] for i in pending_indices]
+
+    def journal_batch(local_indices, batch_translations):
+        input_indices = [pending_indices[i] for i in local_indices]
+        journal.append_batch(input_indices, [original_texts[i] for i in input_indices], batch_translations)
+
+    pending_results = []
+    if pending_texts:
+        pending_results = translate_texts_batch(pending_texts, model, tokenizer, on_batch_translated=journal_batch, **translate_options)
+
+    # Итог берется из журнала; батчи с ошибкой в журнал не попадают - для них остается маркер ошибки
+    pending_results_by_index = dict(zip(pending_indices, pending_results))
+    return [journal.translations.get(i, pending_results_by_index.get(i)) for i in range(len(original_texts))]
+
 # --- Основная логика ---
-def main():
+def main(workers=INFERENCE_WORKERS, threads_per_worker=THREADS_PER_WORKER, backend=INFERENCE_BACKEND, input_path=None, output_path=None, server_url=None):
+    """Переводит входной XML extract_text.py. input_path/output_path - для перевода отдельных файлов разбиения
+    (extract_text.py --shard-by), по умолчанию INPUT_XML_FILE и OUTPUT_XML_FILE_TRANSLATED.
+    server_url - перевод через translation_server.py без загрузки модели в этом процессе."""
     model, tokenizer = None, None
-    if ATTEMPT_MODEL_TRANSLATION:
-        model, tokenizer = load_model_and_tokenizer(MODEL_NAME)
-        if not model or not tokenizer:
+    inference_pool = None
+    translation_client = connect_translation_server(server_url) if ATTEMPT_MODEL_TRANSLATION else None
+    if ATTEMPT_MODEL_TRANSLATION and translation_client is None:
+        with run_metrics.phase("load_model"):
+            if workers > 1:
+                # Модель загружают процессы пула, здесь нужен только токенизатор для планирования батчей
+                tokenizer = load_tokenizer(MODEL_NAME)
+                if tokenizer:
+                    inference_pool = create_inference_pool(MODEL_NAME, workers, threads_per_worker, backend)
+            else:
+                model, tokenizer = load_model_and_tokenizer(MODEL_NAME, backend)
+        if not tokenizer or (not model and inference_pool is None):
             print("Failed to load model. Translation will be skipped, structure will be 'Original Text [SEPARATOR] Original Text'.")
 
     try:
-        tree = ET.parse(INPUT_XML_FILE)
-        root = tree.getroot()
+        _run_translation(model, tokenizer, inference_pool, input_path or INPUT_XML_FILE, output_path or OUTPUT_XML_FILE_TRANSLATED, translation_client)
+    finally:
+        if inference_pool is not None:
+            inference_pool.shutdown()
+
+def _run_translation(model, tokenizer, inference_pool, input_path, output_path, translation_client=None):
+
+    try:
+        with run_metrics.phase("parse_input"):
+            tree = ET.parse(input_path)
+            root = tree.getroot()
     except FileNotFoundError:
-        print(f"Error: Input file not found at {INPUT_XML_FILE}")
+        print(f"Error: Input file not found at {input_path}")
         return
     except ET.ParseError as e:
-        print(f"Error: Could not parse XML file {INPUT_XML_FILE}: {e}")
+        print(f"Error: Could not parse XML file {input_path}: {e}")
         return
     
     # Списки для текстов
@@ -131,15 +660,41 @@ def main():
 
     # Перевод (или использование оригинала если перевод выключен/не удался)
     translated_or_marked_texts = []
-    if ATTEMPT_MODEL_TRANSLATION and model and tokenizer:
-        translated_results = translate_texts_batch(original_texts_unescaped, model, tokenizer, batch_size=8) # Меньше батч для CPU, больше для GPU
+    model_ready = translation_client is not None or (tokenizer and (model or inference_pool is not None))
+    journal = None
+    if ATTEMPT_MODEL_TRANSLATION and model_ready:
+        translation_memory = None
+        if USE_TRANSLATION_MEMORY:
+            translation_memory = TranslationMemory(TRANSLATION_MEMORY_FILE, MODEL_NAME, TRANSLATION_MEMORY_MAX_ENTRIES)
+        term_glossary = load_glossary()
+        segmenter = create_segmenter()
+        source_filter = create_source_filter()
+        translate_options = dict(batch_size=BATCH_MAX_SENTENCES, translation_memory=translation_memory, max_batch_tokens=BATCH_MAX_TOKENS, inference_pool=inference_pool, glossary=term_glossary, translation_client=translation_client, segmenter=segmenter, source_filter=source_filter)
+        try:
+            with run_metrics.phase("translate", texts=len(original_texts_unescaped)):
+                if USE_TRANSLATION_JOURNAL:
+                    journal = TranslationJournal(output_path + TRANSLATION_JOURNAL_SUFFIX)
+                    translated_results = translate_with_journal(original_texts_unescaped, model, tokenizer, journal, **translate_options)
+                else:
+                    translated_results = translate_texts_batch(original_texts_unescaped, model, tokenizer, **translate_options)
+        finally:
+            if journal is not None:
+                journal.close() # Записанное остается в журнале для следующего запуска
+            if translation_memory is not None:
+                translation_memory.close()
+        if term_glossary is not None:
+            print(term_glossary.summary())
+        if segmenter is not None:
+            print(segmenter.summary())
+        if source_filter is not None:
+            print(source_filter.summary())
         if len(translated_results) == len(original_texts_unescaped):
             translated_or_marked_texts = translated_results
         else:
             print("Error: Mismatch in count of translated texts. Using originals as fallback for structure.")
             translated_or_marked_texts = original_texts_unescaped
     else:
-        if ATTEMPT_MODEL_TRANSLATION and (not model or not tokenizer):
+        if ATTEMPT_MODEL_TRANSLATION and not model_ready:
             print("Model translation was requested but model/tokenizer failed to load. Using original texts for structure.")
         else:
             print("Model translation is disabled. Using original texts for structure.")
@@ -176,16 +731,32 @@ def main():
 
     # Сохраняем
     try:
-        os.makedirs(os.path.dirname(OUTPUT_XML_FILE_TRANSLATED), exist_ok=True)
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
         # Для "красивой" печати на Python 3.9+
-        if hasattr(ET, 'indent'):
-            ET.indent(tree)
-        tree.write(OUTPUT_XML_FILE_TRANSLATED, encoding="utf-8", xml_declaration=True)
-        print(f"Processed XML with inline originals saved to: {os.path.abspath(OUTPUT_XML_FILE_TRANSLATED)}")
+        with run_metrics.phase("write_output", texts=len(elements_to_update)):
+            if hasattr(ET, 'indent'):
+                ET.indent(tree)
+            tree.write(output_path, encoding="utf-8", xml_declaration=True)
+        print(f"Processed XML with inline originals saved to: {os.path.abspath(output_path)}")
+        if journal is not None:
+            journal.remove()
     except Exception as e:
         print(f"Error saving XML file: {e}")
         if "ET.indent" in str(e) and not hasattr(ET, 'indent'):
              print("Note: ET.indent(tree) for pretty printing is available in Python 3.9+. Try commenting it out if you use an older version.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Translate extracted Barotrauma strings with MarianMT")
+    parser.add_argument("--input", default=INPUT_XML_FILE, help="Extracted strings file (or one shard of it)")
+    parser.add_argument("--output", default=OUTPUT_XML_FILE_TRANSLATED, help="Translated file to write")
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS, help="Number of model replica processes (1 = translate in this process)")
+    parser.add_argument("--threads-per-worker", type=int, default=THREADS_PER_WORKER, help="Torch threads per worker process (default: CPU count / workers)")
+    parser.add_argument("--backend", choices=["pytorch", "pytorch_int8", "onnx"], default=INFERENCE_BACKEND, help="Inference backend")
+    parser.add_argument("--server", default=TRANSLATION_SERVER_URL, help="URL of a running translation_server.py (no local model load)")
+    parser.add_argument("--metrics", action="store_true", default=run_metrics.COLLECT_METRICS, help="Write a JSON/CSV run report (see run_metrics.py)")
+    parser.add_argument("--profile", choices=run_metrics.PROFILER_CHOICES, default=run_metrics.PROFILER, help="Profile the run")
+    args = parser.parse_args()
+    with run_metrics.run("Helsinki", args.metrics, args.profile):
+        main(workers=args.workers, threads_per_worker=args.threads_per_worker, backend=args.backend, input_path=args.input, output_path=args.output, server_url=args.server)
\ No newline at end of file
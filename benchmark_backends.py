@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import random
+import argparse
+import difflib
+import xml.etree.ElementTree as ET
+
+import Helsinki
+
+# Сравнение бэкендов инференса Helsinki.py (pytorch / pytorch_int8 / onnx):
+# скорость перевода и расхождение переводов с эталонным fp32 PyTorch на фиксированной
+# выборке исходных (английских) половин записей Language/Russian/Russian.xml.
+
+# --- Конфигурация ---
+SAMPLE_XML_FILE = "Language/Russian/Russian.xml"
+SAMPLE_SIZE = 200
+SAMPLE_SEED = 1234 # Фиксированное зерно - выборка одинакова между запусками
+REFERENCE_BACKEND = "pytorch"
+BENCHMARK_BACKENDS = ["pytorch", "pytorch_int8", "onnx"]
+OUTPUT_JSON_FILE = "translation_output_final/benchmark_backends.json"
+# В Russian.xml перевод и оригинал разделены "---" (TEXT_SEPARATOR без переносов строк после clean.py)
+SAMPLE_SEPARATOR = "---"
+
+
+def load_sample_sources(xml_path, sample_size, seed):
+    """Берет исходные английские тексты из файла перевода и возвращает фиксированную выборку."""
+    root = ET.parse(xml_path).getroot()
+    sources = []
+    for element in root.iter():
+        if not element.text or SAMPLE_SEPARATOR not in element.text:
+            continue
+        source_text = element.text.split(SAMPLE_SEPARATOR, 1)[1].strip()
+        if source_text:
+            sources.append(source_text)
+    sources = sorted(set(sources))
+    if len(sources) > sample_size:
+        sources = random.Random(seed).sample(sources, sample_size)
+    return sources
+
+
+def benchmark_backend(backend, sources):
+    """Загружает модель с указанным бэкендом и переводит выборку. Возвращает (переводы, метрики)."""
+    load_start = time.time()
+    model, tokenizer = Helsinki.load_model_and_tokenizer(Helsinki.MODEL_NAME, backend)
+    load_seconds = time.time() - load_start
+    if not model or not tokenizer:
+        return None, {"backend": backend, "error": "model failed to load"}
+
+    translate_start = time.time()
+    translations = Helsinki.translate_texts_batch(
+        sources, model, tokenizer, batch_size=Helsinki.BATCH_MAX_SENTENCES, max_batch_tokens=Helsinki.BATCH_MAX_TOKENS
+    )
+    translate_seconds = time.time() - translate_start
+    return translations, {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "translate_seconds": round(translate_seconds, 3),
+        "texts_per_second": round(len(sources) / translate_seconds, 3) if translate_seconds else None,
+    }
+
+
+def translation_drift(reference_translations, translations):
+    """Доля точных совпадений и средняя посимвольная похожесть переводов с эталоном."""
+    exact_matches = 0
+    similarity_total = 0.0
+    for reference, candidate in zip(reference_translations, translations):
+        if reference == candidate:
+            exact_matches += 1
+            similarity_total += 1.0
+        else:
+            similarity_total += difflib.SequenceMatcher(None, reference, candidate).ratio()
+    count = len(reference_translations) or 1
+    return {
+        "exact_match_rate": round(exact_matches / count, 4),
+        "mean_similarity": round(similarity_total / count, 4),
+    }
+
+
+def main(backends, sample_size, output_path):
+    sources = load_sample_sources(SAMPLE_XML_FILE, sample_size, SAMPLE_SEED)
+    print(f"Benchmarking backends {backends} on {len(sources)} source texts from {SAMPLE_XML_FILE}...")
+
+    ordered_backends = [REFERENCE_BACKEND] + [b for b in backends if b != REFERENCE_BACKEND]
+    results = []
+    reference_translations = None
+    for backend in ordered_backends:
+        translations, metrics = benchmark_backend(backend, sources)
+        if translations is not None:
+            if backend == REFERENCE_BACKEND:
+                reference_translations = translations
+            elif reference_translations is not None:
+                metrics.update(translation_drift(reference_translations, translations))
+        results.append(metrics)
+        print(f"  {metrics}")
+
+    report = {
+        "model": Helsinki.MODEL_NAME,
+        "device": str(Helsinki.get_device()),
+        "sample_size": len(sources),
+        "sample_seed": SAMPLE_SEED,
+        "reference_backend": REFERENCE_BACKEND,
+        "results": results,
+    }
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Helsinki.py inference backends")
+    parser.add_argument("--backends", nargs="+", default=BENCHMARK_BACKENDS, choices=BENCHMARK_BACKENDS)
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    args = parser.parse_args()
+    main(args.backends, args.sample_size, args.output)
@@ -0,0 +1,145 @@
+import re
+import sys
+import time
+import random
+import argparse
+import xml.etree.ElementTree as ET
+
+import clean
+
+# Проверка и микробенчмарк clean.post_process_translation.
+# 1. Сверка: таблица правил из clean.py должна давать тот же результат, что и прежняя реализация
+#    (reference_post_process_translation ниже - исходная функция из clean.py без изменений)
+#    на всех текстах Language/Russian/Russian.xml и их "испорченных" вариантах.
+# 2. Микробенчмарк: среднее время обработки одной строки для обеих реализаций.
+
+# --- Конфигурация ---
+GOLDEN_XML_FILE = "Language/Russian/Russian.xml"
+SAMPLE_SEPARATOR = "---"
+NOISE_SEED = 42
+# Фрагменты, которые вставляются в тексты, чтобы задействовать все правила очистки
+NOISE_FRAGMENTS = [" . ", " . . ", "...", " .", "!!", " ! ! ", "??", " ? ? ", " - ", "  ", " ,", " -", "- "]
+BENCHMARK_REPEATS = 3
+
+
+def reference_post_process_translation(text):
+    if not text:
+        return ""
+    
+    # --- Обработка точек ---
+    text = re.sub(r'\.{3,}', '___ELLIPSIS___', text) # Сохраняем многоточия
+
+    # 1. Убираем лишние точки и пробелы вокруг них, оставляя одну точку и один пробел после, если далее слово
+    # "word . . . word2" -> "word. word2"
+    # "word ... word2" (многоточие) -> "word ... word2" (не трогаем)
+    # " . . . word" -> ". word"
+    
+    # Сначала разбираемся с последовательностями "пробел-точка"
+    # " . ." -> ". " (оставляем один пробел после точки)
+    text = re.sub(r'(\s*\.\s*){2,}', '. ', text) 
+    
+    # "слово ." -> "слово."
+    text = re.sub(r'(?<=\w)\s+\.$', '.', text)
+    # "слово . слово" -> "слово. слово"
+    text = re.sub(r'(?<=\w)\s+\.(?=\s+\w)', '. ', text)
+    # " .слово" (в начале или после пробела) -> ". слово"
+    text = re.sub(r'^\s*\.(?=\s*\w)', '. ', text) # Для начала строки
+    text = re.sub(r'(?<=\s)\s*\.(?=\s*\w)', '. ', text) # Для после пробела
+
+    # Итеративная очистка " . " в конце, если предыдущие шаги не справились полностью
+    idx = 0
+    max_iters = 5 # Уменьшил, т.к. предыдущие шаги должны были многое сделать
+    while idx < max_iters and (text.endswith(" .") or text.endswith(" . ")):
+        if text.endswith(" . "):
+            text = text[:-3].strip()
+        elif text.endswith(" ."):
+            text = text[:-2].strip()
+        idx += 1
+        
+    if text and text[-1].isalnum() and not text.endswith('.') and not text.endswith('___ELLIPSIS___'):
+        text += '.'
+    
+    text = text.replace('___ELLIPSIS___', '...')
+
+    # --- Обработка дефисов/тире ---
+    text = re.sub(r'(?<=\w)\s+-\s+(?=\w)', '-', text)
+    text = re.sub(r'\s+-\s*$', '', text) 
+    text = re.sub(r'^\s*-\s+', '', text) 
+    text = re.sub(r'(?<=\w)\s+-\s+\.(?=\s|$)', '.', text)
+
+    # --- Обработка восклицательных знаков ---
+    text = re.sub(r'!{2,}', '!', text) 
+    text = re.sub(r'\s*!\s*!\s*', '! ', text) 
+
+    # --- Обработка вопросительных знаков ---
+    text = re.sub(r'\?{2,}', '?', text) 
+    text = re.sub(r'\s*\?\s*\?\s*', '? ', text) 
+
+    # --- Общие правила очистки ---
+    text = re.sub(r'\s+([.,;:!?])', r'\1', text)
+    text = re.sub(r'\s{2,}', ' ', text)
+    text = text.strip()
+        
+    return text
+
+
+def load_golden_inputs(xml_path, seed):
+    """Обе половины каждой записи файла перевода плюс их варианты со вставленным "шумом"."""
+    root = ET.parse(xml_path).getroot()
+    texts = []
+    for element in root.iter():
+        if element.text:
+            texts.extend(part for part in element.text.split(SAMPLE_SEPARATOR, 1) if part)
+    rng = random.Random(seed)
+    noisy_texts = []
+    for text in texts:
+        position = rng.randint(0, len(text))
+        noisy_texts.append(text[:position] + rng.choice(NOISE_FRAGMENTS) + text[position:] + rng.choice(["", " .", " . ", "!", " -"]))
+    return texts + noisy_texts
+
+
+def check_golden(inputs):
+    """Возвращает список (вход, ожидаемое, полученное) для расхождений."""
+    mismatches = []
+    for text in inputs:
+        expected = reference_post_process_translation(text)
+        actual = clean.post_process_translation(text)
+        if expected != actual:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+
+def time_per_string(function, inputs, repeats):
+    best_seconds = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in inputs:
+            function(text)
+        elapsed = time.perf_counter() - start
+        best_seconds = elapsed if best_seconds is None else min(best_seconds, elapsed)
+    return best_seconds / len(inputs)
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Golden check and microbenchmark for clean.post_process_translation")
+    parser.add_argument("--xml", default=GOLDEN_XML_FILE)
+    parser.add_argument("--repeats", type=int, default=BENCHMARK_REPEATS)
+    args = parser.parse_args()
+
+    inputs = load_golden_inputs(args.xml, NOISE_SEED)
+    print(f"Loaded {len(inputs)} golden inputs from {args.xml}.")
+
+    mismatches = check_golden(inputs)
+    if mismatches:
+        print(f"GOLDEN CHECK FAILED: {len(mismatches)} mismatches. First ones:")
+        for text, expected, actual in mismatches[:5]:
+            print(f"  input:    {text!r}\n  expected: {expected!r}\n  actual:   {actual!r}")
+    else:
+        print("Golden check passed: rule table output is identical to the reference implementation.")
+
+    reference_seconds = time_per_string(reference_post_process_translation, inputs, args.repeats)
+    table_seconds = time_per_string(clean.post_process_translation, inputs, args.repeats)
+    print(f"Reference implementation: {reference_seconds * 1e6:.2f} us/string")
+    print(f"Rule table implementation: {table_seconds * 1e6:.2f} us/string ({reference_seconds / table_seconds:.2f}x)")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+import output_checks
+
+# Замер профилей генерации и проверки вывода (Helsinki.GENERATION_PROFILES, output_checks.py).
+#   - Без модели: сколько переводов в готовом Russian.xml проверка считает вырожденными (по причинам,
+#     с примерами) и сколько стоит проверка - это та доля строк, что уйдет на повторный перевод.
+#   - С --model: те же английские тексты (первые --texts) переводятся каждым профилем;
+#     время, число вырожденных переводов и сколько из них исправил бы повтор с RETRY_GENERATION_PROFILE.
+
+# --- Конфигурация ---
+TRANSLATION_FILE = "Language/Russian/Russian.xml"
+OUTPUT_JSON_FILE = "translation_output_final/benchmark_generation.json"
+MODEL_TEXTS = 500
+EXAMPLES_PER_REASON = 3
+
+
+def load_translation_pairs(xml_path, separator="---"):
+    """Пары (английский, русский) из файла перевода (перевод---оригинал)."""
+    pairs = []
+    for _, element in ET.iterparse(xml_path):
+        if isinstance(element.tag, str) and element.tag != "infotexts" and element.text and separator in element.text:
+            translated, _, english = element.text.rpartition(separator)
+            pairs.append((unescape(english.strip()), unescape(translated.strip())))
+        element.clear()
+    return pairs
+
+
+def check_report(pairs):
+    reasons = {}
+    examples = {}
+    start = time.perf_counter()
+    for english, russian in pairs:
+        reason = output_checks.find_degenerate_reason(english, russian)
+        if reason:
+            reasons[reason] = reasons.get(reason, 0) + 1
+            examples.setdefault(reason, [])
+            if len(examples[reason]) < EXAMPLES_PER_REASON:
+                examples[reason].append({"source": english[:160], "translation": russian[:160]})
+    seconds = time.perf_counter() - start
+    return {
+        "pairs": len(pairs),
+        "flagged": sum(reasons.values()),
+        "flagged_by_reason": reasons,
+        "check_seconds": round(seconds, 4),
+        "check_microseconds_per_text": round(seconds / len(pairs) * 1e6, 1) if pairs else 0.0,
+        "examples": examples,
+    }
+
+
+def model_report(texts):
+    import Helsinki
+    model, tokenizer = Helsinki.load_model_and_tokenizer(Helsinki.MODEL_NAME)
+    if not model or not tokenizer:
+        return None
+    report = {"texts": len(texts)}
+    outputs = {}
+    for profile in Helsinki.GENERATION_PROFILES:
+        start = time.perf_counter()
+        outputs[profile] = Helsinki._translate_texts_with_model(
+            texts, model, tokenizer, Helsinki.BATCH_MAX_SENTENCES, Helsinki.BATCH_MAX_TOKENS,
+            generation_profile=profile, retry_degenerate=False,
+        )
+        flagged = [i for i, translated in enumerate(outputs[profile]) if output_checks.find_degenerate_reason(texts[i], translated)]
+        report[profile] = {"seconds": round(time.perf_counter() - start, 3), "flagged": len(flagged)}
+        outputs[profile + "_flagged"] = flagged
+    retry_profile = Helsinki.RETRY_GENERATION_PROFILE
+    fast_profile = Helsinki.GENERATION_PROFILE
+    if retry_profile and retry_profile != fast_profile:
+        report["fixed_by_retry"] = sum(
+            1 for i in outputs[fast_profile + "_flagged"]
+            if output_checks.find_degenerate_reason(texts[i], outputs[retry_profile][i]) is None
+        )
+    return report
+
+
+def main(translation_path, output_path, use_model, model_texts):
+    pairs = load_translation_pairs(translation_path)
+    print(f"{len(pairs)} translation pairs from {os.path.abspath(translation_path)}.")
+    report = {"shipped_translation": check_report(pairs)}
+    if use_model:
+        report["model"] = model_report([english for english, _ in pairs[:model_texts]])
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check translations for degenerate output and compare generation profiles")
+    parser.add_argument("--translation", default=TRANSLATION_FILE)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    parser.add_argument("--model", action="store_true", help="Also translate source texts with every generation profile")
+    parser.add_argument("--texts", type=int, default=MODEL_TEXTS, help="Number of source texts to translate with --model")
+    args = parser.parse_args()
+    main(args.translation, args.output, args.model, args.texts)
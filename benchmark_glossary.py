@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+import glossary
+
+# Замер glossary.py на готовом переводе: глоссарий собирается из имен (glossary.build_terms_from_translation),
+# а английские половины всех записей считаются входными текстами. Показывает, сколько текстов ушло бы
+# мимо модели и сколько терминов замаскировано, и сравнивает поиск терминов автоматом Ахо-Корасик
+# с одной большой регулярной альтернативой (тот же результат, но время растет с числом терминов).
+
+# --- Конфигурация ---
+TRANSLATION_FILE = "Language/Russian/Russian.xml"
+OUTPUT_JSON_FILE = "translation_output_final/benchmark_glossary.json"
+REPEATS = 3
+
+
+def load_source_texts(xml_path, separator="---"):
+    texts = []
+    for _, element in ET.iterparse(xml_path):
+        if isinstance(element.tag, str) and element.tag != "infotexts" and element.text and separator in element.text:
+            texts.append(unescape(element.text.rpartition(separator)[2].strip()))
+        element.clear()
+    return texts
+
+
+def regex_find_terms(term_re, text):
+    """Прежний очевидный способ: одна регулярка из всех терминов (длинные первыми), целые слова."""
+    return [(match.start(), match.end()) for match in term_re.finditer(text.lower())]
+
+
+def best_time(function, texts):
+    best = None
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = [function(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(translation_path, output_path):
+    terms = glossary.build_terms_from_translation(translation_path)
+    term_glossary = glossary.Glossary(terms)
+    texts = load_source_texts(translation_path)
+    print(f"Glossary of {len(term_glossary)} terms, {len(texts)} source texts from {os.path.abspath(translation_path)}.")
+
+    exact_hits = sum(1 for text in texts if term_glossary.lookup_exact(text) is not None)
+    term_re = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(term) for term in sorted(term_glossary.terms, key=len, reverse=True)) + r")(?!\w)")
+    matcher_seconds, matcher_results = best_time(lambda text: [(start, end) for start, end, _ in term_glossary.find_terms(text)], texts)
+    regex_seconds, regex_results = best_time(lambda text: regex_find_terms(term_re, text), texts)
+
+    report = {
+        "terms": len(term_glossary),
+        "texts": len(texts),
+        "exact_hits_model_calls_avoided": exact_hits,
+        "texts_with_terms": sum(1 for matches in matcher_results if matches),
+        "masked_terms": sum(len(matches) for matches in matcher_results),
+        "aho_corasick_seconds": round(matcher_seconds, 4),
+        "regex_alternation_seconds": round(regex_seconds, 4),
+        # Регулярка выбирает самый длинный термин слева направо так же, расхождения возможны только на границах слов
+        "texts_with_different_matches": sum(1 for a, b in zip(matcher_results, regex_results) if a != b),
+    }
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure glossary hits and term matching speed on a finished translation file")
+    parser.add_argument("--translation", default=TRANSLATION_FILE)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    args = parser.parse_args()
+    main(args.translation, args.output)
@@ -0,0 +1,351 @@
+import os
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import contextlib
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+import extract_text
+import clean
+import Helsinki
+import pipeline
+
+# Набор бенчмарков всех этапов на синтетической папке модов Workshop.
+# Папка модов генерируется воспроизводимо (фиксированное зерно) из строк Language/Russian/Russian.xml:
+# заданное число модов и файлов, доля русских файлов (уже существующий перевод), Lua файлы
+# и доля повторяющихся строк - по умолчанию такая же, как среди исходных строк Russian.xml.
+# Этап перевода выполняется с быстрой заглушкой модели (без загрузки MarianMT и без сети),
+# поэтому измеряются накладные расходы самого конвейера: батчи, дедупликация, разбор и запись XML.
+# Результаты пишутся в JSON для сравнения запусков между собой.
+
+# --- Конфигурация ---
+SOURCE_XML_FILE = "Language/Russian/Russian.xml"
+SOURCE_SEPARATOR = "---" # В Russian.xml перевод и оригинал разделены "---"
+WORK_DIRECTORY = "benchmark_workdir" # Здесь создаются синтетические моды и результаты этапов
+OUTPUT_JSON_FILE = "translation_output_final/benchmark_pipeline.json"
+
+BENCHMARK_SEED = 1234
+MOD_COUNT = 20
+XML_FILES_PER_MOD = 10
+ENTRIES_PER_XML_FILE = 50
+LUA_FILES_PER_MOD = 1
+ENTRIES_PER_LUA_FILE = 20
+RUSSIAN_FILE_RATIO = 0.2 # Доля XML файлов с уже существующим русским переводом
+DUPLICATE_STRING_RATIO = None # None = доля повторов среди исходных строк SOURCE_XML_FILE
+
+# Заглушка модели: "перевод" - исходные слова в верхнем регистре.
+# STUB_SECONDS_PER_TOKEN > 0 имитирует стоимость модели, пропорциональную числу токенов с паддингом.
+STUB_SECONDS_PER_TOKEN = 0.0
+
+BENCHMARK_STAGES = ["extract_cold", "extract_warm", "translate", "clean", "clean_streaming", "pipeline"]
+# Маркеры неудачного перевода: если они есть в результатах этапов, замер показывает время пути ошибки
+ERROR_MARKERS = ("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]")
+
+
+# --- Заглушка модели и токенизатора ---
+class _StubEncoding(dict):
+    def to(self, device):
+        return self
+
+class StubTokenizer:
+    """Токенизатор по пробелам с общим словарем; совместим с вызовами из Helsinki.py."""
+    pad_token_id = 0
+
+    def __init__(self):
+        self.words = ["<pad>"]
+        self.word_ids = {"<pad>": 0}
+
+    def _encode(self, text, max_length):
+        ids = []
+        for word in text.split()[:max_length]:
+            word_id = self.word_ids.get(word)
+            if word_id is None:
+                word_id = len(self.words)
+                self.word_ids[word] = word_id
+                self.words.append(word)
+            ids.append(word_id)
+        return ids or [self.pad_token_id]
+
+    def __call__(self, texts, return_tensors=None, padding=False, truncation=False, max_length=512):
+        input_ids = [self._encode(text, max_length) for text in texts]
+        if padding:
+            longest = max(len(ids) for ids in input_ids)
+            input_ids = [ids + [self.pad_token_id] * (longest - len(ids)) for ids in input_ids]
+        return _StubEncoding(input_ids=input_ids)
+
+    def batch_decode(self, token_batches, skip_special_tokens=True):
+        return [
+            " ".join(self.words[token_id].upper() for token_id in ids if not (skip_special_tokens and token_id == self.pad_token_id))
+            for ids in token_batches
+        ]
+
+class StubModel:
+    device = "cpu"
+
+    def generate(self, input_ids, **kwargs):
+        if STUB_SECONDS_PER_TOKEN:
+            time.sleep(STUB_SECONDS_PER_TOKEN * sum(len(ids) for ids in input_ids))
+        return input_ids
+
+
+# --- Генерация синтетических модов ---
+def load_source_strings(xml_path):
+    """Пары (тег, английский текст, русский текст) из файла перевода."""
+    root = ET.parse(xml_path).getroot()
+    entries = []
+    for element in root:
+        if not isinstance(element.tag, str) or not element.text or SOURCE_SEPARATOR not in element.text:
+            continue
+        russian_text, english_text = (part.strip() for part in element.text.split(SOURCE_SEPARATOR, 1))
+        if english_text:
+            entries.append((element.tag, english_text, russian_text or english_text))
+    return entries
+
+def measured_duplicate_ratio(entries):
+    english_texts = [english_text for _, english_text, _ in entries]
+    return 1 - len(set(english_texts)) / len(english_texts) if english_texts else 0.0
+
+def _write_infotexts_file(filepath, language, items):
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write(f'<infotexts language="{language}" nowhitespace="false">\n')
+        for tag, text in items:
+            f.write(f'  <{tag}>{escape(text)}</{tag}>\n')
+        f.write('</infotexts>\n')
+
+def _lua_string(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+def generate_synthetic_mods(mods_directory, source_entries, settings):
+    """Создает папку модов по settings и возвращает статистику сгенерированного."""
+    rng = random.Random(settings["seed"])
+    duplicate_ratio = settings["duplicate_string_ratio"]
+    used_texts = []
+    next_entry = 0
+    counts = {"mods": 0, "xml_files": 0, "russian_xml_files": 0, "lua_files": 0, "entries": 0, "bytes": 0}
+
+    def next_english_entry():
+        nonlocal next_entry
+        tag, english_text, russian_text = source_entries[next_entry % len(source_entries)]
+        cycle = next_entry // len(source_entries)
+        next_entry += 1
+        if cycle:
+            # Исходные строки закончились - делаем новые уникальные ключи и тексты
+            tag, english_text = f"{tag}{cycle}", f"{english_text} ({cycle})"
+        if used_texts and rng.random() < duplicate_ratio:
+            english_text, russian_text = rng.choice(used_texts)
+        else:
+            used_texts.append((english_text, russian_text))
+        return tag, english_text, russian_text
+
+    for mod_number in range(settings["mod_count"]):
+        mod_directory = os.path.join(mods_directory, f"SyntheticMod{mod_number:03d}")
+        content_directory = os.path.join(mod_directory, "Content")
+        os.makedirs(content_directory, exist_ok=True)
+        counts["mods"] += 1
+        english_files = []
+        for file_number in range(settings["xml_files_per_mod"]):
+            items = [next_english_entry() for _ in range(settings["entries_per_xml_file"])]
+            filepath = os.path.join(content_directory, f"texts{file_number:03d}.xml")
+            if english_files and rng.random() < settings["russian_file_ratio"]:
+                # Русский файл переводит часть ключей одного из английских файлов мода
+                translated_items = rng.choice(english_files)
+                translated_items = translated_items[:max(1, len(translated_items) // 2)]
+                _write_infotexts_file(filepath, "Russian", [(tag, russian_text) for tag, _, russian_text in translated_items])
+                counts["russian_xml_files"] += 1
+            else:
+                _write_infotexts_file(filepath, "English", [(tag, english_text) for tag, english_text, _ in items])
+                english_files.append(items)
+                counts["entries"] += len(items)
+            counts["xml_files"] += 1
+            counts["bytes"] += os.path.getsize(filepath)
+
+        for file_number in range(settings["lua_files_per_mod"]):
+            filepath = os.path.join(mod_directory, "Lua", f"script{file_number:03d}.lua")
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, "w", encoding="utf-8") as f:
+                f.write("-- synthetic script\nlocal ui = {}\n")
+                for entry_number in range(settings["entries_per_lua_file"]):
+                    _, english_text, _ = next_english_entry()
+                    if entry_number % 2:
+                        f.write(f"ui.tooltip = {_lua_string(english_text)}\n")
+                    else:
+                        f.write(f"Game.ShowMessageBox({_lua_string(english_text)})\n")
+            counts["lua_files"] += 1
+            counts["entries"] += settings["entries_per_lua_file"]
+            counts["bytes"] += os.path.getsize(filepath)
+    return counts
+
+
+# --- Этапы ---
+def _time_stage(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def _stage_result(seconds, items, bytes_processed=None):
+    result = {"seconds": round(seconds, 4), "items": items, "items_per_second": round(items / seconds, 1) if seconds else None}
+    if bytes_processed is not None:
+        result["megabytes_per_second"] = round(bytes_processed / seconds / 1e6, 3) if seconds else None
+    return result
+
+def count_error_markers(xml_path):
+    """Число маркеров ошибок перевода в файле результата этапа."""
+    with open(xml_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return sum(content.count(marker) for marker in ERROR_MARKERS)
+
+def run_stages(work_directory, mods_directory, stages, generated):
+    paths = {
+        "cache": os.path.join(work_directory, "extraction_cache.sqlite"),
+        "extracted": os.path.join(work_directory, "strings_for_translation.xml"),
+        "translated": os.path.join(work_directory, "translated_with_inline_originals.xml"),
+        "cleaned": os.path.join(work_directory, "translated_cleaned.xml"),
+        "cleaned_streaming": os.path.join(work_directory, "translated_cleaned_streaming.xml"),
+        "pipeline": os.path.join(work_directory, "pipeline_output.xml"),
+    }
+    extract_text.EXTRACTION_CACHE_FILE = paths["cache"]
+    results = {}
+
+    def extract():
+        texts, _ = extract_text.collect_and_filter_texts(mods_directory)
+        extract_text.save_texts_to_final_xml(texts, paths["extracted"], extract_text.TARGET_OUTPUT_LANGUAGE, extract_text.TARGET_OUTPUT_TRANSLATED_NAME)
+        return texts
+
+    # Извлечение нужно остальным этапам, поэтому выполняется всегда
+    if os.path.exists(paths["cache"]):
+        os.remove(paths["cache"])
+    seconds, texts = _time_stage(extract)
+    extracted_count = len(texts)
+    if "extract_cold" in stages:
+        results["extract_cold"] = _stage_result(seconds, generated["xml_files"] + generated["lua_files"], generated["bytes"])
+        results["extract_cold"]["extracted_entries"] = extracted_count
+    if "extract_warm" in stages:
+        seconds, _ = _time_stage(extract)
+        results["extract_warm"] = _stage_result(seconds, generated["xml_files"] + generated["lua_files"], generated["bytes"])
+
+    Helsinki.INPUT_XML_FILE = paths["extracted"]
+    Helsinki.OUTPUT_XML_FILE_TRANSLATED = paths["translated"]
+    Helsinki.USE_TRANSLATION_MEMORY = False
+    Helsinki.USE_TRANSLATION_JOURNAL = False
+    stub_model, stub_tokenizer = StubModel(), StubTokenizer()
+
+    if "translate" in stages or "clean" in stages or "clean_streaming" in stages:
+        seconds, _ = _time_stage(lambda: Helsinki._run_translation(stub_model, stub_tokenizer, None, paths["extracted"], paths["translated"]))
+        if "translate" in stages:
+            results["translate"] = _stage_result(seconds, extracted_count)
+            results["translate"]["error_markers"] = count_error_markers(paths["translated"])
+
+    if "clean" in stages:
+        seconds, _ = _time_stage(lambda: clean.main(paths["translated"], paths["cleaned"]))
+        results["clean"] = _stage_result(seconds, extracted_count)
+        results["clean"]["error_markers"] = count_error_markers(paths["cleaned"])
+
+    if "clean_streaming" in stages:
+        seconds, _ = _time_stage(lambda: clean.main_streaming(paths["translated"], paths["cleaned_streaming"]))
+        results["clean_streaming"] = _stage_result(seconds, extracted_count)
+        results["clean_streaming"]["error_markers"] = count_error_markers(paths["cleaned_streaming"])
+
+    if "pipeline" in stages:
+        def run_pipeline():
+            stats = {"entries": 0, "nodes_changed": 0}
+            records = pipeline.prefetch_in_thread(extract_text.iter_texts_by_mod(mods_directory), pipeline.PIPELINE_PREFETCH_RECORDS)
+            # Те же этапы перевода, что в Helsinki._run_translation, иначе время этапов несравнимо
+            translated_records = pipeline.iter_translated_records(
+                records, stub_model, stub_tokenizer, pipeline.PIPELINE_TRANSLATION_CHUNK_SIZE,
+                batch_size=Helsinki.BATCH_MAX_SENTENCES, max_batch_tokens=Helsinki.BATCH_MAX_TOKENS,
+                glossary=Helsinki.load_glossary(), segmenter=Helsinki.create_segmenter(), source_filter=Helsinki.create_source_filter(),
+            )
+            pipeline.write_final_xml(pipeline.iter_cleaned_entries(translated_records, stats), paths["pipeline"])
+            return stats
+        seconds, stats = _time_stage(run_pipeline)
+        results["pipeline"] = _stage_result(seconds, stats["entries"])
+        results["pipeline"]["error_markers"] = count_error_markers(paths["pipeline"])
+    return results
+
+
+def main(settings, stages, work_directory, output_path, keep_work_directory=False, quiet=True):
+    source_entries = load_source_strings(SOURCE_XML_FILE)
+    if settings["duplicate_string_ratio"] is None:
+        settings["duplicate_string_ratio"] = round(measured_duplicate_ratio(source_entries), 4)
+
+    if os.path.exists(work_directory):
+        shutil.rmtree(work_directory)
+    mods_directory = os.path.join(work_directory, "mods")
+    generated = generate_synthetic_mods(mods_directory, source_entries, settings)
+    print(f"Generated synthetic mods in {os.path.abspath(mods_directory)}: {generated}")
+
+    output_sink = io.StringIO()
+    redirect = contextlib.ExitStack()
+    if quiet:
+        redirect.enter_context(contextlib.redirect_stdout(output_sink))
+        redirect.enter_context(contextlib.redirect_stderr(output_sink))
+    try:
+        with redirect:
+            stage_results = run_stages(work_directory, mods_directory, stages, generated)
+    finally:
+        if not keep_work_directory:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = {
+        "settings": settings,
+        "generated": generated,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scan_workers": extract_text.SCAN_WORKERS,
+            "stub_seconds_per_token": STUB_SECONDS_PER_TOKEN,
+        },
+        "stages": stage_results,
+    }
+    for stage, metrics in stage_results.items():
+        print(f"  {stage}: {metrics}")
+    failed_stages = [stage for stage, metrics in stage_results.items() if metrics.get("error_markers")]
+    if failed_stages:
+        print(f"Warning: translation error markers in the output of {', '.join(failed_stages)} - the timings measure the error path.")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage on a reproducible synthetic Workshop mods tree")
+    parser.add_argument("--mods", type=int, default=MOD_COUNT, help="Number of synthetic mods")
+    parser.add_argument("--xml-files-per-mod", type=int, default=XML_FILES_PER_MOD)
+    parser.add_argument("--entries-per-xml-file", type=int, default=ENTRIES_PER_XML_FILE)
+    parser.add_argument("--lua-files-per-mod", type=int, default=LUA_FILES_PER_MOD)
+    parser.add_argument("--entries-per-lua-file", type=int, default=ENTRIES_PER_LUA_FILE)
+    parser.add_argument("--russian-file-ratio", type=float, default=RUSSIAN_FILE_RATIO, help="Share of XML files that are existing Russian translations")
+    parser.add_argument("--duplicate-ratio", type=float, default=DUPLICATE_STRING_RATIO, help="Share of repeated source strings (default: measured on Russian.xml)")
+    parser.add_argument("--seed", type=int, default=BENCHMARK_SEED)
+    parser.add_argument("--stages", nargs="+", choices=BENCHMARK_STAGES, default=BENCHMARK_STAGES)
+    parser.add_argument("--work-dir", default=WORK_DIRECTORY)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    parser.add_argument("--keep", action="store_true", help="Keep the generated mods and stage outputs")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the benchmarked stages")
+    args = parser.parse_args()
+    benchmark_settings = {
+        "seed": args.seed,
+        "mod_count": args.mods,
+        "xml_files_per_mod": args.xml_files_per_mod,
+        "entries_per_xml_file": args.entries_per_xml_file,
+        "lua_files_per_mod": args.lua_files_per_mod,
+        "entries_per_lua_file": args.entries_per_lua_file,
+        "russian_file_ratio": args.russian_file_ratio,
+        "duplicate_string_ratio": args.duplicate_ratio,
+    }
+    benchmark_report = main(benchmark_settings, args.stages, args.work_dir, args.output, keep_work_directory=args.keep, quiet=not args.verbose)
+    if any(metrics.get("error_markers") for metrics in benchmark_report["stages"].values()):
+        raise SystemExit(1)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+
+import extract_text
+
+# Профиль времени, которое extract_text.py тратит на построение ключей tag.identifier
+# (санитизация имен тегов и идентификаторов) и на проверку исключенных тегов:
+# прежний путь (три прохода регулярных выражений на каждый вызов, список исключений
+# пересобирается на каждый файл) против индекса исключений и LRU-кэша санитизации.
+# Заодно проверяется, что ключи получаются прежними.
+
+# --- Конфигурация ---
+MODS_DIRECTORY = "."
+OUTPUT_JSON_FILE = "translation_output_for_extractor/benchmark_sanitize.json"
+REPEATS = 3 # Время берется лучшее из нескольких повторов
+
+
+def reference_sanitize_xml_tag_name(name):
+    """Прежняя реализация sanitize_xml_tag_name, без кэширования."""
+    if not isinstance(name, str):
+        name = str(name)
+
+    name = re.sub(r'\s+', '_', name)
+    name = re.sub(r'[^a-zA-Z0-9_.-]', '', name)
+
+    if not name:
+        return "sanitized_empty_tag"
+
+    if re.match(r'^[0-9.-]', name) or name.lower().startswith("xml"):
+        name = "_" + name
+
+    if not name:
+        return "invalid_tag_fallback"
+    return name
+
+def reference_full_tag(original_tag_name, id_val):
+    sanitized_main_tag = reference_sanitize_xml_tag_name(original_tag_name)
+    if id_val:
+        sanitized_id_val = reference_sanitize_xml_tag_name(id_val)
+        if sanitized_id_val and sanitized_id_val not in ("sanitized_empty_tag", "invalid_tag_fallback"):
+            full_tag = f"{sanitized_main_tag}.{sanitized_id_val}"
+        else:
+            full_tag = sanitized_main_tag
+    else:
+        full_tag = sanitized_main_tag
+    return reference_sanitize_xml_tag_name(full_tag)
+
+
+def load_elements_by_file(mods_directory):
+    """Для каждого XML файла модов - список пар (имя тега, identifier/name) всех его элементов."""
+    elements_by_file = []
+    for filepath in extract_text.list_mod_files(mods_directory):
+        if not filepath.endswith(".xml"):
+            continue
+        try:
+            root = ET.parse(filepath).getroot()
+        except (ET.ParseError, OSError):
+            continue
+        elements_by_file.append([(element.tag, element.get('identifier') or element.get('name')) for element in root.iter()])
+    return elements_by_file
+
+
+def run_reference(elements_by_file):
+    full_tags = []
+    excluded_count = 0
+    excluded_tags_literal = list(extract_text.EXCLUDED_TAGS)
+    for elements in elements_by_file:
+        excluded_tags = set(excluded_tags_literal) # Прежде set-литерал строился заново при каждом вызове
+        for tag, id_val in elements:
+            if tag.lower() in excluded_tags:
+                excluded_count += 1
+            full_tags.append(reference_full_tag(tag, id_val))
+    return full_tags, excluded_count
+
+
+def run_indexed(elements_by_file):
+    full_tags = []
+    excluded_count = 0
+    for elements in elements_by_file:
+        for tag, id_val in elements:
+            if extract_text.EXCLUSION_INDEX.is_excluded_tag(tag):
+                excluded_count += 1
+            full_tags.append(extract_text._full_tag_for(tag, id_val))
+    return full_tags, excluded_count
+
+
+def best_time(function, elements_by_file, before_each=None):
+    best = None
+    result = None
+    for _ in range(REPEATS):
+        if before_each is not None:
+            before_each()
+        start = time.perf_counter()
+        result = function(elements_by_file)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def clear_caches():
+    extract_text._full_tag_for.cache_clear()
+    extract_text._sanitize_xml_tag_name_cached.cache_clear()
+    extract_text.EXCLUSION_INDEX._tag_decisions.clear()
+
+
+def main(mods_directory, output_path):
+    elements_by_file = load_elements_by_file(mods_directory)
+    element_count = sum(len(elements) for elements in elements_by_file)
+    print(f"Loaded {element_count} elements from {len(elements_by_file)} XML files in {os.path.abspath(mods_directory)}.")
+    if not element_count:
+        print("Nothing to profile.")
+        return
+
+    reference_seconds, (reference_tags, reference_excluded) = best_time(run_reference, elements_by_file)
+    cold_seconds, (indexed_tags, indexed_excluded) = best_time(run_indexed, elements_by_file, before_each=clear_caches)
+    warm_seconds, _ = best_time(run_indexed, elements_by_file)
+    cache_info = extract_text._full_tag_for.cache_info()
+
+    mismatches = sum(1 for reference, indexed in zip(reference_tags, indexed_tags) if reference != indexed)
+    report = {
+        "mods_directory": os.path.abspath(mods_directory),
+        "xml_files": len(elements_by_file),
+        "elements": element_count,
+        "distinct_tag_identifier_pairs": cache_info.currsize,
+        "before_seconds": round(reference_seconds, 4),
+        "after_cold_cache_seconds": round(cold_seconds, 4),
+        "after_warm_cache_seconds": round(warm_seconds, 4),
+        "speedup_cold": round(reference_seconds / cold_seconds, 2) if cold_seconds else None,
+        "before_us_per_element": round(reference_seconds / element_count * 1e6, 3),
+        "after_us_per_element": round(cold_seconds / element_count * 1e6, 3),
+        "full_tag_mismatches": mismatches,
+        # Прежний путь проверяет только точные имена EXCLUDED_TAGS, без шаблонов и файла настроек
+        "excluded_elements_exact_names": reference_excluded,
+        "excluded_elements_index": indexed_excluded,
+    }
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Profiling report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile tag sanitization and exclusion checks of extract_text.py")
+    parser.add_argument("--mods-dir", default=MODS_DIRECTORY)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    args = parser.parse_args()
+    report = main(args.mods_dir, args.output)
+    if report and report["full_tag_mismatches"]:
+        raise SystemExit(1)
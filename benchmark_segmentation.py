@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+import Helsinki
+from segmentation import SentenceSegmenter, join_sentences, SEGMENT_MIN_CHARS
+
+# Замер segmentation.py на английских половинах готового перевода (те же тексты, что видит модель):
+#   - сколько длинных текстов разбивается и на сколько предложений, время разбиения;
+#   - сборка обратно дает исходный текст, метки [..] и цвета ‖color:..‖..‖end‖ не разрываются;
+#   - сколько уникальных строк уходит в модель без разбиения и с ним (повторы предложений);
+#   - длина строк (в словах - без токенизатора), строки длиннее MAX_INPUT_TOKENS и паддинг батчей
+#     по длине (Helsinki.plan_length_batches) без разбиения и с ним.
+
+# --- Конфигурация ---
+TRANSLATION_FILE = "Language/Russian/Russian.xml"
+OUTPUT_JSON_FILE = "translation_output_final/benchmark_segmentation.json"
+
+
+def load_source_texts(xml_path, separator="---"):
+    texts = []
+    for _, element in ET.iterparse(xml_path):
+        if isinstance(element.tag, str) and element.tag != "infotexts" and element.text and separator in element.text:
+            texts.append(unescape(element.text.rpartition(separator)[2].strip()))
+        element.clear()
+    return texts
+
+
+def markup_balanced(text):
+    """Цвета открываются и закрываются в одной строке, квадратные скобки парные."""
+    color_opens = text.count("‖color:") - text.count("‖color:end‖")
+    color_closes = text.count("‖end‖") + text.count("‖color:end‖")
+    return color_opens == color_closes and text.count("[") == text.count("]")
+
+
+def batching_report(strings):
+    """Длины в словах и паддинг батчей по длине для набора уникальных строк."""
+    lengths = [len(text.split()) for text in strings]
+    batches = Helsinki.plan_length_batches(lengths, Helsinki.BATCH_MAX_TOKENS, Helsinki.BATCH_MAX_SENTENCES)
+    words = sum(lengths)
+    padded_words = sum(len(batch) * max(max(lengths[i] for i in batch), 1) for batch in batches)
+    return {
+        "strings": len(strings),
+        "words": words,
+        "max_words": max(lengths, default=0),
+        "over_max_input_tokens": sum(1 for length in lengths if length > Helsinki.MAX_INPUT_TOKENS),
+        "batches": len(batches),
+        "padded_words": padded_words,
+        "padding_ratio": round(1 - words / padded_words, 4) if padded_words else 0.0,
+    }
+
+
+def main(translation_path, output_path, min_chars):
+    texts = load_source_texts(translation_path)
+    print(f"{len(texts)} source texts from {os.path.abspath(translation_path)}, segmenting texts of {min_chars}+ characters.")
+    segmenter = SentenceSegmenter(min_chars)
+
+    start = time.perf_counter()
+    split_results = [segmenter.split(text) for text in texts]
+    split_seconds = time.perf_counter() - start
+
+    strings = []
+    roundtrip_failures = 0
+    broken_markup = 0
+    for text, parts in zip(texts, split_results):
+        if parts is None:
+            strings.append(text)
+            continue
+        sentences, gaps = parts
+        strings.extend(sentences)
+        if join_sentences(sentences, gaps) != text:
+            roundtrip_failures += 1
+        if markup_balanced(text) and not all(markup_balanced(sentence) for sentence in sentences):
+            broken_markup += 1
+
+    unique_texts, _ = Helsinki.deduplicate_texts(texts)
+    unique_strings, _ = Helsinki.deduplicate_texts(strings)
+    report = {
+        "texts": len(texts),
+        "segmented_texts": sum(1 for parts in split_results if parts is not None),
+        "sentences_from_segmented_texts": sum(len(parts[0]) for parts in split_results if parts is not None),
+        "split_seconds": round(split_seconds, 4),
+        "roundtrip_failures": roundtrip_failures,
+        "texts_with_broken_markup": broken_markup,
+        "without_segmentation": batching_report(unique_texts),
+        "with_segmentation": batching_report(unique_strings),
+    }
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure sentence segmentation of long texts on a finished translation file")
+    parser.add_argument("--translation", default=TRANSLATION_FILE)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    parser.add_argument("--min-chars", type=int, default=SEGMENT_MIN_CHARS, help="Segment texts of at least this many characters")
+    args = parser.parse_args()
+    report = main(args.translation, args.output, args.min_chars)
+    if report["roundtrip_failures"] or report["texts_with_broken_markup"]:
+        raise SystemExit(1)
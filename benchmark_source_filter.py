@@ -0,0 +1,58 @@
+import os
+import json
+import time
+import argparse
+
+import source_filter
+from benchmark_segmentation import load_source_texts
+
+# Замер source_filter.py на английских половинах готового перевода (те же тексты, что видит модель):
+# сколько строк каждой категории ушло бы мимо модели (с примерами) и сколько стоит классификация.
+
+# --- Конфигурация ---
+TRANSLATION_FILE = "Language/Russian/Russian.xml"
+OUTPUT_JSON_FILE = "translation_output_final/benchmark_source_filter.json"
+EXAMPLES_PER_CATEGORY = 5
+
+
+def main(translation_path, output_path):
+    texts = load_source_texts(translation_path)
+    print(f"{len(texts)} source texts from {os.path.abspath(translation_path)}.")
+
+    start = time.perf_counter()
+    categories = [source_filter.classify_text(text) for text in texts]
+    seconds = time.perf_counter() - start
+
+    counts = {category: 0 for category in source_filter.CATEGORIES}
+    examples = {}
+    for text, category in zip(texts, categories):
+        counts[category] += 1
+        if category != "english" and len(examples.setdefault(category, [])) < EXAMPLES_PER_CATEGORY:
+            examples[category].append(text[:80])
+    report = {
+        "texts": len(texts),
+        "categories": counts,
+        "model_calls_avoided": len(texts) - counts["english"],
+        "classify_seconds": round(seconds, 4),
+        "classify_microseconds_per_text": round(seconds / len(texts) * 1e6, 1) if texts else 0.0,
+        "examples": examples,
+    }
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count source text categories that the source filter keeps away from the model")
+    parser.add_argument("--translation", default=TRANSLATION_FILE)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    args = parser.parse_args()
+    main(args.translation, args.output)
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import argparse
+import tracemalloc
+from collections import defaultdict
+
+import extract_text
+from tag_statistics import TagStatistics
+
+# Память и время анализа часто встречающихся тегов extract_text.py: прежние полные множества
+# (текст, путь) на каждый (мод, тег) против компактной статистики tag_statistics.py.
+# Заодно проверяется, что в отчет попадают те же теги с теми же счетчиками
+# (число различных текстов/файлов сверх EXACT_DISTINCT_LIMIT - оценка, для нее считается погрешность).
+
+# --- Конфигурация ---
+MODS_DIRECTORY = "."
+OUTPUT_JSON_FILE = "translation_output_for_extractor/benchmark_tag_stats.json"
+REPEAT = 1 # Во сколько раз размножить вхождения (с разными путями файлов), чтобы изобразить большую установку
+
+
+def load_occurrences(mods_directory, repeat):
+    """Все вхождения (мод, тег, текст, путь) из модов, как их видит filter_and_deduplicate_texts."""
+    filepaths = extract_text.list_mod_files(mods_directory)
+    scan_results = extract_text.scan_mod_files_cached(filepaths, mods_directory, verbose=False)
+    occurrences = []
+    for copy_number in range(repeat):
+        path_prefix = f"copy{copy_number}" if repeat > 1 else ""
+        for _, file_texts in scan_results:
+            for full_tag, escaped_text, source_filepath, mod_name in file_texts:
+                occurrences.append((mod_name, full_tag, escaped_text, os.path.normpath(os.path.join(path_prefix, source_filepath))))
+    return occurrences
+
+
+def run_reference(occurrences):
+    """Прежний сбор статистики и построение отчета (счетчики различных значений)."""
+    tag_occurrences = defaultdict(int)
+    tag_details_map = defaultdict(set)
+    for mod_name, full_tag, text, path in occurrences:
+        tag_occurrences[(mod_name, full_tag)] += 1
+        tag_details_map[(mod_name, full_tag)].add((text, path))
+    report = {}
+    for key, count in tag_occurrences.items():
+        if count >= extract_text.DUPLICATE_TAG_THRESHOLD:
+            details = tag_details_map[key]
+            report[key] = (count, len({text for text, _ in details}), len({path for _, path in details}))
+    return report, (tag_occurrences, tag_details_map)
+
+
+def run_compact(occurrences):
+    tag_statistics = TagStatistics()
+    for mod_name, full_tag, text, path in occurrences:
+        tag_statistics.add((mod_name, full_tag), text, path)
+    report = {
+        (tag_info["mod_name"], tag_info["tag_name"]): (tag_info["count"], tag_info["unique_texts_count"], tag_info["unique_filepaths_count"])
+        for tag_info in extract_text.build_frequent_tags_report(tag_statistics)
+    }
+    return report, tag_statistics
+
+
+def measure(function, occurrences):
+    """Время и пик памяти, выделенной под структуры статистики (tracemalloc)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    report, structures = function(occurrences)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del structures
+    return report, elapsed, peak
+
+
+def main(mods_directory, output_path, repeat):
+    occurrences = load_occurrences(mods_directory, repeat)
+    print(f"Loaded {len(occurrences)} tag occurrences from {os.path.abspath(mods_directory)} (repeat={repeat}).")
+    if not occurrences:
+        print("Nothing to measure.")
+        return
+
+    reference_report, reference_seconds, reference_peak = measure(run_reference, occurrences)
+    compact_report, compact_seconds, compact_peak = measure(run_compact, occurrences)
+
+    count_mismatches = sum(1 for key, values in reference_report.items() if key not in compact_report or compact_report[key][0] != values[0])
+    distinct_errors = [
+        abs(compact_report[key][index] - values[index]) / values[index]
+        for key, values in reference_report.items() if key in compact_report
+        for index in (1, 2)
+    ]
+    report = {
+        "mods_directory": os.path.abspath(mods_directory),
+        "occurrences": len(occurrences),
+        "frequent_tags": len(reference_report),
+        "before_seconds": round(reference_seconds, 4),
+        "after_seconds": round(compact_seconds, 4),
+        "before_peak_mb": round(reference_peak / 2**20, 2),
+        "after_peak_mb": round(compact_peak / 2**20, 2),
+        "memory_ratio": round(reference_peak / compact_peak, 2) if compact_peak else None,
+        "report_tag_mismatches": count_mismatches + len(set(compact_report) - set(reference_report)),
+        "distinct_count_max_relative_error": round(max(distinct_errors), 4) if distinct_errors else 0.0,
+    }
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare memory of the frequent-tags analysis: full detail sets vs compact statistics")
+    parser.add_argument("--mods-dir", default=MODS_DIRECTORY)
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+    report = main(args.mods_dir, args.output, args.repeat)
+    if report and report["report_tag_mismatches"]:
+        raise SystemExit(1)
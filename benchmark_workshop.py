@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import workshop_metadata
+
+# Проверка и замер workshop_metadata.py на локальной заглушке GetPublishedFileDetails (без обращения к Steam):
+#   - прежний способ из "Barotrauma mod chek.ipynb" (последовательные запросы по 100 id с паузой) против
+#     асинхронных запросов с ограничением параллельности и частоты;
+#   - повторный запрос берется из кэша без обращения к серверу;
+#   - 429 от сервера повторяется;
+#   - пачка, так и не получившая ответа, не теряет остальные: они возвращаются и кэшируются, ее id - в failed_ids;
+#   - выбор изменившихся модов: после mark_translated изменившимися считаются только моды с новым time_updated,
+#     в том числе обновленные между извлечением и отметкой (отмечаются версии, сохраненные при извлечении).
+
+# --- Конфигурация ---
+MOD_COUNT = 1000
+STUB_LATENCY_SECONDS = 0.2 # Задержка ответа заглушки (сеть + Steam)
+SERIAL_PAUSE_SECONDS = 1.0 # Пауза между запросами в прежнем способе
+OUTPUT_JSON_FILE = "translation_output_for_extractor/benchmark_workshop.json"
+
+
+class StubWorkshopServer:
+    """Заглушка GetPublishedFileDetails: отвечает сведениями из details_by_id с задержкой latency.
+
+    Первые fail_first_requests запросов получают 429, запросы с id из failing_ids - всегда 500.
+    """
+
+    def __init__(self, details_by_id, latency=0.0, fail_first_requests=0, failing_ids=()):
+        self.details_by_id = details_by_id
+        self.latency = latency
+        self.fail_first_requests = fail_first_requests
+        self.failing_ids = set(failing_ids)
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                form = urllib.parse.parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("ascii"))
+                with stub.lock:
+                    stub.requests += 1
+                    should_fail = stub.requests <= stub.fail_first_requests
+                time.sleep(stub.latency)
+                item_count = int(form["itemcount"][0])
+                if should_fail or any(form[f"publishedfileids[{index}]"][0] in stub.failing_ids for index in range(item_count)):
+                    self.send_response(429 if should_fail else 500)
+                    self.end_headers()
+                    return
+                details_list = []
+                for index in range(item_count):
+                    mod_id = form[f"publishedfileids[{index}]"][0]
+                    details_list.append(stub.details_by_id.get(mod_id, {"publishedfileid": mod_id, "result": 9}))
+                body = json.dumps({"response": {"result": 1, "resultcount": len(details_list), "publishedfiledetails": details_list}}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/ISteamRemoteStorage/GetPublishedFileDetails/v1/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_details(mod_count):
+    return {
+        str(3000000000 + index): {"publishedfileid": str(3000000000 + index), "result": 1, "title": f"Mod {index}", "time_updated": 1700000000 + index}
+        for index in range(mod_count)
+    }
+
+
+def fetch_serial(mod_ids, endpoint, pause):
+    """Прежний способ из блокнота: запросы по 100 id один за другим с паузой."""
+    details_by_id = {}
+    for start in range(0, len(mod_ids), 100):
+        form = workshop_metadata._details_form(mod_ids[start:start + 100])
+        request = urllib.request.Request(endpoint, data=urllib.parse.urlencode(form).encode("ascii"), method="POST")
+        with urllib.request.urlopen(request) as response:
+            for details in json.loads(response.read())["response"]["publishedfiledetails"]:
+                details_by_id[details["publishedfileid"]] = details
+        time.sleep(pause)
+    return details_by_id
+
+
+def main(mod_count, output_path):
+    details_by_id = make_details(mod_count)
+    mod_ids = list(details_by_id)
+    work_directory = tempfile.mkdtemp(prefix="workshop_benchmark_")
+    cache_path = os.path.join(work_directory, "workshop_details.sqlite")
+    report = {"mods": mod_count, "stub_latency_seconds": STUB_LATENCY_SECONDS, "aiohttp": workshop_metadata.aiohttp is not None}
+    try:
+        with StubWorkshopServer(details_by_id, STUB_LATENCY_SECONDS) as stub:
+            start = time.perf_counter()
+            serial_result = fetch_serial(mod_ids, stub.endpoint, SERIAL_PAUSE_SECONDS)
+            report["serial_seconds"] = round(time.perf_counter() - start, 3)
+
+            stats = {}
+            start = time.perf_counter()
+            async_result = workshop_metadata.fetch_mod_details(mod_ids, stub.endpoint, cache_path, stats=stats)
+            report["async_seconds"] = round(time.perf_counter() - start, 3)
+            report["async_requests"] = stats["requests"]
+            report["results_match"] = serial_result == async_result
+
+            requests_before = stub.requests
+            stats = {}
+            start = time.perf_counter()
+            cached_result = workshop_metadata.fetch_mod_details(mod_ids, stub.endpoint, cache_path, stats=stats)
+            report["cached_seconds"] = round(time.perf_counter() - start, 3)
+            report["cached_requests_to_server"] = stub.requests - requests_before
+            report["cached_results_match"] = cached_result == async_result
+
+        with StubWorkshopServer(details_by_id, fail_first_requests=2) as stub:
+            stats = {}
+            retried_result = workshop_metadata.fetch_mod_details(mod_ids[:150], stub.endpoint, None, stats=stats, requests_per_second=None)
+            report["retries_after_429"] = stats["retries"]
+            report["retried_results_complete"] = len(retried_result) == 150
+
+        # Вторая пачка из трех не отвечает и после повторов: первая и третья все равно возвращаются и кэшируются
+        partial_cache_path = os.path.join(work_directory, "partial_details.sqlite")
+        with StubWorkshopServer(details_by_id, failing_ids=[mod_ids[150]]) as stub:
+            stats = {}
+            partial_result = workshop_metadata.fetch_mod_details(mod_ids[:250], stub.endpoint, partial_cache_path, stats=stats,
+                                                                 requests_per_second=None, max_retries=1)
+            report["failed_ids"] = len(stats["failed_ids"])
+        with StubWorkshopServer(details_by_id) as stub:
+            workshop_metadata.fetch_mod_details(mod_ids[:250], stub.endpoint, partial_cache_path)
+            report["refetched_after_failure"] = stub.requests
+        report["partial_results_kept"] = (sorted(partial_result) == sorted(mod_ids[:100] + mod_ids[200:250])
+                                          and sorted(stats["failed_ids"]) == sorted(mod_ids[100:200])
+                                          and report["refetched_after_failure"] == 1)
+
+        # Папка модов: часть с filelist.xml (steamworkshopid), часть - с числовыми именами папок, и один локальный мод
+        mods_directory = os.path.join(work_directory, "mods")
+        for index, mod_id in enumerate(mod_ids[:20]):
+            mod_directory = os.path.join(mods_directory, f"Mod{index}" if index % 2 else mod_id)
+            os.makedirs(mod_directory)
+            if index % 2:
+                with open(os.path.join(mod_directory, "filelist.xml"), "w", encoding="utf-8") as f:
+                    f.write(f'<?xml version="1.0" encoding="utf-8"?>\n<contentpackage name="Mod{index}" steamworkshopid="{mod_id}" />\n')
+        os.makedirs(os.path.join(mods_directory, "LocalOnlyMod"))
+        with StubWorkshopServer(details_by_id) as stub:
+            changed_before, extracted_versions = workshop_metadata.changed_mods(mods_directory, stub.endpoint, cache_path)
+            versions_path = os.path.join(work_directory, "extracted_versions.json")
+            workshop_metadata.save_extracted_versions(extracted_versions, versions_path)
+            # Моды обновились в Steam после извлечения, но до отметки перевода
+            for mod_id in mod_ids[:3]:
+                details_by_id[mod_id] = dict(details_by_id[mod_id], time_updated=details_by_id[mod_id]["time_updated"] + 86400)
+            workshop_metadata.mark_translated(versions_path, cache_path)
+            changed_after, _ = workshop_metadata.changed_mods(mods_directory, stub.endpoint, cache_path, max_age_seconds=0)
+        report["changed_before_first_translation"] = len(changed_before)
+        report["changed_after_update"] = changed_after
+        report["changed_selection_correct"] = len(changed_before) == 20 and sorted(changed_after) == sorted([mod_ids[0], "Mod1", mod_ids[2]])
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Benchmark report saved to: {os.path.abspath(output_path)}")
+    return report
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and time workshop_metadata.py against a local stub of the Steam Workshop API")
+    parser.add_argument("--mods", type=int, default=MOD_COUNT, help="Number of synthetic Workshop mods")
+    parser.add_argument("--output", default=OUTPUT_JSON_FILE)
+    args = parser.parse_args()
+    report = main(args.mods, args.output)
+    checks = ["results_match", "cached_results_match", "retried_results_complete", "partial_results_kept", "changed_selection_correct"]
+    if not all(report[check] for check in checks) or report["cached_requests_to_server"]:
+        raise SystemExit(1)
@@ -2,41 +2,45 @@ import os
 from lxml import etree as ET
 from xml.sax.saxutils import unescape, escape
 import re
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from tqdm import tqdm # Импортируем tqdm
+import run_metrics # Метрики запуска (фазы очистки)
 
 # --- Конфигурация ---
 INPUT_XML_FILE_TO_CLEAN = "translation_output_final/translated_with_inline_originals.xml" 
 OUTPUT_XML_FILE_CLEANED = "translation_output_final/translated_cleaned_lxml_tqdm.xml"
 TEXT_SEPARATOR = "\n---\n"
 
-# Обновленная функция post_process_translation
-def post_process_translation(text):
-    if not text:
-        return ""
-    
-    # original_text_for_debug = text
+# Потоковый режим: iterparse -> очистка частями в пуле процессов -> запись через xmlfile.
+# Память ограничена числом частей в работе, порядок элементов сохраняется.
+STREAMING_CLEAN = False
+CLEAN_WORKERS = None # None = os.cpu_count()
+CLEAN_CHUNK_SIZE = 500 # Сколько текстов отправляется в процесс за раз
+CLEAN_MAX_CHUNKS_IN_FLIGHT = None # None = 2 * число процессов
+# Теги, текст которых не чистится
+SKIPPED_TAGS = ["infotexts", "style"]
 
-    # --- Обработка точек ---
-    text = re.sub(r'\.{3,}', '___ELLIPSIS___', text) # Сохраняем многоточия
+# Язык перевода, для которого выбираются правила очистки (см. CLEANING_RULES_BY_LANGUAGE)
+CLEANING_LANGUAGE = "Russian"
 
-    # 1. Убираем лишние точки и пробелы вокруг них, оставляя одну точку и один пробел после, если далее слово
-    # "word . . . word2" -> "word. word2"
-    # "word ... word2" (многоточие) -> "word ... word2" (не трогаем)
-    # " . . . word" -> ". word"
-    
-    # Сначала разбираемся с последовательностями "пробел-точка"
-    # " . ." -> ". " (оставляем один пробел после точки)
-    text = re.sub(r'(\s*\.\s*){2,}', '. ', text) 
-    
-    # "слово ." -> "слово."
-    text = re.sub(r'(?<=\w)\s+\.$', '.', text)
-    # "слово . слово" -> "слово. слово"
-    text = re.sub(r'(?<=\w)\s+\.(?=\s+\w)', '. ', text)
-    # " .слово" (в начале или после пробела) -> ". слово"
-    text = re.sub(r'^\s*\.(?=\s*\w)', '. ', text) # Для начала строки
-    text = re.sub(r'(?<=\s)\s*\.(?=\s*\w)', '. ', text) # Для после пробела
+ELLIPSIS_PLACEHOLDER = '___ELLIPSIS___'
+
+# --- Правила очистки перевода ---
+# Каждое правило - кортеж (вид, действие, условие):
+#   ("regex", (шаблон, замена), условие)   - re.sub с заранее скомпилированным шаблоном
+#   ("replace", (старое, новое), условие)  - str.replace
+#   ("function", функция, условие)         - произвольный шаг text -> text
+# Условие - дешевая проверка, без выполнения которой правило заведомо ничего не меняет:
+#   строка символов - правило применяется, если в тексте есть хотя бы один из них;
+#   функция text -> bool - например, поиск простого шаблона, с которого обязано начинаться совпадение;
+#   None - правило применяется всегда.
+# Условие должно быть необходимым для срабатывания правила, иначе результат изменится.
 
-    # Итеративная очистка " . " в конце, если предыдущие шаги не справились полностью
+def _strip_trailing_space_dots(text):
+    """Итеративная очистка " . " в конце, если предыдущие шаги не справились полностью."""
     idx = 0
     max_iters = 5 # Уменьшил, т.к. предыдущие шаги должны были многое сделать
     while idx < max_iters and (text.endswith(" .") or text.endswith(" . ")):
@@ -45,56 +49,134 @@ def post_process_translation(text):
         elif text.endswith(" ."):
             text = text[:-2].strip()
         idx += 1
-        
-    if text and text[-1].isalnum() and not text.endswith('.') and not text.endswith('___ELLIPSIS___'):
+    return text
+
+def _add_final_period(text):
+    if text and text[-1].isalnum() and not text.endswith('.') and not text.endswith(ELLIPSIS_PLACEHOLDER):
         text += '.'
-    
-    text = text.replace('___ELLIPSIS___', '...')
+    return text
+
+def _contains_pattern(pattern):
+    return re.compile(pattern).search
+
+RUSSIAN_CLEANING_RULES = [
+    # --- Обработка точек ---
+    ("regex", (r'\.{3,}', ELLIPSIS_PLACEHOLDER), lambda text: '...' in text), # Сохраняем многоточия
+    # " . ." -> ". " (оставляем один пробел после точки); "word . . . word2" -> "word. word2"
+    ("regex", (r'(\s*\.\s*){2,}', '. '), _contains_pattern(r'\.\s*\.')),
+    # "слово ." -> "слово."
+    ("regex", (r'(?<=\w)\s+\.$', '.'), lambda text: text.endswith(('.', '.\n'))),
+    # "слово . слово" -> "слово. слово"
+    ("regex", (r'(?<=\w)\s+\.(?=\s+\w)', '. '), _contains_pattern(r'\s\.\s')),
+    # " .слово" (в начале или после пробела) -> ". слово"
+    ("regex", (r'^\s*\.(?=\s*\w)', '. '), lambda text: text.lstrip().startswith('.')), # Для начала строки
+    ("regex", (r'(?<=\s)\s*\.(?=\s*\w)', '. '), _contains_pattern(r'\s\.')), # Для после пробела
+    ("function", _strip_trailing_space_dots, lambda text: text.endswith((" .", " . "))),
+    ("function", _add_final_period, None),
+    ("replace", (ELLIPSIS_PLACEHOLDER, '...'), lambda text: ELLIPSIS_PLACEHOLDER in text),
 
     # --- Обработка дефисов/тире ---
-    text = re.sub(r'(?<=\w)\s+-\s+(?=\w)', '-', text)
-    text = re.sub(r'\s+-\s*$', '', text) 
-    text = re.sub(r'^\s*-\s+', '', text) 
-    text = re.sub(r'(?<=\w)\s+-\s+\.(?=\s|$)', '.', text)
+    ("regex", (r'(?<=\w)\s+-\s+(?=\w)', '-'), "-"),
+    ("regex", (r'\s+-\s*$', ''), "-"),
+    ("regex", (r'^\s*-\s+', ''), "-"),
+    ("regex", (r'(?<=\w)\s+-\s+\.(?=\s|$)', '.'), "-"),
 
     # --- Обработка восклицательных знаков ---
-    text = re.sub(r'!{2,}', '!', text) 
-    text = re.sub(r'\s*!\s*!\s*', '! ', text) 
+    ("regex", (r'!{2,}', '!'), "!"),
+    ("regex", (r'\s*!\s*!\s*', '! '), "!"),
 
     # --- Обработка вопросительных знаков ---
-    text = re.sub(r'\?{2,}', '?', text) 
-    text = re.sub(r'\s*\?\s*\?\s*', '? ', text) 
+    ("regex", (r'\?{2,}', '?'), "?"),
+    ("regex", (r'\s*\?\s*\?\s*', '? '), "?"),
 
     # --- Общие правила очистки ---
-    text = re.sub(r'\s+([.,;:!?])', r'\1', text)
-    text = re.sub(r'\s{2,}', ' ', text)
-    text = text.strip()
-        
-    # if text != original_text_for_debug:
-    #     print(f"DEBUG Post-Process: \n  Original: '{original_text_for_debug}'\n  Cleaned:  '{text}'")
-        
+    ("regex", (r'\s+([.,;:!?])', r'\1'), _contains_pattern(r'\s[.,;:!?]')),
+    ("regex", (r'\s{2,}', ' '), None),
+    ("function", str.strip, None),
+]
+
+# Наборы правил по языку перевода. Для нового языка достаточно добавить сюда свой список.
+CLEANING_RULES_BY_LANGUAGE = {
+    "Russian": RUSSIAN_CLEANING_RULES,
+}
+
+def _contains_any_char(chars, text):
+    return any(char in text for char in chars)
+
+def compile_cleaning_rules(rules):
+    """Превращает таблицу правил в список шагов (функция, условие) с заранее скомпилированными шаблонами."""
+    compiled_steps = []
+    for kind, action, condition in rules:
+        if kind == "regex":
+            pattern, replacement = action
+            step = partial(re.compile(pattern).sub, replacement)
+        elif kind == "replace":
+            old, new = action
+            step = lambda text, old=old, new=new: text.replace(old, new)
+        elif kind == "function":
+            step = action
+        else:
+            raise ValueError(f"Unknown cleaning rule kind: {kind}")
+        if isinstance(condition, str):
+            condition = partial(_contains_any_char, tuple(condition))
+        compiled_steps.append((step, condition))
+    return compiled_steps
+
+_compiled_rules_cache = {}
+
+def get_compiled_cleaning_rules(language):
+    """Скомпилированные правила для языка (правила неизвестного языка - как для CLEANING_LANGUAGE)."""
+    compiled_steps = _compiled_rules_cache.get(language)
+    if compiled_steps is None:
+        rules = CLEANING_RULES_BY_LANGUAGE.get(language, CLEANING_RULES_BY_LANGUAGE[CLEANING_LANGUAGE])
+        compiled_steps = compile_cleaning_rules(rules)
+        _compiled_rules_cache[language] = compiled_steps
+    return compiled_steps
+
+def post_process_translation(text, language=None):
+    """Очищает машинный перевод по таблице правил языка (по умолчанию CLEANING_LANGUAGE)."""
+    if not text:
+        return ""
+    for step, condition in get_compiled_cleaning_rules(language or CLEANING_LANGUAGE):
+        if condition is None or condition(text):
+            text = step(text)
     return text
+
+def clean_combined_text(unescaped_full_text):
+    """Чистит переводную часть текста "перевод{TEXT_SEPARATOR}оригинал". Возвращает (новый текст, изменился ли он)."""
+    parts = unescaped_full_text.split(TEXT_SEPARATOR, 1)
+    
+    if len(parts) == 2:
+        translated_part = parts[0]
+        original_part = parts[1]
+        cleaned_translated_part = post_process_translation(translated_part)
+        return f"{cleaned_translated_part}{TEXT_SEPARATOR}{original_part}", cleaned_translated_part != translated_part
+
+    cleaned_full_text = post_process_translation(unescaped_full_text)
+    return cleaned_full_text, cleaned_full_text != unescaped_full_text
+
 # --- Основная логика ---
-def main():
-    print(f"Starting to process file: {INPUT_XML_FILE_TO_CLEAN}")
+def main(input_path=INPUT_XML_FILE_TO_CLEAN, output_path=OUTPUT_XML_FILE_CLEANED):
+    print(f"Starting to process file: {input_path}")
     try:
         parser = ET.XMLParser(remove_blank_text=True)
         print("Parsing XML file...") 
-        tree = ET.parse(INPUT_XML_FILE_TO_CLEAN, parser)
+        with run_metrics.phase("parse_input"):
+            tree = ET.parse(input_path, parser)
         root = tree.getroot()
         print("XML file parsed.")
     except FileNotFoundError:
-        print(f"Error: Input file not found at {INPUT_XML_FILE_TO_CLEAN}")
+        print(f"Error: Input file not found at {input_path}")
         return
     except ET.XMLSyntaxError as e: 
-        print(f"Error: Could not parse XML file {INPUT_XML_FILE_TO_CLEAN}: {e}")
+        print(f"Error: Could not parse XML file {input_path}: {e}")
         return
 
     nodes_to_process = []
     # Сначала соберем все узлы, которые нужно обработать, чтобы tqdm знал общее количество
     print("Collecting text nodes for processing...")
     for element in root.iter():
-        if isinstance(element.tag, str) and element.tag.lower() in ["infotexts", "style"]:
+        if isinstance(element.tag, str) and element.tag.lower() in SKIPPED_TAGS:
             continue
         if not isinstance(element.tag, str): 
              continue
@@ -113,47 +195,155 @@ def main():
     # Оборачиваем итерацию по узлам в tqdm для отображения прогресс-бара
     # desc="Cleaning XML" - это описание для прогресс-бара
     # unit="node" - это единица измерения (обрабатываем "узел")
-    for element in tqdm(nodes_to_process, desc="Cleaning XML", unit="node", ncols=100): # ncols для ширины бара
-        escaped_full_text = element.text # element.text здесь уже должен существовать
-        unescaped_full_text = unescape(escaped_full_text)
-        
-        parts = unescaped_full_text.split(TEXT_SEPARATOR, 1)
-        
-        new_unescaped_full_text = unescaped_full_text 
-        changed_this_node = False
-
-        if len(parts) == 2:
-            translated_part = parts[0]
-            original_part = parts[1]
-            cleaned_translated_part = post_process_translation(translated_part)
+    with run_metrics.phase("clean", nodes=len(nodes_to_process)):
+        for element in tqdm(nodes_to_process, desc="Cleaning XML", unit="node", ncols=100): # ncols для ширины бара
+            escaped_full_text = element.text # element.text здесь уже должен существовать
+            unescaped_full_text = unescape(escaped_full_text)
             
-            if cleaned_translated_part != translated_part:
-                changed_this_node = True
-            new_unescaped_full_text = f"{cleaned_translated_part}{TEXT_SEPARATOR}{original_part}"
-        else:
-            cleaned_full_text = post_process_translation(unescaped_full_text)
-            if cleaned_full_text != unescaped_full_text:
-                changed_this_node = True
-            new_unescaped_full_text = cleaned_full_text
-        
-        if changed_this_node:
-            nodes_changed += 1
-        
-        element.text = escape(new_unescaped_full_text)
+            new_unescaped_full_text, changed_this_node = clean_combined_text(unescaped_full_text)
+            
+            if changed_this_node:
+                nodes_changed += 1
+            
+            element.text = escape(new_unescaped_full_text)
+        run_metrics.add_counts(nodes_changed=nodes_changed)
 
     print(f"\nCleaning finished. Processed {len(nodes_to_process)} text elements.") # \n чтобы не затереть бар
     print(f"Changed {nodes_changed} text elements due to cleaning.")
 
     print("Saving cleaned XML file...")
     try:
-        output_dir = os.path.dirname(OUTPUT_XML_FILE_CLEANED)
+        output_dir = os.path.dirname(output_path)
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        tree.write(OUTPUT_XML_FILE_CLEANED, encoding="utf-8", xml_declaration=True, pretty_print=True)
-        print(f"Cleaned XML saved to: {os.path.abspath(OUTPUT_XML_FILE_CLEANED)}")
+        with run_metrics.phase("write_output"):
+            tree.write(output_path, encoding="utf-8", xml_declaration=True, pretty_print=True)
+        print(f"Cleaned XML saved to: {os.path.abspath(output_path)}")
     except Exception as e:
         print(f"Error saving cleaned XML file: {e}")
 
+# --- Потоковый режим ---
+def clean_texts_chunk(unescaped_texts):
+    """Чистит список текстов в процессе пула. Возвращает список (новый текст, изменился ли он)."""
+    return [clean_combined_text(text) for text in unescaped_texts]
+
+def _elements_to_clean(top_element):
+    """Элементы поддерева, текст которых чистится (те же условия, что и в main)."""
+    return [
+        element for element in top_element.iter()
+        if isinstance(element.tag, str) and element.tag.lower() not in SKIPPED_TAGS and element.text
+    ]
+
+def _iter_top_level_elements(input_path, root_holder):
+    """Потоково разбирает файл и выдает дочерние элементы корня по мере их окончания."""
+    depth = 0
+    for event, element in ET.iterparse(input_path, events=("start", "end"), remove_blank_text=True):
+        if event == "start":
+            if depth == 0:
+                root_holder.append(element)
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield element
+
+def main_streaming(input_path=INPUT_XML_FILE_TO_CLEAN, output_path=OUTPUT_XML_FILE_CLEANED, workers=CLEAN_WORKERS, chunk_size=CLEAN_CHUNK_SIZE):
+    """Потоковая очистка: результат совпадает с main() для файлов вида <infotexts><tag>...</tag>...</infotexts>."""
+    print(f"Starting to stream-process file: {input_path}")
+    if not os.path.exists(input_path):
+        print(f"Error: Input file not found at {input_path}")
+        return None
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    workers = workers or os.cpu_count() or 1
+    max_chunks_in_flight = CLEAN_MAX_CHUNKS_IN_FLIGHT or 2 * workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    stats = {"nodes_processed": 0, "nodes_changed": 0}
+    pending_chunks = deque() # (элементы верхнего уровня, элементы для очистки, future или результат)
+    root_holder = []
+    temporary_path = output_path + ".tmp"
+
+    def submit_chunk(top_elements):
+        targets = [element for top_element in top_elements for element in _elements_to_clean(top_element)]
+        texts = [unescape(element.text) for element in targets]
+        if executor is not None:
+            pending_chunks.append((top_elements, targets, executor.submit(clean_texts_chunk, texts)))
+        else:
+            pending_chunks.append((top_elements, targets, clean_texts_chunk(texts)))
+
+    def write_oldest_chunk(xf, progress):
+        top_elements, targets, result = pending_chunks.popleft()
+        cleaned = result.result() if executor is not None else result
+        for element, (new_unescaped_full_text, changed_this_node) in zip(targets, cleaned):
+            if changed_this_node:
+                stats["nodes_changed"] += 1
+            element.text = escape(new_unescaped_full_text)
+        root = root_holder[0]
+        for top_element in top_elements:
+            if len(top_element) and not top_element.text:
+                ET.indent(top_element, space="  ", level=1) # pretty_print не форматирует элементы со смешанным содержимым
+            top_element.tail = None
+            xf.write("\n  ")
+            xf.write(top_element)
+            root.remove(top_element) # Записанный элемент больше не нужен - освобождаем память
+        stats["nodes_processed"] += len(targets)
+        progress.update(len(targets))
+
+    try:
+        with run_metrics.phase("stream_clean"), open(temporary_path, "wb") as output_file, tqdm(desc="Cleaning XML", unit="node", ncols=100) as progress:
+            output_file.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+            elements = _iter_top_level_elements(input_path, root_holder)
+            first_element = next(elements, None)
+            root = root_holder[0]
+            with ET.xmlfile(output_file, encoding="utf-8") as xf:
+                with xf.element(root.tag, dict(root.attrib), nsmap=root.nsmap):
+                    chunk = [] if first_element is None else [first_element]
+                    for element in elements:
+                        chunk.append(element)
+                        if len(chunk) >= chunk_size:
+                            submit_chunk(chunk)
+                            chunk = []
+                            while len(pending_chunks) > max_chunks_in_flight:
+                                write_oldest_chunk(xf, progress)
+                    if chunk:
+                        submit_chunk(chunk)
+                    while pending_chunks:
+                        write_oldest_chunk(xf, progress)
+                    run_metrics.add_counts(nodes=stats["nodes_processed"], nodes_changed=stats["nodes_changed"])
+                    if first_element is not None:
+                        xf.write("\n")
+            output_file.write(b"\n")
+        os.replace(temporary_path, output_path)
+    except ET.XMLSyntaxError as e:
+        print(f"Error: Could not parse XML file {input_path}: {e}")
+        return None
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    print(f"\nCleaning finished. Processed {stats['nodes_processed']} text elements.")
+    print(f"Changed {stats['nodes_changed']} text elements due to cleaning.")
+    print(f"Cleaned XML saved to: {os.path.abspath(output_path)}")
+    return stats
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clean machine-translated texts in the translated XML file")
+    parser.add_argument("--input", default=INPUT_XML_FILE_TO_CLEAN, help="Translated file to clean (or one translated shard)")
+    parser.add_argument("--output", default=OUTPUT_XML_FILE_CLEANED, help="Cleaned file to write")
+    parser.add_argument("--streaming", action="store_true", default=STREAMING_CLEAN, help="Stream the file and clean chunks in a process pool")
+    parser.add_argument("--workers", type=int, default=CLEAN_WORKERS, help="Number of cleaning processes in streaming mode")
+    parser.add_argument("--chunk-size", type=int, default=CLEAN_CHUNK_SIZE, help="Texts per chunk sent to a cleaning process")
+    parser.add_argument("--metrics", action="store_true", default=run_metrics.COLLECT_METRICS, help="Write a JSON/CSV run report (see run_metrics.py)")
+    parser.add_argument("--profile", choices=run_metrics.PROFILER_CHOICES, default=run_metrics.PROFILER, help="Profile the run")
+    args = parser.parse_args()
+    with run_metrics.run("clean", args.metrics, args.profile):
+        if args.streaming:
+            main_streaming(args.input, args.output, workers=args.workers, chunk_size=args.chunk_size)
+        else:
+            main(args.input, args.output)
\ No newline at end of file
@@ -0,0 +1,119 @@
+import os
+import re
+import json
+import fnmatch
+import hashlib
+
+# Индекс исключений для extract_text.py: какие теги не содержат переводимый текст,
+# какие теги не считаются ключами существующего перевода и какие файлы модов не разбираются вовсе.
+# Строится один раз на модуль; решение по каждому имени тега запоминается, т.к. одни и те же
+# имена тегов повторяются в модах миллионы раз.
+#
+# Формат файла настроек (JSON), любое поле можно опустить - тогда берется значение по умолчанию:
+# {
+#   "excluded_tags": ["sound", "sprite", ...],          # точные имена тегов (без учета регистра)
+#   "excluded_tag_patterns": ["param.*", "typeparam.*"], # шаблоны fnmatch для имен тегов
+#   "key_skipped_tags": ["infotexts", "style"],          # теги, не дающие ключей существующего перевода
+#   "excluded_file_patterns": ["*/filelist.xml"],        # шаблоны fnmatch для путей файлов относительно папки модов
+#   "lua_include_patterns": ["*"],                       # какие .lua файлы разбирать (пути относительно папки мода)
+#   "lua_exclude_patterns": ["lib/*", "*/vendor/*"],     # какие .lua файлы не разбирать никогда
+#   "lua_patterns_by_mod": {"SomeMod": {"include": ["Lua/*"], "exclude": ["Lua/lib/*"]}}  # замена общих шаблонов для мода
+# }
+
+# Сколько решений по именам тегов хранить (имен тегов в модах немного, но ограничим на всякий случай)
+MAX_CACHED_TAG_DECISIONS = 100000
+
+
+def _compile_patterns(patterns):
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def _normalize_path_patterns(patterns):
+    return tuple(sorted({pattern.replace("\\", "/").lower() for pattern in patterns}))
+
+
+class ExclusionIndex:
+    """Правила исключения тегов и файлов; все сравнения - без учета регистра."""
+
+    def __init__(self, excluded_tags=(), excluded_tag_patterns=(), key_skipped_tags=(), excluded_file_patterns=(),
+                 lua_include_patterns=("*",), lua_exclude_patterns=(), lua_patterns_by_mod=None):
+        self.excluded_tags = frozenset(tag.lower() for tag in excluded_tags)
+        self.excluded_tag_patterns = tuple(sorted({pattern.lower() for pattern in excluded_tag_patterns}))
+        self.key_skipped_tags = frozenset(tag.lower() for tag in key_skipped_tags)
+        self.excluded_file_patterns = _normalize_path_patterns(excluded_file_patterns)
+        self.lua_include_patterns = _normalize_path_patterns(lua_include_patterns)
+        self.lua_exclude_patterns = _normalize_path_patterns(lua_exclude_patterns)
+        self.lua_patterns_by_mod = {
+            mod_name.lower(): (_normalize_path_patterns(patterns.get("include", ("*",))), _normalize_path_patterns(patterns.get("exclude", ())))
+            for mod_name, patterns in (lua_patterns_by_mod or {}).items()
+        }
+        self._tag_pattern_re = _compile_patterns(self.excluded_tag_patterns)
+        self._file_pattern_re = _compile_patterns(self.excluded_file_patterns)
+        self._lua_default_res = (_compile_patterns(self.lua_include_patterns), _compile_patterns(self.lua_exclude_patterns))
+        self._lua_res_by_mod = {
+            mod_name: (_compile_patterns(include), _compile_patterns(exclude))
+            for mod_name, (include, exclude) in self.lua_patterns_by_mod.items()
+        }
+        self._tag_decisions = {}
+
+    @classmethod
+    def from_config_file(cls, config_path, **defaults):
+        """Читает настройки из JSON; отсутствующие поля (или весь файл) берутся из defaults."""
+        settings = dict(defaults)
+        if config_path and os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            unknown_fields = set(loaded) - set(defaults)
+            if unknown_fields:
+                raise ValueError(f"Unknown fields in exclusion config {config_path}: {sorted(unknown_fields)}")
+            settings.update(loaded)
+        return cls(**settings)
+
+    def is_excluded_tag(self, tag):
+        """Исключен ли тег (имя тега как в файле) из извлечения текстов."""
+        decision = self._tag_decisions.get(tag)
+        if decision is None:
+            lowered = tag.lower()
+            decision = lowered in self.excluded_tags or (
+                self._tag_pattern_re is not None and self._tag_pattern_re.match(lowered) is not None
+            )
+            if len(self._tag_decisions) >= MAX_CACHED_TAG_DECISIONS:
+                self._tag_decisions.clear()
+            self._tag_decisions[tag] = decision
+        return decision
+
+    def is_key_skipped_tag(self, tag):
+        return tag.lower() in self.key_skipped_tags
+
+    def is_excluded_file(self, filepath, base_directory):
+        """Исключен ли файл; шаблоны сравниваются с путем относительно base_directory через "/"."""
+        if self._file_pattern_re is None:
+            return False
+        relative_path = os.path.relpath(filepath, base_directory).replace(os.sep, "/").lower()
+        return self._file_pattern_re.match(relative_path) is not None
+
+    def is_scanned_lua_file(self, filepath, base_directory, mod_name):
+        """Разбирать ли .lua файл: шаблоны мода (или общие) сравниваются с путем относительно папки мода."""
+        include_re, exclude_re = self._lua_res_by_mod.get(mod_name.lower(), self._lua_default_res)
+        path_parts = os.path.relpath(filepath, base_directory).replace(os.sep, "/").lower().split("/")
+        if len(path_parts) > 1 and path_parts[0] == mod_name.lower():
+            path_parts = path_parts[1:]
+        mod_relative_path = "/".join(path_parts)
+        if include_re is None or include_re.match(mod_relative_path) is None:
+            return False
+        return exclude_re is None or exclude_re.match(mod_relative_path) is None
+
+    def fingerprint(self):
+        """Короткий хэш правил - для сигнатуры кэша извлечения."""
+        rules = {
+            "excluded_tags": sorted(self.excluded_tags),
+            "excluded_tag_patterns": list(self.excluded_tag_patterns),
+            "key_skipped_tags": sorted(self.key_skipped_tags),
+            "excluded_file_patterns": list(self.excluded_file_patterns),
+            "lua_include_patterns": list(self.lua_include_patterns),
+            "lua_exclude_patterns": list(self.lua_exclude_patterns),
+            "lua_patterns_by_mod": {mod_name: [list(include), list(exclude)] for mod_name, (include, exclude) in self.lua_patterns_by_mod.items()},
+        }
+        return hashlib.sha1(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
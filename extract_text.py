@@ -3,6 +3,15 @@ import xml.etree.ElementTree as ET
 import re
 from xml.sax.saxutils import escape # Для экранирования текстового содержимого XML
 from collections import defaultdict # Для удобного подсчета
+from concurrent.futures import ProcessPoolExecutor # Для параллельного разбора файлов
+from functools import partial, lru_cache
+from extraction_cache import ExtractionCache # Постоянный кэш результатов разбора файлов
+from exclusion_index import ExclusionIndex # Правила исключения тегов и файлов
+from lua_lexer import iter_lua_text_strings # Разбор строковых литералов Lua
+from tag_statistics import TagStatistics # Компактная статистика для анализа частых тегов
+import time
+import argparse
+import run_metrics # Метрики запуска (фазы, время разбора по файлам)
 
 # --- Конфигурация ---
 # Язык, который мы хотим извлечь (исходный язык текстов из XML)
@@ -18,27 +27,153 @@ TARGET_OUTPUT_TRANSLATED_NAME = "Русский" # Для атрибута trans
 # Выводить теги, встретившиеся это количество раз или больше в рамках одного мода.
 # Можно также сделать глобальный подсчет, если убрать mod_name из ключей статистики.
 DUPLICATE_TAG_THRESHOLD = 5
+# Анализ часто встречающихся тегов можно выключить совсем (флаг --no-tag-stats), например на рабочих запусках
+FREQUENT_TAGS_ANALYSIS = True
+
+# Количество процессов для разбора файлов модов (None = по числу ядер, 1 = без пула процессов)
+SCAN_WORKERS = None
+# Сколько файлов отдается процессу за один раз (меньше накладных расходов на передачу задач)
+SCAN_CHUNKSIZE = 16
+
+# --- Кэш извлечения ---
+# Результаты разбора каждого файла сохраняются в SQLite и переиспользуются, пока у файла
+# не изменились размер и mtime. Удаленные файлы вычищаются из кэша автоматически.
+USE_EXTRACTION_CACHE = True
+EXTRACTION_CACHE_FILE = os.path.join("translation_output_for_extractor", "extraction_cache.sqlite")
+# Дополнительно сверять хэш содержимого, если изменился только mtime (медленнее, но переживает перекачку модов)
+EXTRACTION_CACHE_USE_CONTENT_HASH = False
+# Увеличивайте при изменении правил извлечения, чтобы старый кэш сбросился
+# (изменения списков исключений учитываются в сигнатуре кэша автоматически)
+EXTRACTION_RULES_VERSION = 4
+
+# --- Потоковый разбор XML ---
+# True: файлы читаются через iterparse - язык проверяется по корневому элементу до разбора
+# остального файла, обработанные элементы сразу удаляются, и память не растет с размером файла.
+# False: весь файл строится в дерево через ET.parse (прежнее поведение).
+STREAMING_XML_EXTRACTION = True
+# True: не заходить внутрь исключенных тегов (item, character, ...) целиком.
+# По умолчанию исключается только сам тег, а его дочерние элементы проверяются, как и раньше.
+STREAMING_SKIP_EXCLUDED_SUBTREES = False
+
+# --- Потоковая запись результата ---
+# True: моды разбираются и пишутся в выходной файл по одному (iter_texts_by_mod), и в памяти
+# держатся записи только текущего мода. Порядок и содержимое файла те же, что и при False.
+STREAMING_OUTPUT = False
+# Разбиение результата на несколько файлов, которые можно переводить независимо (Helsinki.py --input):
+# None - один файл; "mod" - файл на каждый мод; "entries" - новый файл каждые OUTPUT_SHARD_MAX_ENTRIES записей.
+# Файлы называются как выходной файл с номером: strings_for_translation.0001_ModName.xml / strings_for_translation.0001.xml
+# Каждый шард проходит Helsinki.py --input/--output и clean.py --input/--output сам по себе (у перевода
+# каждого шарда свой журнал) и остается самостоятельным файлом <infotexts>.
+OUTPUT_SHARD_BY = None
+OUTPUT_SHARD_MAX_ENTRIES = 5000
+OUTPUT_SHARD_CHOICES = ["mod", "entries"]
+
+# ОБНОВЛЕННЫЙ И РАСШИРЕННЫЙ СПИСОК ИСКЛЮЧЕНИЙ (ориентируйтесь на реальные теги из вашей игры)
+# Список тегов, которые обычно не содержат переводимый текст
+# или являются контейнерами/служебными тегами
+EXCLUDED_TAGS = {
+    "infotexts", "style", "sound", "sprite", "animation", "limb", "trigger",
+    "statvalue", "objective", "particleemitter", "damagemodifier", "attack",
+    "character", "job", "item", "structure", "locationtype",
+    "levelgenerationparameters", "mission", "event", "eventset", "characterinfo",
+    "ragdoll", "campaignsettings", "destructible", "fabricator", "deconstructor",
+    "repairable", "controller", "connectionpanel", "engine", "pump", "reactor",
+    "turret", "itemcontainer", "door", "medicalclinic", "talenttree", "talents",
+    "submarine", "shuttle", "upgradecategory", "upgrademodule", "afflictions",
+    "geneticmaterial", "mapgenerationparameters", "allowwhenriding", "allowatsub",
+    "allowatbeaconstation", "allowatoutpost", "allowatcity", "allowatcolonies",
+    "allowatdestroyeddoutpost", "allowatabandonedoutpost", "allowatruins",
+    "allowatwreck", "allowatcave", "allowatpirateoutpost", "commonness",
+    "requiredcampaignlevel", "campaignonly", "health", "price", "fabricationtime", 
+    "deconstructtime", "containable", "spritecolor", "decorativesprite", "music",
+    # Дополнительные общие исключения:
+    "useverb", "examineverb", "pickupverb", # Часто стандартные и не меняются
+    "requireditem", "requiredskill", "itemidentifier", "structureidentifier",
+    "characteridentifier", "soundfile", "musicfile", "imagefile", "texture", "animationfile",
+    "soundchannel", "soundvolume", "soundrange", "loop", "playonstart",
+    "color", "vector2", "vector3", "vector4", "rect", "point", "offset", "scale", "size",
+    "limbname", "bonename", "jointname", # Часто внутренние идентификаторы
+    "state", "type", "category", "group", "layer", "order", "slot",
+    "targettag", "sourcetag", "linkedsub", "linkeduuid",
+    "variable", "property", "value", # Если их значения не являются текстом (числа, bool)
+    "button", # Если это имя кнопки для скриптинга, а не видимый текст
+    "command", "script", "function", "eventname",
+    "dialogflag", "objectiveflag", "questflag", # Флаги, а не текст
+    "classname", "speciesname", # Часто внутренние ID
+    "filename", "path", # Пути к файлам
+    "default", # Если это значение по умолчанию, которое не должно меняться
+    "ambientmccormicks", "author", "id",
+    # Теги XML-документации Lua/C# API (параметры param.* и typeparam.* - в EXCLUDED_TAG_PATTERNS)
+    "summary", "returns", "remarks", "c", "para", "see", "code", "exception", "override",
+    "lua_name", "lua_description",
+    # Отдельные строки, которые переводить не нужно
+    "locationchange.base.changeto.military", "eventtext.blockadealarm.breakin", "locationnameformat.mine",
+    "loadingscreentip", "dialogturnoffsonar", "dialogcantfindanechoicsuit",
+}
+
+# Шаблоны имен тегов (fnmatch, без учета регистра), исключаемых целиком
+EXCLUDED_TAG_PATTERNS = ["param.*", "typeparam.*"]
+# Теги, которые не считаются ключами уже существующего перевода
+KEY_SKIPPED_TAGS = ["infotexts", "style"]
+# Шаблоны путей файлов (относительно папки модов, через "/"), которые не разбираются вовсе
+EXCLUDED_FILE_PATTERNS = []
+# Какие .lua файлы разбирать: шаблоны путей относительно папки мода (через "/").
+# Файл разбирается, если подходит под include и не подходит под exclude, например
+# LUA_EXCLUDE_PATTERNS = ["lib/*", "*/vendor/*"] - не читать встроенные в моды библиотеки.
+LUA_INCLUDE_PATTERNS = ["*"]
+LUA_EXCLUDE_PATTERNS = []
+# Свои шаблоны для отдельных модов: {"Имя мода": {"include": [...], "exclude": [...]}} (заменяют общие)
+LUA_PATTERNS_BY_MOD = {}
+# Файл настроек исключений (JSON, формат - в exclusion_index.py). Если файла нет, берутся списки выше.
+EXCLUSION_CONFIG_FILE = "extraction_exclusions.json"
+
+# Размер LRU-кэша санитизации имен тегов и идентификаторов
+SANITIZE_CACHE_SIZE = 65536
+
+EXCLUSION_INDEX = ExclusionIndex.from_config_file(
+    EXCLUSION_CONFIG_FILE,
+    excluded_tags=EXCLUDED_TAGS,
+    excluded_tag_patterns=EXCLUDED_TAG_PATTERNS,
+    key_skipped_tags=KEY_SKIPPED_TAGS,
+    excluded_file_patterns=EXCLUDED_FILE_PATTERNS,
+    lua_include_patterns=LUA_INCLUDE_PATTERNS,
+    lua_exclude_patterns=LUA_EXCLUDE_PATTERNS,
+    lua_patterns_by_mod=LUA_PATTERNS_BY_MOD,
+)
+
+# --- Извлечение из Lua ---
+# Ключи, строковые значения которых считаются текстом (name = "...", t.tooltip = '...')
+LUA_TEXT_KEYS = {"name", "label", "displayname", "tooltip", "description", "text"}
+# Функции, строковые аргументы которых считаются текстом; сравнивается хвост цепочки a.b.c без учета регистра
+LUA_TEXT_FUNCTIONS = {"text", "texts.get", "game.showmessagebox"}
 
 # --- Вспомогательные функции ---
 
-def sanitize_xml_tag_name(name):
-    """Санитизирует строку, чтобы она была валидным именем XML-тега."""
-    if not isinstance(name, str):
-        name = str(name)
-    
-    name = re.sub(r'\s+', '_', name)
-    name = re.sub(r'[^a-zA-Z0-9_.-]', '', name)
+_WHITESPACE_RUN_RE = re.compile(r'\s+')
+_INVALID_TAG_CHARS_RE = re.compile(r'[^a-zA-Z0-9_.-]')
+_INVALID_TAG_START_RE = re.compile(r'^[0-9.-]')
+
+@lru_cache(maxsize=SANITIZE_CACHE_SIZE)
+def _sanitize_xml_tag_name_cached(name):
+    name = _WHITESPACE_RUN_RE.sub('_', name)
+    name = _INVALID_TAG_CHARS_RE.sub('', name)
     
     if not name:
         return "sanitized_empty_tag"
         
-    if re.match(r'^[0-9.-]', name) or name.lower().startswith("xml"):
+    if _INVALID_TAG_START_RE.match(name) or name.lower().startswith("xml"):
         name = "_" + name
     
     if not name:
         return "invalid_tag_fallback"
     return name
 
+def sanitize_xml_tag_name(name):
+    """Санитизирует строку, чтобы она была валидным именем XML-тега."""
+    if not isinstance(name, str):
+        name = str(name)
+    return _sanitize_xml_tag_name_cached(name)
+
 def get_mod_name_from_path(filepath, base_mods_directory):
     """Определяет имя мода на основе пути к файлу и корневой директории модов."""
     try:
@@ -77,125 +212,89 @@ def get_mod_name_from_path(filepath, base_mods_directory):
         return parent_dir if parent_dir else "UnknownModPathError"
 
 
+@lru_cache(maxsize=SANITIZE_CACHE_SIZE)
+def _full_tag_for(original_tag_name, id_val):
+    """Ключ вида tag.identifier по имени тега и значению identifier/name (результат запоминается)."""
+    sanitized_main_tag = sanitize_xml_tag_name(original_tag_name)
+    if id_val:
+        sanitized_id_val = sanitize_xml_tag_name(id_val)
+        if sanitized_id_val and sanitized_id_val not in ("sanitized_empty_tag", "invalid_tag_fallback"):
+            full_tag = f"{sanitized_main_tag}.{sanitized_id_val}"
+        else:
+            full_tag = sanitized_main_tag
+    else:
+        full_tag = sanitized_main_tag
+    
+    return sanitize_xml_tag_name(full_tag)
+
+
+def _element_full_tag(element):
+    """Строит санитизированный ключ вида tag.identifier для элемента XML."""
+    return _full_tag_for(element.tag, element.get('identifier') or element.get('name'))
+
+
+def _is_source_language_file(file_language, lang_filter):
+    """Файл без атрибута language считается английским."""
+    if file_language:
+        return file_language.lower() == lang_filter.lower()
+    return lang_filter.lower() == "english"
+
+
+def _extract_keys_from_root(root, lang_to_extract):
+    """Собирает ключи (санитизированные full_tag) из уже разобранного корня XML для указанного языка."""
+    keys = set()
+    file_language = root.get("language")
+
+    if file_language and file_language.lower() == lang_to_extract.lower():
+        for element in root.iter():
+            if EXCLUSION_INDEX.is_key_skipped_tag(element.tag):
+                continue
+            
+            full_tag = _element_full_tag(element)
+            keys.add(full_tag)
+    return keys
+
+
 def extract_keys_from_xml(filepath, lang_to_extract):
     """Извлекает ключи (санитизированные full_tag) из XML файла для указанного языка."""
-    keys = set()
     try:
         tree = ET.parse(filepath)
-        root = tree.getroot()
-        file_language = root.get("language")
-
-        if file_language and file_language.lower() == lang_to_extract.lower():
-            for element in root.iter():
-                if element.tag.lower() in ["infotexts", "style"]:
-                    continue
-                
-                original_tag_name = element.tag
-                id_val = element.get('identifier') or element.get('name')
-                
-                sanitized_main_tag = sanitize_xml_tag_name(original_tag_name)
-                if id_val:
-                    sanitized_id_val = sanitize_xml_tag_name(id_val)
-                    if sanitized_id_val and sanitized_id_val not in ("sanitized_empty_tag", "invalid_tag_fallback"):
-                        full_tag = f"{sanitized_main_tag}.{sanitized_id_val}"
-                    else:
-                        full_tag = sanitized_main_tag
-                else:
-                    full_tag = sanitized_main_tag
-                
-                full_tag = sanitize_xml_tag_name(full_tag) 
-                keys.add(full_tag)
-        return keys
+        return _extract_keys_from_root(tree.getroot(), lang_to_extract)
     except ET.ParseError:
         return set()
     except Exception:
         return set()
 
 
+def _extract_texts_from_root(root, filepath, base_mods_directory, lang_filter):
+    """Собирает (tag, text, path, mod) из уже разобранного корня XML, если он соответствует языковому фильтру."""
+    text_list_for_file = []
+    file_language = root.get("language")
+
+    if not _is_source_language_file(file_language, lang_filter):
+        return []
+
+    mod_name = get_mod_name_from_path(filepath, base_mods_directory)
+
+    for element in root.iter():
+        if EXCLUSION_INDEX.is_excluded_tag(element.tag):
+            continue
+
+        if element.text: 
+            full_tag = _element_full_tag(element)
+
+            stripped_text = element.text.strip()
+            if stripped_text: 
+                escaped_text_content = escape(stripped_text)
+                text_list_for_file.append((full_tag, escaped_text_content, filepath, mod_name))
+    return text_list_for_file
+
+
 def extract_text_from_xml_file(filepath, base_mods_directory, lang_filter):
     """Извлекает (tag, text, path, mod) из XML, если он соответствует языковому фильтру."""
-    text_list_for_file = []
     try:
         tree = ET.parse(filepath)
-        root = tree.getroot()
-        file_language = root.get("language")
-
-        process_this_file = False
-        if file_language:
-            if file_language.lower() == lang_filter.lower():
-                process_this_file = True
-        elif lang_filter.lower() == "english": 
-            process_this_file = True
-        
-        if not process_this_file:
-            return []
-
-        mod_name = get_mod_name_from_path(filepath, base_mods_directory)
-
-        # ОБНОВЛЕННЫЙ И РАСШИРЕННЫЙ СПИСОК ИСКЛЮЧЕНИЙ (ориентируйтесь на реальные теги из вашей игры)
-        # Список тегов, которые обычно не содержат переводимый текст
-        # или являются контейнерами/служебными тегами
-        excluded_tags = {
-            "infotexts", "style", "sound", "sprite", "animation", "limb", "trigger",
-            "statvalue", "objective", "particleemitter", "damagemodifier", "attack",
-            "character", "job", "item", "structure", "locationtype",
-            "levelgenerationparameters", "mission", "event", "eventset", "characterinfo",
-            "ragdoll", "campaignsettings", "destructible", "fabricator", "deconstructor",
-            "repairable", "controller", "connectionpanel", "engine", "pump", "reactor",
-            "turret", "itemcontainer", "door", "medicalclinic", "talenttree", "talents",
-            "submarine", "shuttle", "upgradecategory", "upgrademodule", "afflictions",
-            "geneticmaterial", "mapgenerationparameters", "allowwhenriding", "allowatsub",
-            "allowatbeaconstation", "allowatoutpost", "allowatcity", "allowatcolonies",
-            "allowatdestroyeddoutpost", "allowatabandonedoutpost", "allowatruins",
-            "allowatwreck", "allowatcave", "allowatpirateoutpost", "commonness",
-            "requiredcampaignlevel", "campaignonly", "health", "price", "fabricationtime", 
-            "deconstructtime", "containable", "spritecolor", "decorativesprite", "music",
-            # Дополнительные общие исключения:
-            "useverb", "examineverb", "pickupverb", # Часто стандартные и не меняются
-            "requireditem", "requiredskill", "itemidentifier", "structureidentifier",
-            "characteridentifier", "soundfile", "musicfile", "imagefile", "texture", "animationfile",
-            "soundchannel", "soundvolume", "soundrange", "loop", "playonstart",
-            "color", "vector2", "vector3", "vector4", "rect", "point", "offset", "scale", "size",
-            "limbname", "bonename", "jointname", # Часто внутренние идентификаторы
-            "state", "type", "category", "group", "layer", "order", "slot",
-            "targettag", "sourcetag", "linkedsub", "linkeduuid",
-            "variable", "property", "value", # Если их значения не являются текстом (числа, bool)
-            "button", # Если это имя кнопки для скриптинга, а не видимый текст
-            "command", "script", "function", "eventname",
-            "dialogflag", "objectiveflag", "questflag", # Флаги, а не текст
-            "classname", "speciesname", # Часто внутренние ID
-            "filename", "path", # Пути к файлам
-            "default", # Если это значение по умолчанию, которое не должно меняться
-            "ambientmccormicks", 'returns', 'remarks', 'c', 'para', 'see', 'param.il', 'param.steamid', 'param.appid', 'param.name', 'code', 'param.filename', 'param.type', 'param.character', 'param.frequency', 'param.sampleRate', 'param.action', 'param.identifier', 'param.interactableFor', 'param.statName', 'param.value', 'param.position', 'param.assembly', 'param.createNetworkEvent', 'param.defult', 'param.force', 'param.load', 'param.predicate', 'param.prefab', 'param.radius', 'typeparam.T', 'exception', 'override', 'locationchange.base.changeto.military', 'eventtext.blockadealarm.breakin', 'locationnameformat.mine', 'loadingscreentip', 'dialogturnoffsonar', 'dialogcantfindanechoicsuit', 'lua_name', 'lua_description', "author", "id", "lua_name", "param.load", "param.force", 'summary', 'returns', 'remarks', 'c', 'para', 'see', 'param.il', 'param.steamid', 'param.appid', 'param.name', 'code', 'param.filename', 'param.type', 'param.character', 'param.frequency', 'param.sampleRate', 'param.action', 'param.identifier', 'param.interactableFor', 'param.statName', 'param.value', 'param.position', 'param.assembly', 'param.createNetworkEvent', 'param.defult', 'param.force', 'param.load', 'param.predicate', 'param.prefab', 'param.radius', 'typeparam.T', 'exception', 'override', 'locationchange.base.changeto.military', 'eventtext.blockadealarm.breakin', 'locationnameformat.mine', 'loadingscreentip', 'dialogturnoffsonar', 'dialogcantfindanechoicsuit', 'lua_name', 'lua_description', "param.createNetworkEvent", 
-
-    # ваш пример
-        }
-
-        for element in root.iter():
-            if element.tag.lower() in excluded_tags:
-                continue
-
-            if element.text: 
-                original_tag_name = element.tag
-                id_val = element.get('identifier') or element.get('name')
-                
-                sanitized_main_tag = sanitize_xml_tag_name(original_tag_name)
-                if id_val:
-                    sanitized_id_val = sanitize_xml_tag_name(id_val)
-                    if sanitized_id_val and sanitized_id_val not in ("sanitized_empty_tag", "invalid_tag_fallback"):
-                        full_tag = f"{sanitized_main_tag}.{sanitized_id_val}"
-                    else:
-                        full_tag = sanitized_main_tag
-                else:
-                    full_tag = sanitized_main_tag
-                
-                full_tag = sanitize_xml_tag_name(full_tag) 
-
-                stripped_text = element.text.strip()
-                if stripped_text: 
-                    escaped_text_content = escape(stripped_text)
-                    text_list_for_file.append((full_tag, escaped_text_content, filepath, mod_name))
-        return text_list_for_file
+        return _extract_texts_from_root(tree.getroot(), filepath, base_mods_directory, lang_filter)
     except ET.ParseError:
         print(f"XML Parse Error processing file {filepath}. Skipping.")
         return []
@@ -203,210 +302,683 @@ def extract_text_from_xml_file(filepath, base_mods_directory, lang_filter):
         print(f"Error processing XML file {filepath}: {e}")
         return []
 
-def extract_text_from_lua_file(filepath, base_mods_directory):
-    """Извлекает тексты из Lua файлов."""
+def _read_lua_file_texts(filepath, base_mods_directory):
+    """Тексты Lua файла; ошибки чтения и разбора не перехватываются."""
     text_list_for_file = []
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read()
-        mod_name = get_mod_name_from_path(filepath, base_mods_directory)
-        
-        kv_pairs = re.findall(r'(?i)\b(name|label|displayname|tooltip|description|text)\s*=\s*"([^"]*)"', content)
-        for key, value in kv_pairs:
-            clean_value = value.strip()
-            if clean_value:
-                lua_tag = sanitize_xml_tag_name(f"lua_{key.lower()}")
-                escaped_value = escape(clean_value)
-                text_list_for_file.append((lua_tag, escaped_value, filepath, mod_name))
-
-        text_func_calls = re.findall(r'(?i)\b(?:Text|Texts\.Get|Game\.ShowMessageBox)\s*\(\s*"([^"]*)"', content)
-        for text_val in text_func_calls:
-            clean_value = text_val.strip()
-            if clean_value:
+    with open(filepath, "r", encoding="utf-8") as f:
+        content = f.read()
+    mod_name = get_mod_name_from_path(filepath, base_mods_directory)
+
+    for context_kind, context_name, value in iter_lua_text_strings(content, LUA_TEXT_KEYS, LUA_TEXT_FUNCTIONS):
+        clean_value = value.strip()
+        if clean_value:
+            if context_kind == "key":
+                lua_tag = sanitize_xml_tag_name(f"lua_{context_name}")
+            else:
                 lua_tag = sanitize_xml_tag_name("lua_func_text") # более общий тег
-                escaped_value = escape(clean_value)
-                text_list_for_file.append((lua_tag, escaped_value, filepath, mod_name))
-        
-        return text_list_for_file
+            escaped_value = escape(clean_value)
+            text_list_for_file.append((lua_tag, escaped_value, filepath, mod_name))
+    return text_list_for_file
+
+def extract_text_from_lua_file(filepath, base_mods_directory):
+    """Извлекает тексты из Lua файлов: строки, присвоенные ключам LUA_TEXT_KEYS, и аргументы функций LUA_TEXT_FUNCTIONS."""
+    try:
+        return _read_lua_file_texts(filepath, base_mods_directory)
     except Exception as e:
         print(f"Error processing Lua file {filepath}: {e}")
         return []
 
+def _scan_xml_file_streaming(filepath, base_mods_directory, source_lang, existing_lang):
+    """Потоковый вариант разбора XML через iterparse с ограниченной памятью.
+
+    Возвращает те же (translated_keys, source_texts), что и разбор целого дерева.
+    Файлы на других языках отбрасываются сразу после чтения корневого элемента.
+    """
+    keys = set()
+    indexed_texts = []
+    mode = None
+    mod_name = None
+    element_stack = []
+    preorder_indices = []
+    next_preorder_index = 0
+    excluded_depth = 0
+
+    for event, element in ET.iterparse(filepath, events=("start", "end")):
+        if event == "start":
+            if mode is None:
+                file_language = element.get("language")
+                if file_language and file_language.lower() == existing_lang.lower():
+                    mode = "keys"
+                elif _is_source_language_file(file_language, source_lang):
+                    mode = "texts"
+                    mod_name = get_mod_name_from_path(filepath, base_mods_directory)
+                else:
+                    # Язык не подходит ни для ключей, ни для текстов - дальше не читаем
+                    return set(), []
+            element_stack.append(element)
+            # Порядковый номер в обходе "сверху вниз", как у root.iter()
+            preorder_indices.append(next_preorder_index)
+            next_preorder_index += 1
+            if excluded_depth or (STREAMING_SKIP_EXCLUDED_SUBTREES and mode == "texts" and EXCLUSION_INDEX.is_excluded_tag(element.tag)):
+                excluded_depth += 1
+            continue
+
+        # event == "end": текст и атрибуты элемента уже полностью прочитаны
+        element_stack.pop()
+        preorder_index = preorder_indices.pop()
+        if excluded_depth:
+            excluded_depth -= 1
+        elif mode == "keys":
+            if not EXCLUSION_INDEX.is_key_skipped_tag(element.tag):
+                keys.add(_element_full_tag(element))
+        elif not EXCLUSION_INDEX.is_excluded_tag(element.tag) and element.text:
+            stripped_text = element.text.strip()
+            if stripped_text:
+                indexed_texts.append((preorder_index, (_element_full_tag(element), escape(stripped_text), filepath, mod_name)))
+
+        # Освобождаем память: обработанный элемент больше не нужен ни нам, ни родителю
+        if element_stack:
+            element.clear()
+            element_stack[-1].remove(element)
+
+    indexed_texts.sort(key=lambda item: item[0])
+    return keys, [text_item for _, text_item in indexed_texts]
+
+
+def scan_mod_file(filepath, base_mods_directory, source_lang, existing_lang):
+    """Обрабатывает один файл мода за один разбор XML.
+
+    Возвращает (translated_keys, source_texts): ключи уже существующего перевода на existing_lang
+    и тексты (tag, text, path, mod) на source_lang. Lua файлы дают только тексты.
+    None - файл не удалось прочитать или разобрать (такой результат не кэшируется).
+    """
+    if filepath.endswith(".lua"):
+        try:
+            return set(), _read_lua_file_texts(filepath, base_mods_directory)
+        except Exception as e:
+            print(f"Error processing Lua file {filepath}: {e}")
+            return None
+
+    if STREAMING_XML_EXTRACTION:
+        try:
+            return _scan_xml_file_streaming(filepath, base_mods_directory, source_lang, existing_lang)
+        except ET.ParseError:
+            print(f"XML Parse Error processing file {filepath}. Skipping.")
+            return None
+        except Exception as e:
+            print(f"Error processing XML file {filepath}: {e}")
+            return None
+
+    try:
+        tree = ET.parse(filepath)
+        root = tree.getroot()
+    except ET.ParseError:
+        print(f"XML Parse Error processing file {filepath}. Skipping.")
+        return None
+    except Exception as e:
+        print(f"Error processing XML file {filepath}: {e}")
+        return None
+
+    try:
+        keys = _extract_keys_from_root(root, existing_lang)
+    except Exception:
+        keys = set()
+
+    try:
+        texts = _extract_texts_from_root(root, filepath, base_mods_directory, source_lang)
+    except Exception as e:
+        print(f"Error processing XML file {filepath}: {e}")
+        return None
+    return keys, texts
+
+
+def scan_mod_file_timed(filepath, base_mods_directory, source_lang, existing_lang):
+    """scan_mod_file с замером: возвращает (результат, секунды разбора, размер файла в байтах)."""
+    start_time = time.perf_counter()
+    result = scan_mod_file(filepath, base_mods_directory, source_lang, existing_lang)
+    seconds = time.perf_counter() - start_time
+    try:
+        file_size = os.path.getsize(filepath)
+    except OSError:
+        file_size = 0
+    return result, seconds, file_size
+
+
+def scan_mod_files(filepaths, base_mods_directory, source_lang, existing_lang, executor=None):
+    """Разбирает файлы в пуле процессов. Результаты (None - ошибка, см. scan_mod_file) возвращаются в порядке filepaths.
+
+    executor - уже запущенный пул процессов (чтобы не создавать новый на каждый вызов), иначе пул создается здесь.
+    При включенных метриках (run_metrics) время разбора каждого файла попадает в таблицу "files".
+    """
+    collect_metrics = run_metrics.is_active()
+    scan_function = scan_mod_file_timed if collect_metrics else scan_mod_file
+    scan_one = partial(scan_function, base_mods_directory=base_mods_directory,
+                       source_lang=source_lang, existing_lang=existing_lang)
+    workers = SCAN_WORKERS or os.cpu_count() or 1
+    if executor is not None and len(filepaths) >= 2:
+        results = list(executor.map(scan_one, filepaths, chunksize=SCAN_CHUNKSIZE))
+    elif workers <= 1 or len(filepaths) < 2:
+        results = [scan_one(filepath) for filepath in filepaths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(scan_one, filepaths, chunksize=SCAN_CHUNKSIZE))
+
+    if not collect_metrics:
+        return results
+    scan_results = []
+    for filepath, (result, seconds, file_size) in zip(filepaths, results):
+        keys, texts = result if result is not None else (set(), [])
+        run_metrics.record("files", path=os.path.normpath(filepath), mod=get_mod_name_from_path(filepath, base_mods_directory),
+                           bytes=file_size, seconds=round(seconds, 6), keys=len(keys), texts=len(texts))
+        run_metrics.add_counts(files_parsed=1, bytes_parsed=file_size)
+        scan_results.append(result)
+    return scan_results
+
+
+def _extraction_cache_signature(base_mods_directory):
+    """Настройки, при изменении которых кэш извлечения становится недействительным."""
+    return "|".join([
+        str(EXTRACTION_RULES_VERSION),
+        str(STREAMING_SKIP_EXCLUDED_SUBTREES),
+        EXCLUSION_INDEX.fingerprint(),
+        ",".join(sorted(LUA_TEXT_KEYS)),
+        ",".join(sorted(LUA_TEXT_FUNCTIONS)),
+        os.path.abspath(base_mods_directory),
+        SOURCE_LANGUAGE_FILTER.lower(),
+        EXISTING_TRANSLATION_LANGUAGE.lower(),
+    ])
+
+
+def _open_extraction_cache(base_mods_directory):
+    return ExtractionCache(EXTRACTION_CACHE_FILE, _extraction_cache_signature(base_mods_directory),
+                           use_content_hash=EXTRACTION_CACHE_USE_CONTENT_HASH)
+
+
+def evict_deleted_files_from_cache(filepaths, base_mods_directory):
+    """Удаляет из кэша извлечения файлы, которых нет среди filepaths (все файлы модов)."""
+    if not USE_EXTRACTION_CACHE:
+        return
+    cache = _open_extraction_cache(base_mods_directory)
+    try:
+        evicted = cache.evict_missing(filepaths)
+        if evicted:
+            print(f"Removed {evicted} deleted files from extraction cache.")
+    finally:
+        cache.close()
+
+
+def scan_mod_files_cached(filepaths, base_mods_directory, executor=None, evict_missing=True, verbose=True):
+    """Как scan_mod_files, но берет результаты неизменившихся файлов из кэша извлечения.
+
+    evict_missing=False - не чистить кэш от файлов вне filepaths (когда filepaths - только часть модов).
+    """
+    if not USE_EXTRACTION_CACHE:
+        if verbose:
+            print(f"Phase 1+2: Parsing {len(filepaths)} files once each (existing '{EXISTING_TRANSLATION_LANGUAGE}' keys and '{SOURCE_LANGUAGE_FILTER}' XML & Lua source texts)...")
+        results = scan_mod_files(filepaths, base_mods_directory, SOURCE_LANGUAGE_FILTER, EXISTING_TRANSLATION_LANGUAGE, executor)
+        return [result if result is not None else (set(), []) for result in results]
+
+    cache = _open_extraction_cache(base_mods_directory)
+    try:
+        results = [None] * len(filepaths)
+        stale_indices = []
+        stats = {}
+        for index, filepath in enumerate(filepaths):
+            try:
+                file_stat = os.stat(filepath)
+            except OSError:
+                results[index] = (set(), [])
+                continue
+            stats[index] = (file_stat.st_size, file_stat.st_mtime_ns)
+            cached = cache.get(filepath, file_stat.st_size, file_stat.st_mtime_ns)
+            if cached is None:
+                stale_indices.append(index)
+            else:
+                results[index] = cached
+
+        run_metrics.add_counts(files_cached=cache.hits)
+        if verbose:
+            print(f"Phase 1+2: {cache.hits} files unchanged (cached), parsing {len(stale_indices)} new/changed files (existing '{EXISTING_TRANSLATION_LANGUAGE}' keys and '{SOURCE_LANGUAGE_FILTER}' XML & Lua source texts)...")
+        stale_paths = [filepaths[index] for index in stale_indices]
+        fresh_results = scan_mod_files(stale_paths, base_mods_directory, SOURCE_LANGUAGE_FILTER, EXISTING_TRANSLATION_LANGUAGE, executor)
+
+        cache_entries = []
+        for index, result in zip(stale_indices, fresh_results):
+            if result is None:
+                results[index] = (set(), []) # Ошибку не кэшируем: файл разберется заново при следующем запуске
+                continue
+            keys, texts = result
+            results[index] = result
+            size, mtime_ns = stats[index]
+            cache_entries.append((filepaths[index], size, mtime_ns, keys, texts))
+        cache.put_many(cache_entries)
+
+        if evict_missing:
+            evicted = cache.evict_missing(filepaths)
+            if evicted:
+                print(f"Removed {evicted} deleted files from extraction cache.")
+    finally:
+        cache.close()
+    return results
+
+
 # --- Основная логика ---
 
-def collect_and_filter_texts(mods_root_directory):
-    """Собирает все тексты, фильтрует по языку, исключает переведенные, дедуплицирует."""
-    
-    translated_xml_keys_by_mod = {} 
-    print(f"Phase 1: Scanning for existing XML translations in '{EXISTING_TRANSLATION_LANGUAGE}'...")
-    xml_files_count_phase1 = 0
+def list_mod_files(mods_root_directory, mod_names=None):
+    """Один проход os.walk: все .xml и .lua файлы модов в порядке обхода.
+
+    mod_names - только файлы этих модов (имена папок верхнего уровня в mods_root_directory,
+    без учета регистра), None - всех.
+    """
+    selected_mods = {mod_name.lower() for mod_name in mod_names} if mod_names is not None else None
+    filepaths = []
     for root_dir_scanned, _, files in os.walk(mods_root_directory):
         for file in files:
-            if file.endswith(".xml"):
-                xml_files_count_phase1 +=1
+            if file.endswith(".xml") or file.endswith(".lua"):
                 filepath = os.path.join(root_dir_scanned, file)
+                if selected_mods is not None and \
+                   os.path.relpath(filepath, mods_root_directory).split(os.sep)[0].lower() not in selected_mods:
+                    continue
+                if EXCLUSION_INDEX.is_excluded_file(filepath, mods_root_directory):
+                    continue
+                if file.endswith(".lua") and not EXCLUSION_INDEX.is_scanned_lua_file(
+                        filepath, mods_root_directory, get_mod_name_from_path(filepath, mods_root_directory)):
+                    continue
+                filepaths.append(filepath)
+    return filepaths
+
+
+def build_translated_keys_by_mod(filepaths, scan_results, mods_root_directory):
+    """Собирает ключи уже существующих переводов по модам. Возвращает (ключи по модам, число XML файлов)."""
+    translated_xml_keys_by_mod = {} 
+    xml_files_count = 0
+    for filepath, (keys_from_file, _) in zip(filepaths, scan_results):
+        if filepath.endswith(".xml"):
+            xml_files_count += 1
+            if keys_from_file:
                 mod_name_for_keys = get_mod_name_from_path(filepath, mods_root_directory)
-                
-                keys_from_file = extract_keys_from_xml(filepath, EXISTING_TRANSLATION_LANGUAGE)
-                if keys_from_file:
-                    if mod_name_for_keys not in translated_xml_keys_by_mod:
-                        translated_xml_keys_by_mod[mod_name_for_keys] = set()
-                    translated_xml_keys_by_mod[mod_name_for_keys].update(keys_from_file)
+                if mod_name_for_keys not in translated_xml_keys_by_mod:
+                    translated_xml_keys_by_mod[mod_name_for_keys] = set()
+                translated_xml_keys_by_mod[mod_name_for_keys].update(keys_from_file)
+    return translated_xml_keys_by_mod, xml_files_count
 
-    total_translated_keys = sum(len(s) for s in translated_xml_keys_by_mod.values())
-    print(f"Scanned {xml_files_count_phase1} XML files. Found {total_translated_keys} XML tags in {len(translated_xml_keys_by_mod)} mods already translated to '{EXISTING_TRANSLATION_LANGUAGE}'.")
 
+def filter_and_deduplicate_texts(filepaths, scan_results, translated_xml_keys_by_mod, tag_statistics=None):
+    """Отбрасывает уже переведенные в моде XML тексты и дубликаты (mod, tag, text), сохраняя порядок файлов.
+
+    Если передан tag_statistics (TagStatistics), в него собирается статистика по тегам.
+    """
     all_source_texts_to_translate = []
     seen_global_text_keys_for_dedup = set()
 
-    # --- НОВОЕ: Словари для сбора статистики по тегам ---
-    # (mod_name, full_tag) -> count
-    tag_occurrences = defaultdict(int)
-    # (mod_name, full_tag) -> set of (escaped_text, original_filepath)
-    tag_details_map = defaultdict(set)
+    for filepath, (_, current_file_source_texts) in zip(filepaths, scan_results):
+        is_lua_file = filepath.endswith(".lua")
+        normalized_paths = {}
+
+        for full_tag, escaped_original_text, source_filepath, mod_name in current_file_source_texts:
+            # --- НОВОЕ: Сбор статистики ---
+            if tag_statistics is not None:
+                # Экранированный текст и нормализованный путь к файлу (путь нормализуется один раз на файл)
+                normalized_path = normalized_paths.get(source_filepath)
+                if normalized_path is None:
+                    normalized_path = normalized_paths[source_filepath] = os.path.normpath(source_filepath)
+                tag_statistics.add((mod_name, full_tag), escaped_original_text, normalized_path)
+
+            is_already_translated_in_mod = False
+            if not is_lua_file: 
+                if mod_name in translated_xml_keys_by_mod and \
+                   full_tag in translated_xml_keys_by_mod[mod_name]:
+                    is_already_translated_in_mod = True
+            
+            text_key_for_dedup = (mod_name, full_tag, escaped_original_text)
+            
+            if text_key_for_dedup not in seen_global_text_keys_for_dedup and not is_already_translated_in_mod:
+                seen_global_text_keys_for_dedup.add(text_key_for_dedup)
+                all_source_texts_to_translate.append((full_tag, escaped_original_text, source_filepath, mod_name))
+    return all_source_texts_to_translate
 
 
-    print(f"\nPhase 2: Scanning for source texts ('{SOURCE_LANGUAGE_FILTER}' XML & Lua), filtering and deduplicating...")
-    processed_files_count_phase2 = 0
-    
-    for root_dir_scanned, _, files in os.walk(mods_root_directory):
-        for file in files:
-            filepath = os.path.join(root_dir_scanned, file)
-            current_file_source_texts = []
-            is_lua_file = False
-
-            if file.endswith(".xml"):
-                processed_files_count_phase2 += 1
-                current_file_source_texts = extract_text_from_xml_file(filepath, mods_root_directory, SOURCE_LANGUAGE_FILTER)
-            elif file.endswith(".lua"):
-                processed_files_count_phase2 += 1
-                is_lua_file = True
-                current_file_source_texts = extract_text_from_lua_file(filepath, mods_root_directory)
-
-            for full_tag, escaped_original_text, source_filepath, mod_name in current_file_source_texts:
-                # --- НОВОЕ: Сбор статистики ---
-                tag_key_for_stats = (mod_name, full_tag)
-                tag_occurrences[tag_key_for_stats] += 1
-                # Сохраняем экранированный текст и нормализованный путь к файлу
-                tag_details_map[tag_key_for_stats].add((escaped_original_text, os.path.normpath(source_filepath)))
-
-                is_already_translated_in_mod = False
-                if not is_lua_file: 
-                    if mod_name in translated_xml_keys_by_mod and \
-                       full_tag in translated_xml_keys_by_mod[mod_name]:
-                        is_already_translated_in_mod = True
-                
-                text_key_for_dedup = (mod_name, full_tag, escaped_original_text)
-                
-                if text_key_for_dedup not in seen_global_text_keys_for_dedup and not is_already_translated_in_mod:
-                    seen_global_text_keys_for_dedup.add(text_key_for_dedup)
-                    all_source_texts_to_translate.append((full_tag, escaped_original_text, source_filepath, mod_name))
-
-    print(f"Processed {processed_files_count_phase2} XML/Lua files for source text.")
+def text_item_sort_key(text_item):
+    """Порядок записей в итоговом XML: мод, тег, текст (без учета регистра)."""
+    full_tag, escaped_text, _, mod_name = text_item
+    return (mod_name.lower(), full_tag.lower(), escaped_text.lower())
+
+
+def collect_and_filter_texts(mods_root_directory, frequent_tags_analysis=None, mod_names=None):
+    """Собирает все тексты, фильтрует по языку, исключает переведенные, дедуплицирует.
+
+    frequent_tags_analysis=False - не собирать статистику по тегам (отчет будет пустым);
+    None - по FREQUENT_TAGS_ANALYSIS. mod_names - извлекать только эти моды (см. list_mod_files).
+    """
+    if frequent_tags_analysis is None:
+        frequent_tags_analysis = FREQUENT_TAGS_ANALYSIS
     
-    all_source_texts_to_translate.sort(key=lambda x: (x[3].lower(), x[0].lower(), x[1].lower()))
+    # Один проход os.walk: порядок файлов тот же, что и при прежних двух проходах,
+    # поэтому результат слияния (и выходной XML) не зависит от числа процессов.
+    print(f"Scanning mods for XML/Lua files...")
+    with run_metrics.phase("list_files"):
+        filepaths_to_scan = list_mod_files(mods_root_directory, mod_names)
+        run_metrics.add_counts(files=len(filepaths_to_scan))
+
+    with run_metrics.phase("parse_files", files=len(filepaths_to_scan)):
+        # При выборе части модов файлы остальных не считаются удаленными
+        scan_results = scan_mod_files_cached(filepaths_to_scan, mods_root_directory, evict_missing=mod_names is None)
+
+    translated_xml_keys_by_mod, xml_files_count_phase1 = build_translated_keys_by_mod(filepaths_to_scan, scan_results, mods_root_directory)
+    total_translated_keys = sum(len(s) for s in translated_xml_keys_by_mod.values())
+    print(f"Scanned {xml_files_count_phase1} XML files. Found {total_translated_keys} XML tags in {len(translated_xml_keys_by_mod)} mods already translated to '{EXISTING_TRANSLATION_LANGUAGE}'.")
+
+    # --- НОВОЕ: Статистика по тегам: (mod_name, full_tag) -> счетчики и примеры ---
+    tag_statistics = TagStatistics() if frequent_tags_analysis else None
+
+    print(f"\nFiltering and deduplicating source texts...")
+    with run_metrics.phase("filter_texts"):
+        all_source_texts_to_translate = filter_and_deduplicate_texts(
+            filepaths_to_scan, scan_results, translated_xml_keys_by_mod, tag_statistics
+        )
+        all_source_texts_to_translate.sort(key=text_item_sort_key)
+        run_metrics.add_counts(texts=len(all_source_texts_to_translate))
+    print(f"Processed {len(filepaths_to_scan)} XML/Lua files for source text.")
     
-    # --- НОВОЕ: Анализ и формирование информации о часто встречающихся тегах ---
+    frequent_tags_report = build_frequent_tags_report(tag_statistics) if tag_statistics is not None else []
+    frequent_tags_report.sort(key=frequent_tag_sort_key)
+
+    return all_source_texts_to_translate, frequent_tags_report
+
+
+def build_frequent_tags_report(tag_statistics):
+    """Анализ и формирование информации о часто встречающихся тегах (без сортировки).
+
+    Число различных текстов и файлов точное, пока их немного (см. tag_statistics.py),
+    иначе - оценка; тогда *_approximate = True.
+    """
     frequent_tags_report = []
-    for (mod_name, tag_name), count in tag_occurrences.items():
-        if count >= DUPLICATE_TAG_THRESHOLD:
-            details = tag_details_map[(mod_name, tag_name)]
-            unique_texts_in_tag = {text for text, path in details}
-            unique_filepaths_in_tag = {path for text, path in details}
-            
+    for (mod_name, tag_name), stats in tag_statistics.items():
+        if stats.count >= DUPLICATE_TAG_THRESHOLD:
             frequent_tags_report.append({
                 "mod_name": mod_name,
                 "tag_name": tag_name,
-                "count": count,
-                "unique_texts": unique_texts_in_tag,
-                "unique_filepaths": unique_filepaths_in_tag,
-                "sample_details": list(details)[:min(3, len(details))] # Первые 3 примера (текст, путь)
+                "count": stats.count,
+                "unique_texts_count": stats.texts.count(),
+                "unique_texts_approximate": stats.texts.is_approximate,
+                "unique_texts": list(stats.text_samples), # Первые различные тексты
+                "unique_filepaths_count": stats.paths.count(),
+                "unique_filepaths_approximate": stats.paths.is_approximate,
+                "sample_details": list(stats.detail_samples) # Несколько примеров (текст, путь)
             })
-    
-    frequent_tags_report.sort(key=lambda x: (x["mod_name"].lower(), -x["count"], x["tag_name"].lower()))
+    return frequent_tags_report
 
-    return all_source_texts_to_translate, frequent_tags_report
 
+def frequent_tag_sort_key(tag_info):
+    return (tag_info["mod_name"].lower(), -tag_info["count"], tag_info["tag_name"].lower())
 
-def save_texts_to_final_xml(text_items_list, output_filepath, lang_attr, translated_name_attr):
-    """Сохраняет собранные и отфильтрованные тексты в итоговый XML."""
-    output_dir = os.path.dirname(output_filepath)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
-    with open(output_filepath, "w", encoding="utf-8") as f:
-        f.write(f'<?xml version="1.0" encoding="utf-8"?>\n')
-        f.write(f'<infotexts language="{lang_attr}" nowhitespace="false" translatedname="{translated_name_attr}">\n\n')
-        
-        current_mod_for_comment = None
-        for full_tag, escaped_original_text_content, source_filepath, mod_name in text_items_list:
-            if mod_name != current_mod_for_comment:
-                if current_mod_for_comment is not None:
-                    f.write('\n') 
-                f.write(f'  <!-- Texts from Mod: {mod_name} -->\n')
-                current_mod_for_comment = mod_name
-            
-            f.write(f'  <!-- Original File: {os.path.normpath(source_filepath)} -->\n')
-            f.write(f'  <{full_tag}>{escaped_original_text_content}</{full_tag}>\n')
+def iter_texts_by_mod(mods_root_directory, frequent_tags_report=None, mod_names=None):
+    """Генератор записей (tag, text, path, mod) в том же порядке, что и collect_and_filter_texts.
+
+    Моды обрабатываются по одному (в порядке сортировки имен), и записи мода выдаются сразу после
+    его разбора - следующий этап может начинать работу, пока остальные моды еще сканируются.
+    В памяти одновременно держатся результаты разбора только одного мода.
+    Если передан список frequent_tags_report, в него дописывается анализ часто встречающихся тегов
+    (статистика считается по каждому моду отдельно и после мода отбрасывается; ключи статистики
+    содержат мод, так что отчет тот же, что и у collect_and_filter_texts).
+    mod_names - только эти моды (см. list_mod_files).
+    """
+    filepaths = list_mod_files(mods_root_directory, mod_names)
+    # Группировка по имени мода без учета регистра - как в ключе сортировки итогового списка
+    filepaths_by_mod = defaultdict(list)
+    for filepath in filepaths:
+        filepaths_by_mod[get_mod_name_from_path(filepath, mods_root_directory).lower()].append(filepath)
+    print(f"Found {len(filepaths)} XML/Lua files in {len(filepaths_by_mod)} mods.")
+
+    workers = SCAN_WORKERS or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for mod_key in sorted(filepaths_by_mod):
+            mod_filepaths = filepaths_by_mod[mod_key]
+            scan_results = scan_mod_files_cached(mod_filepaths, mods_root_directory, executor=executor, evict_missing=False, verbose=False)
+            translated_xml_keys_by_mod, _ = build_translated_keys_by_mod(mod_filepaths, scan_results, mods_root_directory)
+            if frequent_tags_report is None:
+                mod_texts = filter_and_deduplicate_texts(mod_filepaths, scan_results, translated_xml_keys_by_mod)
+            else:
+                tag_statistics = TagStatistics()
+                mod_texts = filter_and_deduplicate_texts(mod_filepaths, scan_results, translated_xml_keys_by_mod, tag_statistics)
+                mod_report = build_frequent_tags_report(tag_statistics)
+                mod_report.sort(key=frequent_tag_sort_key)
+                frequent_tags_report.extend(mod_report)
+            del scan_results
+            mod_texts.sort(key=text_item_sort_key)
+            yield from mod_texts
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if mod_names is None:
+        evict_deleted_files_from_cache(filepaths, mods_root_directory)
+
+
+class FinalXmlWriter:
+    """Пишет записи (tag, text, path, mod) в итоговый XML по мере поступления.
+
+    shard_by=None - один файл output_filepath; "mod" - отдельный файл на каждый мод;
+    "entries" - новый файл каждые shard_max_entries записей. Каждый файл - самостоятельный
+    XML того же вида, что и при записи без разбиения. В written_files - список (путь, число записей).
+    """
+
+    def __init__(self, output_filepath, lang_attr, translated_name_attr, shard_by=None, shard_max_entries=OUTPUT_SHARD_MAX_ENTRIES):
+        if shard_by not in (None, *OUTPUT_SHARD_CHOICES):
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+        self.output_filepath = output_filepath
+        self.lang_attr = lang_attr
+        self.translated_name_attr = translated_name_attr
+        self.shard_by = shard_by
+        self.shard_max_entries = shard_max_entries
+        self.written_files = []
+        self.total_entries = 0
+        self._file = None
+        self._file_entries = 0
+        self._current_mod_for_comment = None
+        self._current_mod_key = None
+
+        output_dir = os.path.dirname(output_filepath)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        if shard_by is not None:
+            self._remove_stale_shards()
+
+    def _shard_path(self, mod_name):
+        base, extension = os.path.splitext(self.output_filepath)
+        shard_number = len(self.written_files) + 1
+        if self.shard_by == "mod":
+            return f"{base}.{shard_number:04d}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', mod_name)}{extension}"
+        return f"{base}.{shard_number:04d}{extension}"
+
+    def _remove_stale_shards(self):
+        """Удаляет файлы разбиения от прошлых запусков, чтобы их не перевели вместе с новыми."""
+        output_dir = os.path.dirname(self.output_filepath) or "."
+        base, extension = os.path.splitext(os.path.basename(self.output_filepath))
+        shard_name_re = re.compile(rf"{re.escape(base)}\.\d{{4}}(?:_.*)?{re.escape(extension)}")
+        for filename in os.listdir(output_dir):
+            if shard_name_re.fullmatch(filename):
+                os.remove(os.path.join(output_dir, filename))
+
+    def _open_file(self, filepath):
+        self._file = open(filepath, "w", encoding="utf-8")
+        self._file.write(f'<?xml version="1.0" encoding="utf-8"?>\n')
+        self._file.write(f'<infotexts language="{self.lang_attr}" nowhitespace="false" translatedname="{self.translated_name_attr}">\n\n')
+        self.written_files.append((filepath, 0))
+        self._file_entries = 0
+        self._current_mod_for_comment = None
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        self._file.write('\n</infotexts>\n')
+        self._file.close()
+        self._file = None
+        self.written_files[-1] = (self.written_files[-1][0], self._file_entries)
+
+    def write(self, text_item):
+        full_tag, escaped_original_text_content, source_filepath, mod_name = text_item
+        if self.shard_by == "mod":
+            starts_new_file = self._file is None or mod_name.lower() != self._current_mod_key
+        elif self.shard_by == "entries":
+            starts_new_file = self._file is None or self._file_entries >= self.shard_max_entries
+        else:
+            starts_new_file = self._file is None
+        if starts_new_file:
+            self._close_file()
+            self._open_file(self.output_filepath if self.shard_by is None else self._shard_path(mod_name))
+        self._current_mod_key = mod_name.lower()
+
+        if mod_name != self._current_mod_for_comment:
+            if self._current_mod_for_comment is not None:
+                self._file.write('\n') 
+            self._file.write(f'  <!-- Texts from Mod: {mod_name} -->\n')
+            self._current_mod_for_comment = mod_name
         
-        f.write('\n</infotexts>\n')
+        self._file.write(f'  <!-- Original File: {os.path.normpath(source_filepath)} -->\n')
+        self._file.write(f'  <{full_tag}>{escaped_original_text_content}</{full_tag}>\n')
+        self._file_entries += 1
+        self.total_entries += 1
+
+    def close(self):
+        # Без записей и без разбиения пишется пустой файл - как и раньше
+        if self.shard_by is None and not self.written_files:
+            self._open_file(self.output_filepath)
+        self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def save_texts_to_final_xml(text_items_list, output_filepath, lang_attr, translated_name_attr, shard_by=None, shard_max_entries=OUTPUT_SHARD_MAX_ENTRIES):
+    """Сохраняет собранные и отфильтрованные тексты в итоговый XML (или в несколько файлов, см. FinalXmlWriter).
+
+    text_items_list может быть и генератором (например, iter_texts_by_mod) - записи пишутся по мере поступления.
+    Возвращает список (путь, число записей) записанных файлов.
+    """
+    with FinalXmlWriter(output_filepath, lang_attr, translated_name_attr, shard_by, shard_max_entries) as writer:
+        for text_item in text_items_list:
+            writer.write(text_item)
+    return writer.written_files
 
 # --- Точка входа ---
 if __name__ == "__main__":
-    mods_collection_directory = "." 
+    parser = argparse.ArgumentParser(description="Extract translatable Barotrauma mod texts")
+    parser.add_argument("--streaming", action="store_true", default=STREAMING_OUTPUT, help="Scan and write mods one at a time (memory bounded by the largest mod)")
+    parser.add_argument("--shard-by", choices=OUTPUT_SHARD_CHOICES, default=OUTPUT_SHARD_BY, help="Split the output into one file per mod or per --shard-size entries")
+    parser.add_argument("--shard-size", type=int, default=OUTPUT_SHARD_MAX_ENTRIES, help="Entries per output file with --shard-by entries")
+    parser.add_argument("--mods", nargs="+", help="Extract only these mod folders")
+    parser.add_argument("--only-changed-workshop-mods", action="store_true", help="Extract only Workshop mods updated since the last translation (see workshop_metadata.py)")
+    parser.add_argument("--workshop-endpoint", help="GetPublishedFileDetails URL for --only-changed-workshop-mods (e.g. a local stub server)")
+    parser.add_argument("--no-tag-stats", dest="tag_stats", action="store_false", default=FREQUENT_TAGS_ANALYSIS, help="Skip the frequent-tags analysis")
+    parser.add_argument("--metrics", action="store_true", default=run_metrics.COLLECT_METRICS, help="Write a JSON/CSV run report (see run_metrics.py)")
+    parser.add_argument("--profile", choices=run_metrics.PROFILER_CHOICES, default=run_metrics.PROFILER, help="Profile the run")
+    args = parser.parse_args()
+
+    with run_metrics.run("extract_text", args.metrics, args.profile):
+        mods_collection_directory = "." 
     
-    output_directory_name = "translation_output_for_extractor"
-    output_filename = "strings_for_translation.xml"
-    full_output_path = os.path.join(output_directory_name, output_filename)
-
-    print(f"--- Starting Text Extraction Script ---")
-    print(f"Mods directory: {os.path.abspath(mods_collection_directory)}")
-    print(f"Source language (XML): '{SOURCE_LANGUAGE_FILTER}'")
-    print(f"Excluding XML texts if already translated to '{EXISTING_TRANSLATION_LANGUAGE}' (within the same mod).")
-    print(f"Output will be prepared for target language '{TARGET_OUTPUT_LANGUAGE}'.")
-    print(f"Threshold for reporting frequent tags: {DUPLICATE_TAG_THRESHOLD} occurrences per mod.")
-    print(f"-----------------------------------------")
+        output_directory_name = "translation_output_for_extractor"
+        output_filename = "strings_for_translation.xml"
+        full_output_path = os.path.join(output_directory_name, output_filename)
+
+        print(f"--- Starting Text Extraction Script ---")
+        print(f"Mods directory: {os.path.abspath(mods_collection_directory)}")
+        print(f"Source language (XML): '{SOURCE_LANGUAGE_FILTER}'")
+        print(f"Excluding XML texts if already translated to '{EXISTING_TRANSLATION_LANGUAGE}' (within the same mod).")
+        print(f"Output will be prepared for target language '{TARGET_OUTPUT_LANGUAGE}'.")
+        if args.tag_stats:
+            print(f"Threshold for reporting frequent tags: {DUPLICATE_TAG_THRESHOLD} occurrences per mod.")
+        else:
+            print(f"Frequent tags analysis is disabled.")
+        print(f"-----------------------------------------")
+
+        mod_names = args.mods
+        if args.only_changed_workshop_mods:
+            import workshop_metadata # Нужен только в этом режиме
+            changed_directories, current_versions = workshop_metadata.changed_mods(
+                mods_collection_directory, args.workshop_endpoint or workshop_metadata.WORKSHOP_DETAILS_ENDPOINT
+            )
+            workshop_metadata.save_extracted_versions(current_versions) # Их и отметит --mark-translated
+            mod_names = sorted(set(mod_names or []) | set(changed_directories))
+            print(f"Workshop mods changed since the last translation: {len(changed_directories)}. Run 'workshop_metadata.py --mark-translated' after translating them.")
+        if mod_names is not None:
+            print(f"Extracting only {len(mod_names)} selected mods.")
     
-    final_texts_for_translation, frequent_tags_data = collect_and_filter_texts(mods_collection_directory)
+        written_files = []
+        if args.streaming:
+            frequent_tags_data = []
+            with run_metrics.phase("extract_and_write"):
+                written_files = save_texts_to_final_xml(
+                    iter_texts_by_mod(mods_collection_directory, frequent_tags_data if args.tag_stats else None, mod_names), full_output_path,
+                    TARGET_OUTPUT_LANGUAGE, TARGET_OUTPUT_TRANSLATED_NAME, args.shard_by, args.shard_size
+                )
+                total_written = sum(count for _, count in written_files)
+                run_metrics.add_counts(texts=total_written)
+            frequent_tags_data.sort(key=frequent_tag_sort_key)
+            print(f"\n--- Results: Texts for Translation ---")
+            if total_written:
+                print(f"Found {total_written} unique text entries requiring translation.")
+            else:
+                print(f"No new texts found needing translation based on the specified criteria.")
+        else:
+            final_texts_for_translation, frequent_tags_data = collect_and_filter_texts(mods_collection_directory, args.tag_stats, mod_names)
     
-    if final_texts_for_translation:
-        print(f"\n--- Results: Texts for Translation ---")
-        print(f"Found {len(final_texts_for_translation)} unique text entries requiring translation.")
-        save_texts_to_final_xml(final_texts_for_translation, full_output_path, TARGET_OUTPUT_LANGUAGE, TARGET_OUTPUT_TRANSLATED_NAME)
-        print(f"Output file saved to: {os.path.abspath(full_output_path)}")
-    else:
-        print(f"\n--- Results: Texts for Translation ---")
-        print(f"No new texts found needing translation based on the specified criteria.")
+            if final_texts_for_translation:
+                print(f"\n--- Results: Texts for Translation ---")
+                print(f"Found {len(final_texts_for_translation)} unique text entries requiring translation.")
+                with run_metrics.phase("write_output", texts=len(final_texts_for_translation)):
+                    written_files = save_texts_to_final_xml(
+                        final_texts_for_translation, full_output_path, TARGET_OUTPUT_LANGUAGE, TARGET_OUTPUT_TRANSLATED_NAME,
+                        args.shard_by, args.shard_size
+                    )
+            else:
+                print(f"\n--- Results: Texts for Translation ---")
+                print(f"No new texts found needing translation based on the specified criteria.")
+
+        if len(written_files) == 1:
+            print(f"Output file saved to: {os.path.abspath(written_files[0][0])}")
+        elif written_files:
+            print(f"Output split into {len(written_files)} files (translate each with Helsinki.py --input <file>):")
+            for written_path, entry_count in written_files:
+                print(f"  {os.path.abspath(written_path)} ({entry_count} entries)")
     
-    if frequent_tags_data:
-        print(f"\n--- Frequent Tags Analysis (>= {DUPLICATE_TAG_THRESHOLD} occurrences per tag per mod) ---")
-        print(f"Found {len(frequent_tags_data)} tag types that appear frequently. ")
-        print(f"Review these tags. If their content is not meant for translation or is redundant,")
-        print(f"consider adding the original XML tag name (before sanitization) to the 'excluded_tags' list ")
-        print(f"in the 'extract_text_from_xml_file' function, or adjust Lua parsing if needed.")
+        if args.tag_stats and frequent_tags_data:
+            print(f"\n--- Frequent Tags Analysis (>= {DUPLICATE_TAG_THRESHOLD} occurrences per tag per mod) ---")
+            print(f"Found {len(frequent_tags_data)} tag types that appear frequently. ")
+            print(f"Review these tags. If their content is not meant for translation or is redundant,")
+            print(f"consider adding the original XML tag name (before sanitization) to EXCLUDED_TAGS / EXCLUDED_TAG_PATTERNS ")
+            print(f"or to the '{EXCLUSION_CONFIG_FILE}' config file, or adjust Lua parsing if needed.")
         
-        for tag_info in frequent_tags_data:
-            print(f"\n  Mod: {tag_info['mod_name']}")
-            print(f"    Tag (sanitized): '{tag_info['tag_name']}'")
-            print(f"    Occurrences: {tag_info['count']}")
+            for tag_info in frequent_tags_data:
+                print(f"\n  Mod: {tag_info['mod_name']}")
+                print(f"    Tag (sanitized): '{tag_info['tag_name']}'")
+                print(f"    Occurrences: {tag_info['count']}")
             
-            unique_texts = list(tag_info['unique_texts'])
-            if len(unique_texts) == 1:
-                print(f"    Associated Text (consistent): \"{unique_texts[0]}\"")
-            else:
-                print(f"    Associated Texts ({len(unique_texts)} unique variants, showing up to 3):")
-                for i, text_sample in enumerate(unique_texts[:3]):
-                    print(f"      - \"{text_sample}\"")
-                if len(unique_texts) > 3:
-                    print(f"      ... and {len(unique_texts) - 3} more variants.")
+                unique_texts = tag_info['unique_texts']
+                unique_texts_count = tag_info['unique_texts_count']
+                approximate_mark = "~" if tag_info['unique_texts_approximate'] else ""
+                if unique_texts_count == 1:
+                    print(f"    Associated Text (consistent): \"{unique_texts[0]}\"")
+                else:
+                    print(f"    Associated Texts ({approximate_mark}{unique_texts_count} unique variants, showing up to 3):")
+                    for i, text_sample in enumerate(unique_texts[:3]):
+                        print(f"      - \"{text_sample}\"")
+                    if unique_texts_count > 3:
+                        print(f"      ... and {approximate_mark}{unique_texts_count - 3} more variants.")
             
-            print(f"    Found in {len(tag_info['unique_filepaths'])} unique files. Examples of (text, file):")
-            for text_ex, file_ex in tag_info['sample_details']:
-                 print(f"      - \"{text_ex}\" (from: {file_ex})")
-
-    else:
-        print(f"\n--- Frequent Tags Analysis ---")
-        print(f"No tags met the frequency threshold of {DUPLICATE_TAG_THRESHOLD} occurrences per mod.")
+                approximate_mark = "~" if tag_info['unique_filepaths_approximate'] else ""
+                print(f"    Found in {approximate_mark}{tag_info['unique_filepaths_count']} unique files. Examples of (text, file):")
+                for text_ex, file_ex in tag_info['sample_details']:
+                     print(f"      - \"{text_ex}\" (from: {file_ex})")
+
+        elif args.tag_stats:
+            print(f"\n--- Frequent Tags Analysis ---")
+            print(f"No tags met the frequency threshold of {DUPLICATE_TAG_THRESHOLD} occurrences per mod.")
         
-    print(f"-----------------------------------------")
-    print(f"Script finished.")
\ No newline at end of file
+        print(f"-----------------------------------------")
+        print(f"Script finished.")
\ No newline at end of file
@@ -0,0 +1,121 @@
+import os
+import json
+import sqlite3
+import hashlib
+
+# Постоянный кэш результатов извлечения текста для extract_text.py.
+# Для каждого файла хранится (size, mtime_ns, [content_hash]) и результат его разбора:
+# ключи уже существующего перевода и кортежи (full_tag, text, path, mod).
+# Неизменившиеся файлы при повторном запуске не разбираются вовсе.
+
+def file_content_hash(filepath):
+    """Считает хэш содержимого файла (blake2b), читая его блоками."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class ExtractionCache:
+    """Кэш извлечения на SQLite, ключ - путь файла + размер + mtime (и, опционально, хэш содержимого)."""
+
+    def __init__(self, db_path, signature, use_content_hash=False):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.db_path = db_path
+        self.use_content_hash = use_content_hash
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT,"
+            " keys_json TEXT, texts_json TEXT)"
+        )
+
+        # Сигнатура описывает настройки извлечения (языки, корень модов, версия правил).
+        # Если она изменилась, старые результаты недействительны целиком.
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if row is None or row[0] != signature:
+            if row is not None:
+                print(f"Extraction cache settings changed, clearing cache: {db_path}")
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+        self.connection.commit()
+
+    def get(self, filepath, size, mtime_ns):
+        """Возвращает (keys, texts) из кэша или None, если файл изменился или еще не кэширован."""
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, content_hash, keys_json, texts_json FROM files WHERE path = ?", (filepath,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        cached_size, cached_mtime_ns, cached_hash, keys_json, texts_json = row
+        if cached_size != size:
+            self.misses += 1
+            return None
+
+        if cached_mtime_ns != mtime_ns:
+            # mtime изменился (например, Steam перекачал мод), но содержимое могло остаться прежним
+            if not (self.use_content_hash and cached_hash):
+                self.misses += 1
+                return None
+            try:
+                current_hash = file_content_hash(filepath)
+            except OSError:
+                self.misses += 1
+                return None
+            if current_hash != cached_hash:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (mtime_ns, filepath))
+
+        self.hits += 1
+        keys = set(json.loads(keys_json))
+        texts = [tuple(item) for item in json.loads(texts_json)]
+        return keys, texts
+
+    def put_many(self, entries):
+        """Сохраняет результаты разбора: entries - итерируемое из (filepath, size, mtime_ns, keys, texts)."""
+        rows = []
+        for filepath, size, mtime_ns, keys, texts in entries:
+            content_hash = None
+            if self.use_content_hash:
+                try:
+                    content_hash = file_content_hash(filepath)
+                except OSError:
+                    content_hash = None
+            rows.append((
+                filepath, size, mtime_ns, content_hash,
+                json.dumps(sorted(keys), ensure_ascii=False),
+                json.dumps(texts, ensure_ascii=False),
+            ))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, keys_json, texts_json)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.connection.commit()
+
+    def evict_missing(self, existing_filepaths):
+        """Удаляет из кэша файлы, которых больше нет на диске. Возвращает число удаленных записей."""
+        existing = set(existing_filepaths)
+        cached_paths = [row[0] for row in self.connection.execute("SELECT path FROM files")]
+        stale = [(path,) for path in cached_paths if path not in existing]
+        if stale:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", stale)
+        self.connection.commit()
+        return len(stale)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,302 @@
+import os
+import re
+import argparse
+from collections import deque
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+# Глоссарий терминов (английский -> русский) для Helsinki.py.
+# Короткие имена собственные (названия предметов, существ) модель часто переводит дословно и неверно
+# ("Pile Bunker" -> "Плохой бункер"), к тому же на каждое тратится место в батче generate.
+#   - текст целиком совпадает с термином -> перевод берется из глоссария, модель не вызывается;
+#   - термины внутри длинного текста заменяются метками TERM0, TERM1, ... перед переводом
+#     и подставляются обратно после; если модель потеряла метку, текст переводится заново без замены.
+# Поиск всех терминов в тексте - за один проход автоматом Ахо-Корасик (без учета регистра,
+# только целые слова, при пересечениях побеждает самый левый и самый длинный термин).
+#
+# Формат файла: строки "English<TAB>Русский", пустые строки и строки с # пропускаются.
+# Заготовку можно собрать из готового перевода: python glossary.py --build-from Language/Russian/Russian.xml
+
+# --- Конфигурация ---
+GLOSSARY_FILE = "glossary.tsv"
+PLACEHOLDER_TEMPLATE = "TERM{index}"
+# Теги, записи которых при --build-from попадают в заготовку (имена, а не описания)
+BUILD_TAG_PREFIXES = ("entityname.", "character.", "npctitle.", "afflictionname.", "talentname.")
+BUILD_MAX_WORDS = 4 # Более длинные тексты в заготовку не попадают
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_ERROR_MARKERS = ("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]")
+
+
+def normalize_term(text):
+    return _WHITESPACE_RE.sub(' ', text).strip().lower()
+
+
+class AhoCorasickMatcher:
+    """Автомат Ахо-Корасик по набору строк (уже приведенных к нижнему регистру)."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]] # Для каждого состояния - номера шаблонов, которые в нем заканчиваются
+        self.pattern_lengths = []
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.outputs[state].append(len(self.pattern_lengths))
+            self.pattern_lengths.append(len(pattern))
+
+        # Ссылки неудач строятся обходом в ширину
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """Выдает (начало, конец, номер шаблона) всех вхождений, в порядке позиции конца."""
+        goto, fail, outputs, pattern_lengths = self.goto, self.fail, self.outputs, self.pattern_lengths
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_index in outputs[state]:
+                yield position + 1 - pattern_lengths[pattern_index], position + 1, pattern_index
+
+
+class Glossary:
+    """Таблица терминов с поиском по тексту; в stats - счетчики для отчета."""
+
+    def __init__(self, terms):
+        self.translations = {}
+        for english, russian in terms:
+            normalized = normalize_term(english)
+            if normalized and russian.strip():
+                self.translations.setdefault(normalized, russian.strip())
+        self.terms = list(self.translations)
+        self.matcher = AhoCorasickMatcher(self.terms)
+        self.placeholder_re = re.compile(
+            re.escape(PLACEHOLDER_TEMPLATE).replace(r"\{index\}", r"\s*(\d+)"), re.IGNORECASE
+        )
+        self.stats = {"exact_hits": 0, "masked_texts": 0, "masked_terms": 0, "restore_failures": 0}
+
+    @classmethod
+    def from_file(cls, glossary_path):
+        terms = []
+        with open(glossary_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                english, separator, russian = line.partition("\t")
+                if separator:
+                    terms.append((english, russian))
+        return cls(terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def summary(self):
+        return (f"Glossary: {self.stats['exact_hits']} texts translated without the model (model calls avoided), "
+                f"{self.stats['masked_terms']} terms masked in {self.stats['masked_texts']} texts, "
+                f"{self.stats['restore_failures']} retranslated after lost placeholders.")
+
+    def lookup_exact(self, text):
+        """Перевод текста, целиком совпадающего с термином, иначе None."""
+        return self.translations.get(normalize_term(text))
+
+    def find_terms(self, text):
+        """Непересекающиеся вхождения терминов целыми словами: [(начало, конец, номер термина)]."""
+        lowered = text.lower()
+        if len(lowered) != len(text): # Редкие символы меняют длину при lower() - такие тексты не размечаем
+            return []
+        candidates = [
+            (start, end, term_index) for start, end, term_index in self.matcher.iter_matches(lowered)
+            if (start == 0 or not lowered[start - 1].isalnum()) and (end == len(lowered) or not lowered[end].isalnum())
+        ]
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        selected = []
+        covered_until = 0
+        for start, end, term_index in candidates:
+            if start >= covered_until:
+                selected.append((start, end, term_index))
+                covered_until = end
+        return selected
+
+    def mask(self, text):
+        """Заменяет термины метками. Возвращает (текст с метками, переводы терминов по номеру метки)."""
+        matches = self.find_terms(text)
+        if not matches:
+            return text, []
+        parts = []
+        replacements = []
+        previous_end = 0
+        for start, end, term_index in matches:
+            parts.append(text[previous_end:start])
+            parts.append(PLACEHOLDER_TEMPLATE.format(index=len(replacements)))
+            replacements.append(self.translations[self.terms[term_index]])
+            previous_end = end
+        parts.append(text[previous_end:])
+        return "".join(parts), replacements
+
+    def restore(self, translated_text, replacements):
+        """Подставляет переводы терминов на место меток; None, если какая-то метка потерялась."""
+        found = set()
+
+        def substitute(match):
+            index = int(match.group(1))
+            if index >= len(replacements):
+                return match.group(0)
+            found.add(index)
+            return replacements[index]
+
+        restored = self.placeholder_re.sub(substitute, translated_text)
+        return restored if len(found) == len(replacements) else None
+
+    def translate(self, texts, translate_function, on_batch_translated=None):
+        """Перевод с глоссарием. translate_function(тексты, on_batch_translated) - обычный перевод моделью.
+
+        Точные совпадения переводятся без модели, в остальных текстах термины заменяются метками.
+        on_batch_translated получает уже восстановленные переводы (с индексами во входном списке).
+        """
+        results = [None] * len(texts)
+        model_indices = []
+        model_texts = []
+        replacements_by_index = {}
+        for index, text in enumerate(texts):
+            exact_translation = self.lookup_exact(text) if text.strip() else None
+            if exact_translation is not None:
+                results[index] = exact_translation
+                continue
+            masked_text, replacements = self.mask(text)
+            if replacements:
+                replacements_by_index[index] = replacements
+                self.stats["masked_texts"] += 1
+                self.stats["masked_terms"] += len(replacements)
+            model_indices.append(index)
+            model_texts.append(masked_text)
+        exact_indices = [index for index, result in enumerate(results) if result is not None]
+        self.stats["exact_hits"] += len(exact_indices)
+        if on_batch_translated is not None and exact_indices:
+            on_batch_translated(exact_indices, [results[index] for index in exact_indices])
+        print(f"Glossary: {len(exact_indices)} texts translated from the glossary without the model, "
+              f"{len(replacements_by_index)} texts with masked terms.")
+        if not model_texts:
+            return results
+
+        failed_indices = []
+
+        def finish(index, translated_text):
+            """Итоговый перевод текста index или None, если метки потерялись (тогда он будет переведен заново)."""
+            replacements = replacements_by_index.get(index)
+            if not replacements:
+                return translated_text
+            if translated_text.startswith(_ERROR_MARKERS):
+                marker = translated_text.split(" ", 1)[0]
+                return f"{marker} {texts[index]}"
+            return self.restore(translated_text, replacements)
+
+        def masked_batch_translated(local_indices, translations):
+            indices, restored = [], []
+            for local_index, translated_text in zip(local_indices, translations):
+                final_text = finish(model_indices[local_index], translated_text)
+                if final_text is not None:
+                    indices.append(model_indices[local_index])
+                    restored.append(final_text)
+            if on_batch_translated is not None and indices:
+                on_batch_translated(indices, restored)
+
+        model_translations = translate_function(model_texts, masked_batch_translated)
+        for index, translated_text in zip(model_indices, model_translations):
+            final_text = finish(index, translated_text)
+            if final_text is None:
+                failed_indices.append(index)
+            else:
+                results[index] = final_text
+
+        if failed_indices:
+            # Модель потеряла метки - такие тексты переводятся целиком, без замены терминов
+            self.stats["restore_failures"] += len(failed_indices)
+            print(f"Glossary: placeholders lost in {len(failed_indices)} translations, retranslating them without masking.")
+
+            def retry_batch_translated(local_indices, translations):
+                if on_batch_translated is not None:
+                    on_batch_translated([failed_indices[i] for i in local_indices], translations)
+
+            retried = translate_function([texts[index] for index in failed_indices], retry_batch_translated)
+            for index, translated_text in zip(failed_indices, retried):
+                results[index] = translated_text
+        return results
+
+
+def load_glossary(glossary_path=GLOSSARY_FILE):
+    """Глоссарий из файла или None, если файла нет."""
+    if not glossary_path or not os.path.exists(glossary_path):
+        return None
+    glossary = Glossary.from_file(glossary_path)
+    print(f"Loaded glossary with {len(glossary)} terms from {glossary_path}.")
+    return glossary
+
+
+def build_terms_from_translation(xml_path, tag_prefixes=BUILD_TAG_PREFIXES, max_words=BUILD_MAX_WORDS, separator="---"):
+    """Пары (английский, русский) из готового файла перевода (перевод---оригинал) для заготовки глоссария.
+
+    Берутся только записи с тегами из tag_prefixes и короткими английскими текстами;
+    при нескольких разных переводах одного термина берется первый. Тексты в файле перевода
+    экранированы (см. clean.py), в глоссарий они попадают расэкранированными - как их видит модель.
+    """
+    terms = {}
+    for _, element in ET.iterparse(xml_path):
+        if not isinstance(element.tag, str) or not element.tag.lower().startswith(tag_prefixes):
+            continue
+        text = element.text or ""
+        element.clear()
+        translated, found, english = text.rpartition(separator)
+        english, translated = unescape(english).strip(), unescape(translated).strip()
+        if not found or not english or not translated or "\n" in english or len(english.split()) > max_words:
+            continue
+        terms.setdefault(normalize_term(english), (english, translated))
+    return list(terms.values())
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a glossary draft from a finished translation file or check glossary matches")
+    parser.add_argument("--build-from", help="Translation XML (translation---original entries) to collect name terms from")
+    parser.add_argument("--output", default=GLOSSARY_FILE, help="Glossary TSV to write with --build-from")
+    parser.add_argument("--check", nargs="+", help="Texts to show glossary hits and masking for")
+    args = parser.parse_args()
+
+    if args.build_from:
+        built_terms = build_terms_from_translation(args.build_from)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("# English<TAB>Russian. Review the entries before use: the model translations are not always right.\n")
+            for english, russian in sorted(built_terms, key=lambda term: term[0].lower()):
+                f.write(f"{english}\t{russian}\n")
+        print(f"Wrote {len(built_terms)} terms to {os.path.abspath(args.output)}")
+    if args.check:
+        glossary = load_glossary(args.output)
+        if glossary is None:
+            print(f"Glossary file not found: {args.output}")
+        else:
+            for text in args.check:
+                exact_translation = glossary.lookup_exact(text)
+                if exact_translation is not None:
+                    print(f"{text!r}: exact -> {exact_translation!r}")
+                else:
+                    masked_text, replacements = glossary.mask(text)
+                    print(f"{text!r}: masked {masked_text!r} {replacements}")
@@ -0,0 +1,143 @@
+import re
+
+# Небольшой лексер Lua для extract_text.py: один проход по исходнику, комментарии пропускаются,
+# строковые литералы всех видов ("...", '...', [[...]], [==[...]==]) раскодируются и выдаются
+# вместе с контекстом - ключом таблицы/переменной (name = "...") или вызываемой функцией (Text("...")).
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<long_comment>--\[(?P<comment_level>=*)\[.*?\](?P=comment_level)\])
+  | (?P<comment>--[^\n]*)
+  | (?P<long_string>\[(?P<string_level>=*)\[.*?\](?P=string_level)\])
+  | (?P<string>"(?:\\z\s*|\\.|[^"\\\n])*"|'(?:\\z\s*|\\.|[^'\\\n])*')
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>0[xX][0-9A-Fa-f.]+(?:[pP][+-]?\d+)?|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<op>==|~=|<=|>=|\.\.\.|\.\.|::|.)
+''', re.DOTALL | re.VERBOSE)
+
+_ESCAPE_RE = re.compile(r'\\(?:z\s*|x([0-9A-Fa-f]{2})|u\{([0-9A-Fa-f]+)\}|(\d{1,3})|(\r\n|\n\r|\n|\r)|(.))', re.DOTALL)
+_SIMPLE_ESCAPES = {"a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\", '"': '"', "'": "'"}
+
+_OPENING_BRACKETS = {"(", "{", "["}
+_CLOSING_BRACKETS = {")", "}", "]"}
+
+
+def _decode_escape(match):
+    """Значение escape-последовательности: bytes для байтовых \\xNN и \\ddd, иначе str."""
+    hex_code, unicode_code, decimal_code, line_break, other = match.groups()
+    if hex_code is not None:
+        return bytes([int(hex_code, 16)])
+    if decimal_code is not None:
+        return bytes([min(int(decimal_code), 255)])
+    if unicode_code is not None:
+        code_point = int(unicode_code, 16)
+        return "\ufffd" if code_point > 0x10FFFF or 0xD800 <= code_point <= 0xDFFF else chr(code_point)
+    if line_break is not None:
+        return "\n"
+    if other is not None:
+        return _SIMPLE_ESCAPES.get(other, other)
+    return "" # \z - пропуск пробельных символов
+
+def decode_short_string(literal):
+    """Значение строки в кавычках (с кавычками) с раскрытыми escape-последовательностями.
+
+    \\xNN и \\ddd в Lua - байты: идущие подряд байты собираются и раскодируются как UTF-8
+    ("caf\\195\\169" -> "café"), неверные последовательности заменяются на U+FFFD.
+    """
+    body = literal[1:-1]
+    if "\\" not in body:
+        return body
+    parts = []
+    pending_bytes = bytearray()
+    position = 0
+    for match in _ESCAPE_RE.finditer(body):
+        value = _decode_escape(match)
+        if (isinstance(value, bytes) or not value) and match.start() == position:
+            pending_bytes += value or b"" # \z между байтами не разрывает последовательность
+        else:
+            if pending_bytes:
+                parts.append(pending_bytes.decode("utf-8", errors="replace"))
+                pending_bytes = bytearray()
+            parts.append(body[position:match.start()])
+            if isinstance(value, bytes):
+                pending_bytes += value
+            else:
+                parts.append(value)
+        position = match.end()
+    if pending_bytes:
+        parts.append(pending_bytes.decode("utf-8", errors="replace"))
+    parts.append(body[position:])
+    return "".join(parts)
+
+def decode_long_string(literal, level):
+    """Значение строки [==[...]==]; перевод строки сразу после открывающей скобки отбрасывается."""
+    body = literal[len(level) + 2:-(len(level) + 2)]
+    if body.startswith("\r\n"):
+        return body[2:]
+    if body.startswith("\n") or body.startswith("\r"):
+        return body[1:]
+    return body
+
+
+def iter_lua_tokens(source):
+    """Выдает значимые токены (вид, значение): name, string, number, op. Комментарии и пробелы пропускаются."""
+    for match in _TOKEN_RE.finditer(source):
+        kind = match.lastgroup
+        if kind in ("space", "comment", "long_comment", "comment_level"):
+            continue
+        if kind == "string":
+            yield "string", decode_short_string(match.group())
+        elif kind in ("long_string", "string_level"):
+            yield "string", decode_long_string(match.group(), match.group("string_level"))
+        else:
+            yield kind, match.group()
+
+
+def iter_lua_text_strings(source, text_keys, text_functions):
+    """Выдает (вид контекста, имя, текст) для строк, похожих на текст интерфейса.
+
+    ("key", имя, текст) - строка присвоена ключу из text_keys: name = "...", t.label = '...', ["tooltip"] = [[...]].
+    ("call", функция, текст) - строка передана прямым аргументом функции из text_functions:
+    Text("..."), Game.ShowMessageBox("...", "..."), Text "...". Имена функций сравниваются
+    по хвосту цепочки a.b:c (без учета регистра), имена ключей - без учета регистра.
+    """
+    previous = [(None, None)] * 4 # Последние значимые токены, previous[-1] - ближайший
+    call_chain = [] # Цепочка имен a.b.c, которая может оказаться вызываемой функцией
+    bracket_stack = [] # Для каждой открытой скобки: является ли она вызовом текстовой функции
+
+    def is_text_function(chain):
+        lowered = [name.lower() for name in chain]
+        return any(".".join(lowered[start:]) in text_functions for start in range(len(lowered)))
+
+    for kind, value in iter_lua_tokens(source):
+        if kind == "string":
+            last_kind, last_value = previous[-1]
+            if last_kind == "op" and last_value == "=":
+                key_kind, key_value = previous[-2]
+                if key_kind == "name" and key_value.lower() in text_keys:
+                    yield "key", key_value.lower(), value
+                elif key_kind == "op" and key_value == "]" and previous[-3][0] == "string" and previous[-4] == ("op", "[") \
+                        and previous[-3][1].lower() in text_keys:
+                    yield "key", previous[-3][1].lower(), value
+            elif last_kind == "op" and last_value in ("(", ",") and bracket_stack and bracket_stack[-1]:
+                yield "call", bracket_stack[-1], value
+            elif last_kind == "name" and call_chain and is_text_function(call_chain):
+                yield "call", ".".join(call_chain).lower(), value
+            call_chain = []
+        elif kind == "name":
+            if previous[-1] in (("op", "."), ("op", ":")) and call_chain:
+                call_chain.append(value)
+            else:
+                call_chain = [value]
+        elif kind == "op":
+            if value in _OPENING_BRACKETS:
+                is_call = value == "(" and previous[-1][0] == "name" and call_chain and is_text_function(call_chain)
+                bracket_stack.append(".".join(call_chain).lower() if is_call else None)
+            elif value in _CLOSING_BRACKETS:
+                if bracket_stack:
+                    bracket_stack.pop()
+            if value not in (".", ":"):
+                call_chain = []
+        else:
+            call_chain = []
+        previous = previous[1:] + [(kind, value)]
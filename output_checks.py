@@ -0,0 +1,67 @@
+import re
+import argparse
+from collections import Counter
+
+# Дешевая проверка переводов модели на вырождение (для Helsinki.py).
+# В готовом Russian.xml встречаются зацикленные и выдуманные переводы:
+#   "Я не знаю, что делать, но я не знаю, что делать." / "- Нет, нет, нет, нет, ..."
+#   "Связи Release ( << Релей >> ) ( << Связи >> ) ( << Релей >> ) ..."
+# и переводы, потерявшие большую часть текста. Такие строки переводятся заново другим профилем
+# генерации (см. RETRY_GENERATION_PROFILE в Helsinki.py), остальные идут быстрым путем без изменений.
+#   - "repetition"   - какая-то последовательность из REPEAT_NGRAM_SIZE слов повторяется в переводе
+#                      чаще, чем самая частая такая последовательность в оригинале (и хотя бы дважды);
+#   - "length_ratio" - длина перевода в символах не укладывается в LENGTH_RATIO_MIN..LENGTH_RATIO_MAX
+#                      от длины оригинала (к обеим длинам добавляется LENGTH_SMOOTHING_CHARS, чтобы
+#                      короткие названия не считались выбросами);
+#   - "empty"        - пустой перевод непустого текста.
+
+# --- Конфигурация ---
+REPEAT_NGRAM_SIZE = 3
+LENGTH_RATIO_MIN = 0.3
+LENGTH_RATIO_MAX = 3.0
+LENGTH_SMOOTHING_CHARS = 10
+
+_ERROR_MARKERS = ("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]")
+_WORD_RE = re.compile(r'\w+')
+
+
+def max_ngram_repeats(text, n=REPEAT_NGRAM_SIZE):
+    """Сколько раз встречается самая частая последовательность из n слов (без учета регистра)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return 0
+    return max(Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1)).values())
+
+
+def length_ratio(source_text, translated_text):
+    return (len(translated_text.strip()) + LENGTH_SMOOTHING_CHARS) / (len(source_text.strip()) + LENGTH_SMOOTHING_CHARS)
+
+
+def find_degenerate_reason(source_text, translated_text):
+    """Причина считать перевод вырожденным ("repetition", "length_ratio", "empty") или None.
+
+    Маркеры ошибок перевода не проверяются - это не вывод модели.
+    """
+    if translated_text.startswith(_ERROR_MARKERS) or not source_text.strip():
+        return None
+    if not translated_text.strip():
+        return "empty"
+    translation_repeats = max_ngram_repeats(translated_text)
+    if translation_repeats >= 2 and translation_repeats > max_ngram_repeats(source_text):
+        return "repetition"
+    ratio = length_ratio(source_text, translated_text)
+    if ratio < LENGTH_RATIO_MIN or ratio > LENGTH_RATIO_MAX:
+        return "length_ratio"
+    return None
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a translation against its source for degenerate model output")
+    parser.add_argument("source")
+    parser.add_argument("translation")
+    args = parser.parse_args()
+    reason = find_degenerate_reason(args.source, args.translation)
+    print(f"length ratio {length_ratio(args.source, args.translation):.2f}, "
+          f"max {REPEAT_NGRAM_SIZE}-word repeats {max_ngram_repeats(args.translation)} (source {max_ngram_repeats(args.source)}): "
+          f"{reason or 'ok'}")
@@ -0,0 +1,191 @@
+import os
+import queue
+import argparse
+import threading
+from xml.sax.saxutils import unescape, escape
+
+from lxml import etree
+
+import extract_text
+import Helsinki
+import clean
+from translation_memory import TranslationMemory
+import run_metrics
+
+# Сквозной потоковый конвейер: извлечение -> перевод батчами -> post_process_translation -> запись XML.
+# Записи идут через генераторы без промежуточных strings_for_translation.xml и
+# translated_with_inline_originals.xml. Извлечение работает в фоновом потоке и отдает записи
+# по модам, поэтому перевод первого мода начинается, пока остальные моды еще сканируются.
+# Результат совпадает с последовательным запуском extract_text.py -> Helsinki.py -> clean.py.
+# Отдельные скрипты по-прежнему можно запускать как самостоятельные этапы.
+
+# --- Конфигурация ---
+PIPELINE_MODS_DIRECTORY = "."
+PIPELINE_OUTPUT_XML_FILE = clean.OUTPUT_XML_FILE_CLEANED
+# Сколько записей переводится за один вызов translate_texts_batch (внутри - батчи по длине)
+PIPELINE_TRANSLATION_CHUNK_SIZE = 1000
+# Сколько извлеченных записей может ждать перевода в очереди (ограничивает память)
+PIPELINE_PREFETCH_RECORDS = 20000
+
+_END_OF_STREAM = object()
+
+
+def prefetch_in_thread(iterable, max_buffered):
+    """Выполняет генератор в фоновом потоке, отдавая элементы через ограниченную очередь."""
+    buffer = queue.Queue(maxsize=max_buffered)
+
+    def produce():
+        try:
+            for item in iterable:
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put((_END_OF_STREAM, e))
+            return
+        buffer.put((_END_OF_STREAM, None))
+
+    threading.Thread(target=produce, name="pipeline-extract", daemon=True).start()
+    while True:
+        item = buffer.get()
+        if isinstance(item, tuple) and len(item) == 2 and item[0] is _END_OF_STREAM:
+            if item[1] is not None:
+                raise item[1]
+            return
+        yield item
+
+
+def iter_chunks(iterable, chunk_size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_translated_records(records, model, tokenizer, chunk_size, **translate_options):
+    """Переводит записи (tag, text, path, mod) частями. Выдает (full_tag, исходный текст, перевод).
+
+    Исходный текст получается так же, как в Helsinki.py: экранированный текст записи
+    проходит разбор XML и unescape, т.е. расэкранируется дважды.
+    """
+    model_ready = Helsinki.ATTEMPT_MODEL_TRANSLATION and (
+        translate_options.get("translation_client") is not None
+        or (tokenizer and (model or translate_options.get("inference_pool") is not None))
+    )
+    for chunk in iter_chunks(records, chunk_size):
+        source_texts = [unescape(unescape(escaped_text)) for _, escaped_text, _, _ in chunk]
+        if model_ready:
+            translations = Helsinki.translate_texts_batch(source_texts, model, tokenizer, **translate_options)
+        else:
+            translations = source_texts # Как в Helsinki.py: без модели вместо перевода идет оригинал
+        for (full_tag, _, _, _), source_text, translated_text in zip(chunk, source_texts, translations):
+            yield full_tag, source_text, translated_text
+
+
+def iter_cleaned_entries(translated_records, stats):
+    """Собирает "перевод{TEXT_SEPARATOR}оригинал" и чистит его, как clean.py. Выдает (full_tag, текст)."""
+    for full_tag, source_text, translated_text in translated_records:
+        combined_text = f"{translated_text}{Helsinki.TEXT_SEPARATOR}{source_text}"
+        cleaned_text, changed = clean.clean_combined_text(combined_text)
+        stats["entries"] += 1
+        if changed:
+            stats["nodes_changed"] += 1
+        yield full_tag, cleaned_text
+
+
+def write_final_xml(entries, output_path, escape_text=True):
+    """Пишет записи в XML по одной через lxml.etree.xmlfile, в том же виде, что и clean.py.
+
+    escape_text=False - текст записей уже экранирован (например, взят как есть из прежнего файла перевода).
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    root_attributes = {
+        "language": Helsinki.TARGET_LANGUAGE_CODE_ATTR,
+        "nowhitespace": "false",
+        "translatedname": Helsinki.TARGET_TRANSLATED_NAME_ATTR,
+    }
+    temporary_path = output_path + ".tmp"
+    with open(temporary_path, "wb") as output_file:
+        # Объявление и переводы строк вне корня xmlfile писать не дает - пишем их в файл напрямую
+        output_file.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+        with etree.xmlfile(output_file, encoding="utf-8") as xf:
+            with xf.element("infotexts", root_attributes):
+                for full_tag, cleaned_text in entries:
+                    element = etree.Element(full_tag)
+                    # Текст экранируется здесь и еще раз сериализатором - как при записи в clean.py
+                    element.text = escape(cleaned_text) if escape_text else cleaned_text
+                    xf.write("\n  ")
+                    xf.write(element)
+                xf.write("\n")
+        output_file.write(b"\n")
+    os.replace(temporary_path, output_path)
+
+
+def run_pipeline(mods_root_directory, output_path, workers=Helsinki.INFERENCE_WORKERS, threads_per_worker=Helsinki.THREADS_PER_WORKER, backend=Helsinki.INFERENCE_BACKEND, server_url=None):
+    model, tokenizer, inference_pool = None, None, None
+    translation_client = Helsinki.connect_translation_server(server_url) if Helsinki.ATTEMPT_MODEL_TRANSLATION else None
+    if Helsinki.ATTEMPT_MODEL_TRANSLATION and translation_client is None:
+        if workers > 1:
+            tokenizer = Helsinki.load_tokenizer(Helsinki.MODEL_NAME)
+            if tokenizer:
+                inference_pool = Helsinki.create_inference_pool(Helsinki.MODEL_NAME, workers, threads_per_worker, backend)
+        else:
+            model, tokenizer = Helsinki.load_model_and_tokenizer(Helsinki.MODEL_NAME, backend)
+
+    translation_memory = None
+    if Helsinki.USE_TRANSLATION_MEMORY:
+        translation_memory = TranslationMemory(Helsinki.TRANSLATION_MEMORY_FILE, Helsinki.MODEL_NAME, Helsinki.TRANSLATION_MEMORY_MAX_ENTRIES)
+
+    term_glossary = Helsinki.load_glossary()
+    segmenter = Helsinki.create_segmenter()
+    source_filter = Helsinki.create_source_filter()
+    stats = {"entries": 0, "nodes_changed": 0}
+    try:
+        records = prefetch_in_thread(extract_text.iter_texts_by_mod(mods_root_directory), PIPELINE_PREFETCH_RECORDS)
+        translated_records = iter_translated_records(
+            records, model, tokenizer, PIPELINE_TRANSLATION_CHUNK_SIZE,
+            batch_size=Helsinki.BATCH_MAX_SENTENCES, translation_memory=translation_memory,
+            max_batch_tokens=Helsinki.BATCH_MAX_TOKENS, inference_pool=inference_pool, glossary=term_glossary,
+            translation_client=translation_client, segmenter=segmenter,
+            source_filter=source_filter,
+        )
+        # Этапы идут одновременно, поэтому фаза одна; время по файлам и батчам - в таблицах files и batches
+        with run_metrics.phase("pipeline"):
+            write_final_xml(iter_cleaned_entries(translated_records, stats), output_path)
+            run_metrics.add_counts(entries=stats["entries"], nodes_changed=stats["nodes_changed"])
+    finally:
+        if translation_memory is not None:
+            translation_memory.close()
+        if inference_pool is not None:
+            inference_pool.shutdown()
+
+    if term_glossary is not None:
+        print(term_glossary.summary())
+    if segmenter is not None:
+        print(segmenter.summary())
+    if source_filter is not None:
+        print(source_filter.summary())
+    print(f"Pipeline finished. Wrote {stats['entries']} entries, {stats['nodes_changed']} changed by cleaning.")
+    print(f"Output saved to: {os.path.abspath(output_path)}")
+    return stats
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract, translate and clean Barotrauma mod texts in one streaming pass")
+    parser.add_argument("--mods-dir", default=PIPELINE_MODS_DIRECTORY, help="Root directory with installed mods")
+    parser.add_argument("--output", default=PIPELINE_OUTPUT_XML_FILE, help="Final cleaned XML file")
+    parser.add_argument("--workers", type=int, default=Helsinki.INFERENCE_WORKERS, help="Number of model replica processes")
+    parser.add_argument("--threads-per-worker", type=int, default=Helsinki.THREADS_PER_WORKER, help="Torch threads per worker process")
+    parser.add_argument("--backend", choices=["pytorch", "pytorch_int8", "onnx"], default=Helsinki.INFERENCE_BACKEND, help="Inference backend")
+    parser.add_argument("--server", default=Helsinki.TRANSLATION_SERVER_URL, help="URL of a running translation_server.py (no local model load)")
+    parser.add_argument("--metrics", action="store_true", default=run_metrics.COLLECT_METRICS, help="Write a JSON/CSV run report (see run_metrics.py)")
+    parser.add_argument("--profile", choices=run_metrics.PROFILER_CHOICES, default=run_metrics.PROFILER, help="Profile the run")
+    args = parser.parse_args()
+    with run_metrics.run("pipeline", args.metrics, args.profile):
+        run_pipeline(args.mods_dir, args.output, args.workers, args.threads_per_worker, args.backend, args.server)
@@ -0,0 +1,242 @@
+import os
+import csv
+import sys
+import json
+import time
+import contextlib
+
+# Метрики и профилирование запусков extract_text.py, Helsinki.py, clean.py и pipeline.py.
+# Пока запуск не начат через run(...), все функции модуля ничего не делают и почти ничего не стоят,
+# поэтому вызовы phase/record/add_counts можно оставлять в коде постоянно.
+#
+# Что собирается:
+#   фазы     - время каждой фазы, счетчики (files, bytes, texts, tokens, ...) и скорости в секунду, пиковый RSS;
+#   таблицы  - строки по файлам (время разбора каждого файла) и по батчам перевода (токены/с, доля паддинга).
+# Отчет: <скрипт>_<время>.json со сводкой (фазы, самые медленные моды и батчи) и CSV на каждую таблицу.
+
+# --- Конфигурация ---
+COLLECT_METRICS = False # Включается также флагом --metrics у скриптов
+METRICS_REPORT_DIR = "translation_output_final/metrics"
+PROFILER = None # None, "cprofile" или "pyinstrument" (нужен пакет pyinstrument); флаг --profile
+SLOWEST_ROWS_IN_SUMMARY = 10 # Сколько самых медленных файлов/модов/батчей показывать в JSON
+PROFILE_STATS_LINES = 40 # Сколько строк статистики cProfile сохранять в текстовом виде
+
+PROFILER_CHOICES = ["cprofile", "pyinstrument"]
+
+_active_run = None
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса и его завершившихся дочерних процессов в МБ (None, если недоступно)."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None, None
+        memory_info = psutil.Process().memory_info()
+        return round(getattr(memory_info, "peak_wset", memory_info.rss) / 2**20, 1), None
+    # ru_maxrss - в килобайтах на Linux и в байтах на macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return round(self_peak / 2**20, 1), round(children_peak / 2**20, 1)
+
+
+class RunMetrics:
+    """Метрики одного запуска скрипта."""
+
+    def __init__(self, script_name, report_dir):
+        self.script_name = script_name
+        self.report_dir = report_dir
+        self.started_at = time.time()
+        self.start_counter = time.perf_counter()
+        self.phases = []
+        self.open_phases = []
+        self.tables = {}
+
+    def begin_phase(self, name, counters):
+        phase = {"name": name, "start": time.perf_counter(), "counters": dict(counters)}
+        self.open_phases.append(phase)
+        return phase
+
+    def end_phase(self, phase):
+        self.open_phases.remove(phase)
+        seconds = time.perf_counter() - phase["start"]
+        result = {
+            "name": phase["name"],
+            "offset_seconds": round(phase["start"] - self.start_counter, 4),
+            "seconds": round(seconds, 4),
+        }
+        for counter, value in phase["counters"].items():
+            result[counter] = value
+            if seconds > 0 and isinstance(value, (int, float)) and not isinstance(value, bool):
+                result[f"{counter}_per_second"] = round(value / seconds, 2)
+        result["peak_rss_mb"], result["children_peak_rss_mb"] = peak_rss_mb()
+        self.phases.append(result)
+
+    def add_counts(self, counts):
+        if not self.open_phases:
+            return
+        counters = self.open_phases[-1]["counters"]
+        for counter, value in counts.items():
+            counters[counter] = counters.get(counter, 0) + value
+
+    def record(self, table, row):
+        self.tables.setdefault(table, []).append(row)
+
+    def summary(self):
+        total_seconds = time.perf_counter() - self.start_counter
+        self_peak, children_peak = peak_rss_mb()
+        summary = {
+            "script": self.script_name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "total_seconds": round(total_seconds, 4),
+            "peak_rss_mb": self_peak,
+            "children_peak_rss_mb": children_peak,
+            "phases": self.phases,
+            "tables": {table: len(rows) for table, rows in self.tables.items()},
+        }
+        files = self.tables.get("files")
+        if files:
+            summary["slowest_files"] = sorted(files, key=lambda row: -row["seconds"])[:SLOWEST_ROWS_IN_SUMMARY]
+            seconds_by_mod = {}
+            for row in files:
+                mod_totals = seconds_by_mod.setdefault(row["mod"], {"mod": row["mod"], "files": 0, "bytes": 0, "seconds": 0.0})
+                mod_totals["files"] += 1
+                mod_totals["bytes"] += row["bytes"]
+                mod_totals["seconds"] += row["seconds"]
+            slowest_mods = sorted(seconds_by_mod.values(), key=lambda row: -row["seconds"])[:SLOWEST_ROWS_IN_SUMMARY]
+            summary["slowest_mods"] = [dict(row, seconds=round(row["seconds"], 4)) for row in slowest_mods]
+        batches = self.tables.get("batches")
+        if batches:
+            total_tokens = sum(row["tokens"] for row in batches)
+            total_padded = sum(row["padded_tokens"] for row in batches)
+            batch_seconds = sum(row["seconds"] for row in batches)
+            summary["batches_total"] = {
+                "batches": len(batches),
+                "texts": sum(row["texts"] for row in batches),
+                "tokens": total_tokens,
+                "padded_tokens": total_padded,
+                "padding_ratio": round(1 - total_tokens / total_padded, 4) if total_padded else None,
+                "tokens_per_second": round(total_tokens / batch_seconds, 2) if batch_seconds else None,
+            }
+            summary["slowest_batches"] = sorted(batches, key=lambda row: -row["seconds"])[:SLOWEST_ROWS_IN_SUMMARY]
+        return summary
+
+    def write_report(self):
+        """Пишет JSON со сводкой и CSV по каждой таблице. Возвращает список путей."""
+        os.makedirs(self.report_dir, exist_ok=True)
+        report_prefix = os.path.join(
+            self.report_dir, f"{self.script_name}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started_at))}"
+        )
+        written = [report_prefix + ".json"]
+        with open(written[0], "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        for table, rows in self.tables.items():
+            fieldnames = []
+            for row in rows:
+                fieldnames.extend(field for field in row if field not in fieldnames)
+            table_path = f"{report_prefix}_{table}.csv"
+            with open(table_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+            written.append(table_path)
+        return written
+
+
+# --- Функции для инструментирования кода ---
+def is_active():
+    return _active_run is not None
+
+@contextlib.contextmanager
+def phase(name, **counters):
+    """Замеряет фазу запуска. Счетчики можно добавлять внутри через add_counts()."""
+    if _active_run is None:
+        yield
+        return
+    current_phase = _active_run.begin_phase(name, counters)
+    try:
+        yield
+    finally:
+        _active_run.end_phase(current_phase)
+
+def add_counts(**counts):
+    """Прибавляет значения к счетчикам самой внутренней открытой фазы."""
+    if _active_run is not None:
+        _active_run.add_counts(counts)
+
+def record(table, **row):
+    """Добавляет строку в таблицу метрик (например, "files" или "batches")."""
+    if _active_run is not None:
+        _active_run.record(table, row)
+
+
+# --- Запуск с метриками и профилированием ---
+@contextlib.contextmanager
+def _profiling(profiler, report_prefix):
+    if profiler is None:
+        yield
+        return
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed, falling back to cProfile.")
+            profiler = "cprofile"
+        else:
+            instrument_profiler = Profiler()
+            instrument_profiler.start()
+            try:
+                yield
+            finally:
+                instrument_profiler.stop()
+                with open(report_prefix + "_profile.html", "w", encoding="utf-8") as f:
+                    f.write(instrument_profiler.output_html())
+                print(f"Profile saved to: {os.path.abspath(report_prefix + '_profile.html')}")
+            return
+    if profiler != "cprofile":
+        raise ValueError(f"Unknown profiler: {profiler}")
+
+    import cProfile
+    import pstats
+    import io
+    c_profiler = cProfile.Profile()
+    c_profiler.enable()
+    try:
+        yield
+    finally:
+        c_profiler.disable()
+        c_profiler.dump_stats(report_prefix + ".prof")
+        stats_text = io.StringIO()
+        pstats.Stats(c_profiler, stream=stats_text).sort_stats("cumulative").print_stats(PROFILE_STATS_LINES)
+        with open(report_prefix + "_profile.txt", "w", encoding="utf-8") as f:
+            f.write(stats_text.getvalue())
+        print(f"Profile saved to: {os.path.abspath(report_prefix + '.prof')}")
+
+@contextlib.contextmanager
+def run(script_name, enabled=None, profiler=None, report_dir=None):
+    """Оборачивает запуск скрипта: собирает метрики (если enabled) и профилирует (если задан profiler)."""
+    global _active_run
+    enabled = COLLECT_METRICS if enabled is None else enabled
+    profiler = profiler or PROFILER
+    report_dir = report_dir or METRICS_REPORT_DIR
+    if not enabled and profiler is None:
+        yield None
+        return
+
+    metrics = RunMetrics(script_name, report_dir)
+    if enabled:
+        _active_run = metrics
+    os.makedirs(report_dir, exist_ok=True)
+    profile_prefix = os.path.join(report_dir, f"{script_name}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(metrics.started_at))}")
+    try:
+        with _profiling(profiler, profile_prefix):
+            yield metrics
+    finally:
+        if enabled:
+            _active_run = None
+            written = metrics.write_report()
+            print(f"Run metrics saved to: {os.path.abspath(written[0])}")
@@ -0,0 +1,229 @@
+import re
+import argparse
+
+# Разбиение длинных текстов на предложения для Helsinki.py.
+# Длинные описания миссий и событий токенизатор обрезает на MAX_INPUT_TOKENS, а в батче по длине
+# они задают паддинг и время generate. Тексты длиннее SEGMENT_MIN_CHARS режутся на предложения,
+# предложения переводятся как отдельные короткие строки (в общих батчах по длине, с дедупликацией
+# и памятью переводов - одинаковые предложения в разных модах встречаются гораздо чаще целых текстов),
+# а затем собираются обратно с исходными пробелами и переносами строк между ними.
+#
+# Разметка Barotrauma не разрывается:
+#   - внутри [меток] (например [name], [location]) границ нет;
+#   - ‖color:...‖текст‖end‖ целиком остается в одном предложении, закрывающий ‖end‖ после точки
+#     остается с предложением;
+#   - литеральные \n (перенос строки в текстах игры) - тоже граница, они сохраняются между частями.
+# Сокращения (e.g., Dr., approx., U.S.) и инициалы границей не считаются; граница - только если
+# следующее предложение начинается с заглавной буквы, цифры, кавычки или метки.
+
+# --- Конфигурация ---
+SEGMENT_MIN_CHARS = 200 # Более короткие тексты переводятся целиком (контекст предложения важнее)
+ABBREVIATIONS = {
+    "e.g", "i.e", "etc", "vs", "approx", "mr", "mrs", "ms", "dr", "prof", "st", "no", "fig", "inc", "ltd", "co", "jr", "sr",
+}
+
+_ERROR_MARKERS = ("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]")
+_MARKUP_RE = re.compile(r'‖[^‖\n]*‖')
+_BRACKET_RE = re.compile(r'\[[^\[\]\n]*\]')
+_COLOR_END_TAGS = ("‖end‖", "‖color:end‖")
+# Конец предложения: знаки препинания, затем закрывающие кавычки/скобки и закрывающие метки цвета, затем пробелы
+_SENTENCE_END_RE = re.compile(r'[.!?…]+(?:["\'»”’)\]]|‖end‖|‖color:end‖)*(\s+)')
+_LINE_BREAK_RE = re.compile(r'[ \t]*(?:\\n|\n)(?:[ \t]*(?:\\n|\n))*[ \t]*')
+_WORD_BEFORE_RE = re.compile(r'([\w.]+)\.$')
+_DOTTED_ACRONYM_RE = re.compile(r'[A-Za-z](?:\.[A-Za-z])+') # U.S, e.g, a.m - одиночные буквы через точку
+
+
+def _protected_spans(text):
+    """Участки, внутри которых границ нет: [метки] и текст между ‖color:...‖ и ‖end‖."""
+    spans = [(match.start(), match.end()) for match in _BRACKET_RE.finditer(text)]
+    color_start = None
+    for match in _MARKUP_RE.finditer(text):
+        tag = match.group(0)
+        spans.append((match.start(), match.end()))
+        if tag in _COLOR_END_TAGS:
+            if color_start is not None:
+                spans.append((color_start, match.start()))
+                color_start = None
+        elif tag.startswith("‖color:"):
+            if color_start is None:
+                color_start = match.end()
+    if color_start is not None: # Незакрытый цвет действует до конца текста
+        spans.append((color_start, len(text)))
+    return spans
+
+
+def _starts_sentence(text, position):
+    """Начинается ли с position новое предложение (заглавная буква или цифра после меток и кавычек)."""
+    while position < len(text):
+        markup = _MARKUP_RE.match(text, position)
+        if markup:
+            position = markup.end()
+            continue
+        character = text[position]
+        if character in "\"'«“‘([":
+            position += 1
+            continue
+        return character.isupper() or character.isdigit()
+    return False
+
+
+def _is_abbreviation(text, period_position):
+    """Точка в period_position завершает сокращение или инициал, а не предложение."""
+    match = _WORD_BEFORE_RE.search(text[max(0, period_position - 20):period_position + 1])
+    if not match:
+        return False
+    word = match.group(1)
+    return word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper()) or _DOTTED_ACRONYM_RE.fullmatch(word) is not None
+
+
+def split_sentences(text):
+    """Разбивает текст на предложения. Возвращает (предложения, промежутки):
+
+    text == промежутки[0] + предложения[0] + промежутки[1] + ... + предложения[-1] + промежутки[-1].
+    Промежутки - пробелы и переносы строк между предложениями (и по краям текста).
+    """
+    spans = _protected_spans(text)
+
+    def is_protected(position):
+        return any(start < position < end for start, end in spans)
+
+    boundaries = [] # (начало промежутка, конец промежутка)
+    for match in _LINE_BREAK_RE.finditer(text):
+        if not is_protected(match.start()):
+            boundaries.append((match.start(), match.end()))
+    for match in _SENTENCE_END_RE.finditer(text):
+        gap_start, gap_end = match.span(1)
+        if (gap_end < len(text) and not is_protected(gap_start) and _starts_sentence(text, gap_end)
+                and not (text[match.start()] == "." and _is_abbreviation(text, match.start()))):
+            boundaries.append((gap_start, gap_end))
+    boundaries.sort()
+
+    sentences = []
+    gaps = []
+    leading = len(text) - len(text.lstrip())
+    gaps.append(text[:leading])
+    position = leading
+    for gap_start, gap_end in boundaries:
+        if gap_start < position: # Перекрывающиеся границы (точка перед переносом строки)
+            if gap_end > position:
+                gaps[-1] += text[position:gap_end]
+                position = gap_end
+            continue
+        if gap_start == position:
+            gaps[-1] += text[gap_start:gap_end]
+        else:
+            sentences.append(text[position:gap_start])
+            gaps.append(text[gap_start:gap_end])
+        position = gap_end
+    trailing_start = len(text.rstrip())
+    if position < trailing_start:
+        sentences.append(text[position:trailing_start])
+        gaps.append(text[trailing_start:])
+    elif sentences:
+        gaps[-1] += text[max(position, trailing_start):]
+    else:
+        gaps.append(text[position:])
+    return sentences, gaps
+
+
+def join_sentences(sentences, gaps):
+    parts = [gaps[0]]
+    for sentence, gap in zip(sentences, gaps[1:]):
+        parts.append(sentence)
+        parts.append(gap)
+    return "".join(parts)
+
+
+class SentenceSegmenter:
+    """Разбиение длинных текстов перед переводом и сборка переводов; в stats - счетчики для отчета."""
+
+    def __init__(self, min_chars=SEGMENT_MIN_CHARS):
+        self.min_chars = min_chars
+        self.stats = {"segmented_texts": 0, "segments": 0}
+
+    def summary(self):
+        return (f"Segmentation: {self.stats['segmented_texts']} long texts split into "
+                f"{self.stats['segments']} sentences for translation.")
+
+    def split(self, text):
+        """(предложения, промежутки) для длинного текста с несколькими предложениями, иначе None."""
+        if len(text) < self.min_chars:
+            return None
+        sentences, gaps = split_sentences(text)
+        return (sentences, gaps) if len(sentences) > 1 else None
+
+    def translate(self, texts, translate_function, on_batch_translated=None):
+        """Перевод с разбиением. translate_function(тексты, on_batch_translated) - перевод без разбиения.
+
+        on_batch_translated получает собранные переводы целых текстов (с индексами во входном списке),
+        как только переведены все их предложения.
+        """
+        units = []
+        owners = [] # Номер входного текста для каждой переводимой строки
+        first_unit = []
+        gaps_by_index = {}
+        for index, text in enumerate(texts):
+            first_unit.append(len(units))
+            parts = self.split(text)
+            if parts is None:
+                units.append(text)
+                owners.append(index)
+                continue
+            sentences, gaps = parts
+            gaps_by_index[index] = gaps
+            units.extend(sentences)
+            owners.extend([index] * len(sentences))
+            self.stats["segmented_texts"] += 1
+            self.stats["segments"] += len(sentences)
+        if gaps_by_index:
+            print(f"Segmentation: {len(gaps_by_index)} long texts split into {len(units) - len(texts) + len(gaps_by_index)} sentences, "
+                  f"{len(units)} strings to translate.")
+
+        def assemble(index, unit_translations):
+            gaps = gaps_by_index.get(index)
+            if gaps is None:
+                return unit_translations[0]
+            for translated_text in unit_translations:
+                if translated_text.startswith(_ERROR_MARKERS):
+                    marker = translated_text.split(" ", 1)[0]
+                    return f"{marker} {texts[index]}"
+            return join_sentences(unit_translations, gaps)
+
+        def unit_count(index):
+            return (first_unit[index + 1] if index + 1 < len(texts) else len(units)) - first_unit[index]
+
+        translated_units = [None] * len(units)
+        remaining = [unit_count(index) for index in range(len(texts))]
+
+        def unit_batch_translated(unit_indices, translations):
+            indices, assembled = [], []
+            for unit_index, translated_text in zip(unit_indices, translations):
+                if translated_units[unit_index] is not None:
+                    continue
+                translated_units[unit_index] = translated_text
+                index = owners[unit_index]
+                remaining[index] -= 1
+                if remaining[index] == 0:
+                    start = first_unit[index]
+                    indices.append(index)
+                    assembled.append(assemble(index, translated_units[start:start + unit_count(index)]))
+            if on_batch_translated is not None and indices:
+                on_batch_translated(indices, assembled)
+
+        unit_translations = translate_function(units, unit_batch_translated)
+        return [
+            assemble(index, unit_translations[first_unit[index]:first_unit[index] + unit_count(index)])
+            for index in range(len(texts))
+        ]
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show how texts are split into sentences for translation")
+    parser.add_argument("texts", nargs="+")
+    args = parser.parse_args()
+    for text in args.texts:
+        sentences, gaps = split_sentences(text)
+        print(f"{len(sentences)} sentences:")
+        for sentence, gap in zip(sentences, gaps[1:]):
+            print(f"  {sentence!r} + {gap!r}")
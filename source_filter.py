@@ -0,0 +1,104 @@
+import re
+import argparse
+
+# Предварительный отбор строк для модели en->ru (для Helsinki.py).
+# В выгрузку extract_text.py попадают не только английские тексты: моды с русским "оригиналом"
+# (в Russian.xml: missionname.huntinggroundsgarg - "Охотничьи угодья"), числа, идентификаторы
+# и строки из одной разметки. Модель на них тратит время и портит их ("Охотничьи угодья" -> выдумка,
+# "0546779D" -> слово). Каждая строка относится к одной категории, в модель идет только "english",
+# остальные возвращаются без изменений (в итоговом файле перевод совпадает с оригиналом).
+#   - "empty"        - после удаления разметки ‖...‖, меток [name] и литеральных \n ничего не осталось;
+#   - "numeric"      - нет букв, есть цифры ("42", "1.5", "-10%");
+#   - "symbols"      - нет ни букв, ни цифр ("...", "->", "?");
+#   - "russian"      - кириллица составляет не меньше CYRILLIC_MIN_RATIO букв;
+#   - "other_script" - латиница составляет меньше LATIN_MIN_RATIO букв (китайский, японский и т.п.);
+#   - "identifier"   - одно "слово" вида кода: с подчеркиванием, точкой/обратным слешем между буквами
+#                      или буквами вперемешку с цифрами ("item_id", "mod.item", "0546779D", "MK2");
+#   - "english"      - все остальное, переводится моделью.
+# Классификация - несколько заранее скомпилированных регулярных выражений на строку, без модели.
+
+# --- Конфигурация ---
+CYRILLIC_MIN_RATIO = 0.5
+LATIN_MIN_RATIO = 0.5
+CATEGORIES = ("english", "empty", "numeric", "symbols", "russian", "other_script", "identifier")
+
+_NON_TEXT_RE = re.compile(r'‖[^‖\n]*‖|\[[\w.:-]*\]|\\n')
+_LETTER_RE = re.compile(r'[^\W\d_]')
+_DIGIT_RE = re.compile(r'\d')
+_CYRILLIC_RE = re.compile(r'[Ѐ-ӿ]')
+_LATIN_RE = re.compile(r'[A-Za-zÀ-ɏ]')
+_IDENTIFIER_RE = re.compile(r'(?=\S*(?:_|[^\W_][.\\:][^\W_]|[A-Za-z]\d|\d[A-Za-z]))\S+')
+
+
+def classify_text(text):
+    """Категория строки из CATEGORIES; в модель отправляются только "english"."""
+    stripped = _NON_TEXT_RE.sub(" ", text).strip()
+    if not stripped:
+        return "empty"
+    letters = len(_LETTER_RE.findall(stripped))
+    if not letters:
+        return "numeric" if _DIGIT_RE.search(stripped) else "symbols"
+    if len(_CYRILLIC_RE.findall(stripped)) >= letters * CYRILLIC_MIN_RATIO:
+        return "russian"
+    if len(_LATIN_RE.findall(stripped)) < letters * LATIN_MIN_RATIO:
+        return "other_script"
+    if _IDENTIFIER_RE.fullmatch(stripped):
+        return "identifier"
+    return "english"
+
+
+class SourceFilter:
+    """Отбор английских строк перед переводом; в stats - число строк по категориям для отчета."""
+
+    def __init__(self):
+        self.stats = {category: 0 for category in CATEGORIES}
+
+    def summary(self):
+        skipped = ", ".join(f"{category}: {self.stats[category]}" for category in CATEGORIES[1:] if self.stats[category])
+        return (f"Source filter: {self.stats['english']} texts sent to the model, "
+                f"{sum(self.stats.values()) - self.stats['english']} passed through unchanged ({skipped or 'none'}).")
+
+    def translate(self, texts, translate_function, on_batch_translated=None):
+        """Перевод только английских строк. translate_function(тексты, on_batch_translated) - перевод без отбора.
+
+        Остальные строки возвращаются как есть; on_batch_translated получает индексы во входном списке.
+        """
+        results = list(texts)
+        model_indices = []
+        passed_indices = []
+        counts = {category: 0 for category in CATEGORIES}
+        category_by_text = {}
+        for index, text in enumerate(texts):
+            category = category_by_text.get(text)
+            if category is None:
+                category = category_by_text[text] = classify_text(text)
+            counts[category] += 1
+            (model_indices if category == "english" else passed_indices).append(index)
+        for category, count in counts.items():
+            self.stats[category] += count
+
+        if passed_indices:
+            skipped = ", ".join(f"{category}: {counts[category]}" for category in CATEGORIES[1:] if counts[category])
+            print(f"Source filter: {len(passed_indices)} texts passed through without translation ({skipped}).")
+            if on_batch_translated is not None:
+                on_batch_translated(passed_indices, [texts[index] for index in passed_indices])
+        if not model_indices:
+            return results
+
+        def model_batch_translated(local_indices, translations):
+            if on_batch_translated is not None:
+                on_batch_translated([model_indices[i] for i in local_indices], translations)
+
+        model_translations = translate_function([texts[index] for index in model_indices], model_batch_translated)
+        for index, translated_text in zip(model_indices, model_translations):
+            results[index] = translated_text
+        return results
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show which category the source filter assigns to texts")
+    parser.add_argument("texts", nargs="+")
+    args = parser.parse_args()
+    for text in args.texts:
+        print(f"{classify_text(text)}: {text!r}")
@@ -0,0 +1,107 @@
+import math
+import random
+
+# Компактная статистика по тегам для анализа часто встречающихся тегов в extract_text.py.
+# Вместо множества всех пар (текст, путь) на каждый (мод, тег) хранятся:
+#   - точный счетчик вхождений;
+#   - число различных текстов и путей: точно (по хэшам), пока их немного, затем приближенно (HyperLogLog);
+#   - несколько первых различных текстов и небольшая случайная выборка пар (текст, путь) (reservoir sampling).
+# Память на один тег ограничена сверху и не зависит от числа его вхождений.
+
+# --- Конфигурация ---
+SAMPLE_SIZE = 3 # Сколько примеров текстов и пар (текст, путь) хранить на тег
+EXACT_DISTINCT_LIMIT = 64 # До скольких различных значений счет ведется точно
+HLL_PRECISION = 10 # 2**10 регистров (1 КБ на счетчик), относительная погрешность около 3%
+
+_HASH_MASK = (1 << 64) - 1
+
+
+class DistinctCounter:
+    """Число различных значений: точное множество хэшей до EXACT_DISTINCT_LIMIT, дальше - HyperLogLog."""
+
+    __slots__ = ("hashes", "registers")
+
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, value):
+        """Добавляет значение; возвращает True, если оно точно встретилось впервые."""
+        value_hash = hash(value) & _HASH_MASK
+        if self.registers is None:
+            if value_hash in self.hashes:
+                return False
+            self.hashes.add(value_hash)
+            if len(self.hashes) > EXACT_DISTINCT_LIMIT:
+                self.registers = bytearray(1 << HLL_PRECISION)
+                for known_hash in self.hashes:
+                    self._add_to_registers(known_hash)
+                self.hashes = None
+            return True
+        self._add_to_registers(value_hash)
+        return False
+
+    def _add_to_registers(self, value_hash):
+        remaining_bits = 64 - HLL_PRECISION
+        register_index = value_hash >> remaining_bits
+        rank = remaining_bits - (value_hash & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[register_index]:
+            self.registers[register_index] = rank
+
+    @property
+    def is_approximate(self):
+        return self.registers is not None
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+        register_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = alpha * register_count * register_count / sum(2.0 ** -rank for rank in self.registers)
+        zero_registers = self.registers.count(0)
+        if estimate <= 2.5 * register_count and zero_registers:
+            estimate = register_count * math.log(register_count / zero_registers)
+        return max(int(round(estimate)), EXACT_DISTINCT_LIMIT + 1)
+
+
+class _TagStats:
+    __slots__ = ("count", "texts", "paths", "text_samples", "detail_samples")
+
+    def __init__(self):
+        self.count = 0
+        self.texts = DistinctCounter()
+        self.paths = DistinctCounter()
+        self.text_samples = []
+        self.detail_samples = []
+
+
+class TagStatistics:
+    """Статистика вхождений по ключам (мод, тег)."""
+
+    def __init__(self, sample_size=SAMPLE_SIZE, seed=0):
+        self.sample_size = sample_size
+        self._stats = {}
+        self._random = random.Random(seed) # Фиксированное зерно - выборка примеров воспроизводится между запусками
+
+    def add(self, key, text, path):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _TagStats()
+        stats.count += 1
+        if stats.texts.add(text) and len(stats.text_samples) < self.sample_size:
+            stats.text_samples.append(text)
+        stats.paths.add(path)
+
+        # Reservoir sampling по вхождениям; одинаковые пары в выборку повторно не попадают
+        detail_samples = stats.detail_samples
+        if len(detail_samples) < self.sample_size:
+            if (text, path) not in detail_samples:
+                detail_samples.append((text, path))
+        else:
+            slot = int(self._random.random() * stats.count)
+            if slot < self.sample_size and (text, path) not in detail_samples:
+                detail_samples[slot] = (text, path)
+
+    def items(self):
+        """Пары (ключ, статистика) с полями count, texts, paths, text_samples, detail_samples."""
+        return self._stats.items()
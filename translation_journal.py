@@ -0,0 +1,84 @@
+import os
+import json
+import hashlib
+
+# Журнал прогресса перевода для Helsinki.py.
+# Каждый завершенный батч дописывается в JSONL-файл (по строке на элемент: индекс, хэш исходника, перевод)
+# и сбрасывается на диск. После падения или остановки перезапуск берет готовые переводы из журнала
+# и продолжает с первого незавершенного батча. Записи, чей хэш не совпал с текущим исходником, игнорируются.
+
+def source_text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class TranslationJournal:
+    """Журнал завершенных переводов в формате JSONL, ключ - (индекс элемента, хэш исходного текста)."""
+
+    def __init__(self, journal_path):
+        journal_dir = os.path.dirname(journal_path)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+        self.journal_path = journal_path
+        self.translations = {}
+        self.journal_file = None
+
+    def load(self, source_texts):
+        """Читает журнал и возвращает {индекс: перевод} для записей, совпадающих с source_texts."""
+        self.translations = {}
+        if os.path.exists(self.journal_path):
+            source_hashes = {}
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        index = record["index"]
+                        translation = record["translation"]
+                    except (ValueError, KeyError, TypeError):
+                        continue # Недописанная или поврежденная строка после аварийной остановки
+                    if not isinstance(index, int) or not isinstance(translation, str):
+                        continue
+                    if not 0 <= index < len(source_texts):
+                        continue
+                    if index not in source_hashes:
+                        source_hashes[index] = source_text_hash(source_texts[index])
+                    if record.get("source_hash") == source_hashes[index]:
+                        self.translations[index] = translation
+            self._truncate_partial_record()
+        self.journal_file = open(self.journal_path, "a", encoding="utf-8")
+        return dict(self.translations)
+
+    def _truncate_partial_record(self):
+        """Обрезает журнал до последнего перевода строки: недописанная после остановки запись иначе склеится со следующей."""
+        with open(self.journal_path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                chunk_start = max(0, position - 4096)
+                f.seek(chunk_start)
+                newline_position = f.read(position - chunk_start).rfind(b"\n")
+                if newline_position != -1:
+                    position = chunk_start + newline_position + 1
+                    break
+                position = chunk_start
+            if position != end:
+                f.truncate(position)
+
+    def append_batch(self, indices, source_texts, translations):
+        """Дописывает завершенный батч и сбрасывает его на диск."""
+        for index, source_text, translation in zip(indices, source_texts, translations):
+            record = {"index": index, "source_hash": source_text_hash(source_text), "translation": translation}
+            self.journal_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.translations[index] = translation
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def close(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def remove(self):
+        """Удаляет журнал после успешной записи итогового XML."""
+        self.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
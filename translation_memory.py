@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+
+# Постоянная память переводов (TM) для Helsinki.py.
+# Ключ - (имя модели, нормализованный исходный текст), значение - перевод модели.
+# Повторный запуск после обновления модов платит временем модели только за новые строки.
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_source_text(text):
+    """Нормализует исходный текст для ключа TM: обрезает края и схлопывает пробельные символы."""
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+class TranslationMemory:
+    """Память переводов на SQLite с вытеснением давно не использованных записей."""
+
+    def __init__(self, db_path, model_name, max_entries=None):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.db_path = db_path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " model_name TEXT, source_text TEXT, translation TEXT, last_used REAL,"
+            " PRIMARY KEY (model_name, source_text))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self.connection.commit()
+
+    def lookup_many(self, texts):
+        """Возвращает список переводов той же длины, что и texts; None для промахов."""
+        results = [None] * len(texts)
+        now = time.time()
+        used_keys = []
+        for index, text in enumerate(texts):
+            source_key = normalize_source_text(text)
+            if not source_key:
+                continue
+            row = self.connection.execute(
+                "SELECT translation FROM translations WHERE model_name = ? AND source_text = ?",
+                (self.model_name, source_key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                results[index] = row[0]
+                used_keys.append((now, self.model_name, source_key))
+        if used_keys:
+            self.connection.executemany(
+                "UPDATE translations SET last_used = ? WHERE model_name = ? AND source_text = ?", used_keys
+            )
+            self.connection.commit()
+        return results
+
+    def store_many(self, pairs):
+        """Сохраняет пары (исходный текст, перевод) и применяет ограничение размера."""
+        now = time.time()
+        rows = []
+        for source_text, translation in pairs:
+            source_key = normalize_source_text(source_text)
+            if source_key and translation:
+                rows.append((self.model_name, source_key, translation, now))
+        if not rows:
+            return
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO translations (model_name, source_text, translation, last_used) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self.connection.commit()
+        self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные записи сверх max_entries. Возвращает число удаленных."""
+        if not self.max_entries:
+            return 0
+        total = self.connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = total - self.max_entries
+        if excess <= 0:
+            return 0
+        self.connection.execute(
+            "DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self.connection.commit()
+        return excess
+
+    def export_jsonl(self, output_path, all_models=False):
+        """Выгружает записи в JSONL (по одной записи на строку). Возвращает число записей."""
+        if all_models:
+            cursor = self.connection.execute(
+                "SELECT model_name, source_text, translation FROM translations ORDER BY model_name, source_text"
+            )
+        else:
+            cursor = self.connection.execute(
+                "SELECT model_name, source_text, translation FROM translations WHERE model_name = ? ORDER BY source_text",
+                (self.model_name,),
+            )
+        count = 0
+        with open(output_path, "w", encoding="utf-8") as f:
+            for model_name, source_text, translation in cursor:
+                f.write(json.dumps({"model": model_name, "source": source_text, "translation": translation}, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_jsonl(self, input_path):
+        """Загружает записи из JSONL. Записи без поля model относятся к текущей модели."""
+        now = time.time()
+        rows = []
+        with open(input_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                source_key = normalize_source_text(record["source"])
+                if source_key and record.get("translation"):
+                    rows.append((record.get("model", self.model_name), source_key, record["translation"], now))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO translations (model_name, source_text, translation, last_used) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self.connection.commit()
+        self.evict()
+        return len(rows)
+
+    def count(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM translations WHERE model_name = ?", (self.model_name,)
+        ).fetchone()[0]
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+# --- Точка входа: обслуживание TM из командной строки ---
+if __name__ == "__main__":
+    from Helsinki import MODEL_NAME, TRANSLATION_MEMORY_FILE, TRANSLATION_MEMORY_MAX_ENTRIES
+
+    parser = argparse.ArgumentParser(description="Translation memory maintenance for Helsinki.py")
+    parser.add_argument("--db", default=TRANSLATION_MEMORY_FILE, help="Path to the translation memory database")
+    parser.add_argument("--model", default=MODEL_NAME, help="Model name the entries belong to")
+    parser.add_argument("--export", dest="export_path", help="Export entries to a JSONL file")
+    parser.add_argument("--import", dest="import_path", help="Import entries from a JSONL file")
+    parser.add_argument("--all-models", action="store_true", help="Export entries of every model, not only --model")
+    args = parser.parse_args()
+
+    memory = TranslationMemory(args.db, args.model, TRANSLATION_MEMORY_MAX_ENTRIES)
+    try:
+        if args.import_path:
+            imported = memory.import_jsonl(args.import_path)
+            print(f"Imported {imported} entries from {args.import_path}")
+        if args.export_path:
+            exported = memory.export_jsonl(args.export_path, all_models=args.all_models)
+            print(f"Exported {exported} entries to {args.export_path}")
+        print(f"Translation memory {os.path.abspath(args.db)}: {memory.count()} entries for model {args.model}")
+    finally:
+        memory.close()
@@ -0,0 +1,166 @@
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Локальный сервис перевода: модель Marian загружается один раз и остается в памяти,
+# а Helsinki.py / pipeline.py / update_translation.py с флагом --server отправляют ему тексты по HTTP
+# на localhost. Клиенту не нужны torch и transformers - перевод начинается сразу, без загрузки модели.
+# Дедупликация, память переводов, журнал и глоссарий остаются на стороне клиента; сервер получает
+# только тексты для модели и сам собирает из них батчи по длине.
+#
+# Запуск:  python translation_server.py [--port 8765] [--workers N] [--backend pytorch_int8]
+# Клиент:  python Helsinki.py --server http://127.0.0.1:8765
+#
+# Протокол (JSON):
+#   GET  /health    -> {"status": "ok", "model": ..., "backend": ..., "requests": ..., "texts": ...}
+#   POST /translate {"texts": [...]} -> {"translations": [...]} (тот же порядок)
+
+# --- Конфигурация ---
+SERVER_HOST = "127.0.0.1" # Только локальные подключения
+SERVER_PORT = 8765
+MAX_TEXTS_PER_REQUEST = 5000
+CLIENT_TEXTS_PER_REQUEST = 256 # Сколько текстов клиент отправляет за один запрос (прогресс и журнал - по запросам)
+CLIENT_TIMEOUT_SECONDS = 600
+HEALTH_TIMEOUT_SECONDS = 2
+
+
+class TranslationClient:
+    """Клиент сервиса перевода (только стандартная библиотека)."""
+
+    def __init__(self, server_url, timeout=CLIENT_TIMEOUT_SECONDS):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None, timeout=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.server_url + path, data=data, method="POST" if data is not None else "GET",
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise RuntimeError(f"translation server error {e.code}: {message}") from e
+
+    def health(self):
+        """Сведения о сервере или None, если он не отвечает."""
+        try:
+            return self._request("/health", timeout=HEALTH_TIMEOUT_SECONDS)
+        except (OSError, RuntimeError, ValueError):
+            return None
+
+    def translate(self, texts):
+        translations = self._request("/translate", {"texts": list(texts)})["translations"]
+        if len(translations) != len(texts):
+            raise RuntimeError(f"translation server returned {len(translations)} translations for {len(texts)} texts")
+        return translations
+
+
+def make_handler(translate, server_info):
+    """Обработчик запросов; translate(texts) вызывается под блокировкой - модель одна на все подключения."""
+    model_lock = threading.Lock()
+
+    class TranslationRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+            self._send_json(200, dict(server_info, status="ok"))
+
+        def do_POST(self):
+            if self.path != "/translate":
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+                texts = payload["texts"]
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError("'texts' must be a list of strings")
+            except (ValueError, KeyError) as e:
+                self._send_json(400, {"error": f"bad request: {e}"})
+                return
+            if len(texts) > MAX_TEXTS_PER_REQUEST:
+                self._send_json(413, {"error": f"too many texts in one request (max {MAX_TEXTS_PER_REQUEST})"})
+                return
+            start = time.perf_counter()
+            try:
+                with model_lock:
+                    translations = translate(texts)
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            with model_lock:
+                server_info["requests"] += 1
+                server_info["texts"] += len(texts)
+                server_info["seconds"] = round(server_info["seconds"] + time.perf_counter() - start, 3)
+            self._send_json(200, {"translations": translations})
+
+        def log_message(self, format, *args):
+            pass # Прогресс перевода и так печатается
+
+    return TranslationRequestHandler
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=None, threads_per_worker=None, backend=None):
+    import Helsinki # Тяжелые импорты (torch, transformers) нужны только серверу
+
+    workers = workers or Helsinki.INFERENCE_WORKERS
+    backend = backend or Helsinki.INFERENCE_BACKEND
+    model, tokenizer, inference_pool = None, None, None
+    load_start = time.perf_counter()
+    if workers > 1:
+        tokenizer = Helsinki.load_tokenizer(Helsinki.MODEL_NAME)
+        if tokenizer:
+            inference_pool = Helsinki.create_inference_pool(Helsinki.MODEL_NAME, workers, threads_per_worker, backend)
+    else:
+        model, tokenizer = Helsinki.load_model_and_tokenizer(Helsinki.MODEL_NAME, backend)
+    if not tokenizer or (not model and inference_pool is None):
+        print("Failed to load model, the translation server is not started.")
+        return
+    print(f"Model ready in {time.perf_counter() - load_start:.1f}s.")
+
+    def translate(texts):
+        return Helsinki._translate_texts_with_model(
+            texts, model, tokenizer, Helsinki.BATCH_MAX_SENTENCES, Helsinki.BATCH_MAX_TOKENS, inference_pool
+        )
+
+    server_info = {"model": Helsinki.MODEL_NAME, "backend": backend, "workers": workers, "requests": 0, "texts": 0, "seconds": 0.0}
+    server = ThreadingHTTPServer((host, port), make_handler(translate, server_info))
+    print(f"Translation server listening on http://{host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping translation server...")
+    finally:
+        server.server_close()
+        if inference_pool is not None:
+            inference_pool.shutdown()
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the Marian model loaded and serve translations over localhost HTTP")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, help="Number of model replica processes")
+    parser.add_argument("--threads-per-worker", type=int, help="Torch threads per worker process")
+    parser.add_argument("--backend", choices=["pytorch", "pytorch_int8", "onnx"], help="Inference backend")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads_per_worker, args.backend)
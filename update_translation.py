@@ -0,0 +1,262 @@
+import os
+import re
+import argparse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape, escape
+
+import extract_text
+import Helsinki
+import clean
+import pipeline
+import run_metrics
+from translation_memory import TranslationMemory
+
+# Обновление готового перевода (Language/Russian/Russian.xml) по изменениям в модах.
+# Прежний файл индексируется по (тег, английская половина после "---"). Тексты модов извлекаются заново;
+# в модель уходят только новые и изменившиеся строки, а для неизменившихся перевод берется из прежнего
+# файла дословно. Итоговый файл содержит ровно текущие тексты модов в порядке extract_text.py.
+# clean.py чистит запись целиком (разделитель в Russian.xml - "---" без переносов строк), поэтому
+# английские половины прежнего файла уже очищены: пробелы схлопнуты, в конце добавлена точка.
+# Запись, не найденная по исходному тексту, ищется еще по очищенной форме (см. normalized_source_key).
+#
+# С --mods / --only-changed-workshop-mods извлекаются только выбранные моды; записи прежнего файла
+# с тегами, которых нет среди извлеченных, переносятся без изменений (в начало файла, в прежнем порядке),
+# а за ними идут записи выбранных модов. Теги, удаленные из выбранных модов, при этом не удаляются -
+# для этого нужен полный запуск без выбора модов.
+#
+# Прежние записи с маркером ошибки вместо перевода или с переводом, совпадающим с оригиналом (модель
+# не была загружена), не переиспользуются, а переводятся заново. Новые переводы с маркером ошибки
+# в файл не пишутся: запись попадет в перевод при следующем запуске.
+
+# --- Конфигурация ---
+PREVIOUS_TRANSLATION_FILE = "Language/Russian/Russian.xml"
+UPDATE_MODS_DIRECTORY = "."
+UPDATE_OUTPUT_FILE = PREVIOUS_TRANSLATION_FILE # По умолчанию файл обновляется на месте (через временный файл)
+# Разделитель перевода и оригинала в итоговом файле (в Russian.xml - "---" без переносов строк)
+UPDATE_TEXT_SEPARATOR = "---"
+# Разделитель, по которому разбираются записи прежнего файла
+PREVIOUS_TEXT_SEPARATOR = "---"
+
+_ERROR_MARKERS = ("[TRANSLATION_ERROR]", "[MODEL_NOT_LOADED]")
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def source_text_form(escaped_text):
+    """Исходный текст записи extract_text.py в том виде, в каком он стоит после "---" в файле перевода (после разбора XML).
+
+    Helsinki.py расэкранирует текст записи дважды (разбор XML + unescape), а в итоговый файл
+    текст попадает экранированным еще раз - см. clean.py и pipeline.write_final_xml.
+    """
+    return escape(unescape(unescape(escaped_text)))
+
+
+def normalized_source_key(source_text):
+    """Ключ для поиска записи по очищенной английской половине.
+
+    source_text - исходный текст без экранирования. К нему применяются правила clean.py (как к записи
+    прежнего файла), затем пробелы схлопываются и отбрасывается точка в конце - правила, стоящие
+    в начале записи, английскую половину в середине строки не затрагивали, и точную форму повторить нельзя.
+    """
+    cleaned = _WHITESPACE_RE.sub(" ", clean.post_process_translation(source_text)).strip()
+    return cleaned[:-1].rstrip() if cleaned.endswith(".") and not cleaned.endswith("...") else cleaned
+
+
+def is_reusable_translation(translated_half, english_half):
+    """Перевод прежней записи можно переносить: это не маркер ошибки и не скопированный оригинал."""
+    translated_half = translated_half.strip()
+    return not translated_half.startswith(_ERROR_MARKERS) and translated_half != english_half
+
+
+class PreviousTranslations:
+    """Записи прежнего файла перевода и индексы для поиска неизменившихся.
+
+    exact - {(тег, английская половина): текст записи целиком}; тексты берутся как есть после разбора XML
+    (т.е. в экранированном виде, как и записываются) и для неизменившихся записей переносятся дословно.
+    normalized - то же по (тег, normalized_source_key(английская половина)).
+    Если "---" встречается в записи несколько раз, в индексы попадают все варианты разбиения -
+    при поиске совпадет тот, чья английская половина равна текущему исходному тексту.
+    Варианты без настоящего перевода (см. is_reusable_translation) в индексы не попадают.
+    entries - [(тег, текст записи)] в порядке файла.
+    """
+
+    def __init__(self, xml_path):
+        self.exact = {}
+        self.normalized = {}
+        self.entries = []
+        for _, element in ET.iterparse(xml_path):
+            if not isinstance(element.tag, str) or element.tag == "infotexts":
+                continue
+            text = element.text or ""
+            self.entries.append((element.tag, text))
+            position = text.find(PREVIOUS_TEXT_SEPARATOR)
+            while position != -1:
+                english_half = text[position + len(PREVIOUS_TEXT_SEPARATOR):].strip()
+                if not is_reusable_translation(text[:position], english_half):
+                    position = text.find(PREVIOUS_TEXT_SEPARATOR, position + 1)
+                    continue
+                self.exact.setdefault((element.tag, english_half), text)
+                self.normalized.setdefault((element.tag, normalized_source_key(unescape(english_half))), text)
+                position = text.find(PREVIOUS_TEXT_SEPARATOR, position + 1)
+            element.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, full_tag, escaped_text):
+        """(текст прежней записи или None, найдена ли она только по очищенной форме)."""
+        english_half = source_text_form(escaped_text).strip()
+        previous_text = self.exact.get((full_tag, english_half))
+        if previous_text is not None:
+            return previous_text, False
+        previous_text = self.normalized.get((full_tag, normalized_source_key(unescape(unescape(escaped_text)))))
+        return previous_text, previous_text is not None
+
+
+def split_reused_and_pending(text_items, previous):
+    """Делит записи extract_text.py на переиспользуемые и требующие перевода.
+
+    Возвращает (entries, pending_items, normalized_matches): entries - список [тег, текст или None]
+    в порядке записей, None - место для перевода; pending_items - записи для перевода с их номерами
+    в entries; normalized_matches - сколько записей найдено только по очищенной форме.
+    """
+    entries = []
+    pending_items = []
+    normalized_matches = 0
+    for text_item in text_items:
+        full_tag, escaped_text, _, _ = text_item
+        previous_text, normalized_match = previous.lookup(full_tag, escaped_text)
+        if previous_text is not None:
+            entries.append([full_tag, previous_text])
+            normalized_matches += normalized_match
+        else:
+            pending_items.append((len(entries), text_item))
+            entries.append([full_tag, None])
+    return entries, pending_items, normalized_matches
+
+
+def carried_over_entries(previous, text_items):
+    """Записи прежнего файла, тегов которых нет среди text_items (моды, которые не извлекались)."""
+    scanned_tags = {full_tag for full_tag, _, _, _ in text_items}
+    return [[full_tag, text] for full_tag, text in previous.entries if full_tag not in scanned_tags]
+
+
+def translate_pending(pending_items, entries, model, tokenizer, **translate_options):
+    """Переводит и чистит новые записи и вставляет их в entries на свои места.
+
+    Записи, перевод которых закончился маркером ошибки, остаются пустыми (None) и в файл не пишутся.
+    Возвращает их число.
+    """
+    records = [text_item for _, text_item in pending_items]
+    translated_records = pipeline.iter_translated_records(records, model, tokenizer, pipeline.PIPELINE_TRANSLATION_CHUNK_SIZE, **translate_options)
+    failed = 0
+    for (entry_index, _), (_, source_text, translated_text) in zip(pending_items, translated_records):
+        if translated_text.startswith(_ERROR_MARKERS):
+            failed += 1
+            continue
+        cleaned_translation = clean.post_process_translation(translated_text)
+        entries[entry_index][1] = escape(f"{cleaned_translation}{UPDATE_TEXT_SEPARATOR}{source_text}")
+    return failed
+
+
+def update_translation(previous_path, mods_root_directory, output_path, workers=Helsinki.INFERENCE_WORKERS, threads_per_worker=Helsinki.THREADS_PER_WORKER, backend=Helsinki.INFERENCE_BACKEND, server_url=None, mod_names=None):
+    """Обновляет перевод. mod_names - извлекать только эти моды, остальные записи прежнего файла переносятся как есть."""
+    if not os.path.exists(previous_path):
+        print(f"Error: previous translation file not found at {previous_path}")
+        return None
+
+    with run_metrics.phase("load_previous"):
+        previous = PreviousTranslations(previous_path)
+    print(f"Loaded {len(previous)} entries from previous translation {previous_path}.")
+
+    with run_metrics.phase("extract"):
+        text_items, _ = extract_text.collect_and_filter_texts(mods_root_directory, mod_names=mod_names)
+
+    entries, pending_items, normalized_matches = split_reused_and_pending(text_items, previous)
+    carried_entries = carried_over_entries(previous, text_items) if mod_names is not None else []
+    stats = {
+        "entries": len(entries) + len(carried_entries),
+        "reused": len(entries) - len(pending_items),
+        "reused_by_cleaned_form": normalized_matches,
+        "translated": len(pending_items),
+        "failed": 0,
+        "carried_over": len(carried_entries),
+    }
+    print(f"{stats['reused']} entries unchanged (translation reused, {normalized_matches} matched by the cleaned original), "
+          f"{stats['translated']} new or changed entries to translate.")
+    if mod_names is not None:
+        print(f"Only {len(mod_names)} selected mods extracted: {len(carried_entries)} entries of other mods carried over unchanged.")
+
+    if pending_items:
+        model, tokenizer, inference_pool = None, None, None
+        translation_client = Helsinki.connect_translation_server(server_url) if Helsinki.ATTEMPT_MODEL_TRANSLATION else None
+        if Helsinki.ATTEMPT_MODEL_TRANSLATION and translation_client is None:
+            with run_metrics.phase("load_model"):
+                if workers > 1:
+                    tokenizer = Helsinki.load_tokenizer(Helsinki.MODEL_NAME)
+                    if tokenizer:
+                        inference_pool = Helsinki.create_inference_pool(Helsinki.MODEL_NAME, workers, threads_per_worker, backend)
+                else:
+                    model, tokenizer = Helsinki.load_model_and_tokenizer(Helsinki.MODEL_NAME, backend)
+
+        translation_memory = None
+        if Helsinki.USE_TRANSLATION_MEMORY:
+            translation_memory = TranslationMemory(Helsinki.TRANSLATION_MEMORY_FILE, Helsinki.MODEL_NAME, Helsinki.TRANSLATION_MEMORY_MAX_ENTRIES)
+        term_glossary = Helsinki.load_glossary()
+        segmenter = Helsinki.create_segmenter()
+        source_filter = Helsinki.create_source_filter()
+        try:
+            with run_metrics.phase("translate", texts=len(pending_items)):
+                stats["failed"] = translate_pending(
+                    pending_items, entries, model, tokenizer,
+                    batch_size=Helsinki.BATCH_MAX_SENTENCES, translation_memory=translation_memory,
+                    max_batch_tokens=Helsinki.BATCH_MAX_TOKENS, inference_pool=inference_pool, glossary=term_glossary,
+                    translation_client=translation_client, segmenter=segmenter,
+                    source_filter=source_filter,
+                )
+            if term_glossary is not None:
+                print(term_glossary.summary())
+            if segmenter is not None:
+                print(segmenter.summary())
+            if source_filter is not None:
+                print(source_filter.summary())
+        finally:
+            if translation_memory is not None:
+                translation_memory.close()
+            if inference_pool is not None:
+                inference_pool.shutdown()
+
+    if stats["failed"]:
+        print(f"Warning: {stats['failed']} entries failed to translate and were left out of the output; they will be translated on the next update.")
+    with run_metrics.phase("write_output", texts=len(entries)):
+        pipeline.write_final_xml(((full_tag, text) for full_tag, text in carried_entries + entries if text is not None), output_path, escape_text=False)
+    print(f"Updated translation saved to: {os.path.abspath(output_path)}")
+    return stats
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the finished translation file, translating only new or changed mod texts")
+    parser.add_argument("--previous", default=PREVIOUS_TRANSLATION_FILE, help="Previous translation file (tag -> translation---original)")
+    parser.add_argument("--mods-dir", default=UPDATE_MODS_DIRECTORY, help="Root directory with installed mods")
+    parser.add_argument("--output", default=UPDATE_OUTPUT_FILE, help="Merged translation file to write")
+    parser.add_argument("--workers", type=int, default=Helsinki.INFERENCE_WORKERS, help="Number of model replica processes")
+    parser.add_argument("--threads-per-worker", type=int, default=Helsinki.THREADS_PER_WORKER, help="Torch threads per worker process")
+    parser.add_argument("--backend", choices=["pytorch", "pytorch_int8", "onnx"], default=Helsinki.INFERENCE_BACKEND, help="Inference backend")
+    parser.add_argument("--server", default=Helsinki.TRANSLATION_SERVER_URL, help="URL of a running translation_server.py (no local model load)")
+    parser.add_argument("--mods", nargs="+", help="Extract only these mod folders; entries of other mods are kept from the previous file")
+    parser.add_argument("--only-changed-workshop-mods", action="store_true", help="Extract only Workshop mods updated since the last translation (see workshop_metadata.py)")
+    parser.add_argument("--workshop-endpoint", help="GetPublishedFileDetails URL for --only-changed-workshop-mods (e.g. a local stub server)")
+    parser.add_argument("--metrics", action="store_true", default=run_metrics.COLLECT_METRICS, help="Write a JSON/CSV run report (see run_metrics.py)")
+    parser.add_argument("--profile", choices=run_metrics.PROFILER_CHOICES, default=run_metrics.PROFILER, help="Profile the run")
+    args = parser.parse_args()
+    with run_metrics.run("update_translation", args.metrics, args.profile):
+        selected_mods = args.mods
+        if args.only_changed_workshop_mods:
+            import workshop_metadata # Нужен только в этом режиме
+            changed_directories, current_versions = workshop_metadata.changed_mods(
+                args.mods_dir, args.workshop_endpoint or workshop_metadata.WORKSHOP_DETAILS_ENDPOINT
+            )
+            workshop_metadata.save_extracted_versions(current_versions) # Их и отметит --mark-translated
+            selected_mods = sorted(set(selected_mods or []) | set(changed_directories))
+            print(f"Workshop mods changed since the last translation: {len(changed_directories)}. Run 'workshop_metadata.py --mark-translated' after checking the result.")
+        update_translation(args.previous, args.mods_dir, args.output, args.workers, args.threads_per_worker, args.backend, args.server, selected_mods)
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+
+# Метаданные модов Steam Workshop (GetPublishedFileDetails) для выбора модов, изменившихся
+# с прошлого перевода: только их имеет смысл заново извлекать (extract_text.py --only-changed-workshop-mods).
+#
+# Запросы идут асинхронно пачками по DETAILS_CHUNK_SIZE id, одновременно не больше MAX_CONCURRENT_REQUESTS,
+# не чаще REQUESTS_PER_SECOND; 429 и 5xx повторяются с экспоненциальной задержкой.
+# HTTP-клиент - aiohttp (пул соединений); без него запросы выполняются через urllib в потоках.
+# Ответы кэшируются в SQLite по (id, time_updated): свежие записи (моложе CACHE_MAX_AGE_SECONDS)
+# берутся без запроса. Там же хранится, какая версия каждого мода была переведена последней.
+# Версии модов на момент извлечения (--only-changed-workshop-mods в extract_text.py и update_translation.py)
+# сохраняются в EXTRACTED_VERSIONS_FILE, и --mark-translated отмечает переведенными именно их, а не версии,
+# которые Steam вернет позже: мод, обновленный между извлечением и отметкой, останется изменившимся.
+# Адрес API настраивается (--endpoint), что позволяет проверять модуль на локальной заглушке
+# (см. benchmark_workshop.py).
+
+# --- Конфигурация ---
+WORKSHOP_DETAILS_ENDPOINT = "https://api.steampowered.com/ISteamRemoteStorage/GetPublishedFileDetails/v1/"
+WORKSHOP_CACHE_FILE = os.path.join("translation_output_for_extractor", "workshop_details.sqlite")
+DETAILS_CHUNK_SIZE = 100 # Больше 100 id в одном запросе Steam не принимает
+MAX_CONCURRENT_REQUESTS = 4
+REQUESTS_PER_SECOND = 1.0 # Чтобы не упереться в лимит Steam (None - без ограничения)
+REQUEST_TIMEOUT_SECONDS = 30
+MAX_RETRIES = 3
+RETRY_BASE_DELAY_SECONDS = 1.0
+CACHE_MAX_AGE_SECONDS = 3600 # Сколько считать сведения о моде свежими (0 - всегда спрашивать Steam)
+EXTRACTED_VERSIONS_FILE = os.path.join("translation_output_for_extractor", "workshop_extracted_versions.json")
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+# --- Список модов ---
+def parse_mod_list_ids(xml_path):
+    """[(id, имя)] из списка модов игры (ModLists/*.xml, элементы <Workshop id=".." name=".."/>)."""
+    root = ET.parse(xml_path).getroot()
+    mods = []
+    for workshop in root.findall("Workshop"):
+        mod_id = workshop.get("id")
+        if mod_id:
+            mods.append((mod_id, workshop.get("name")))
+    return mods
+
+
+def find_installed_mods(mods_root_directory):
+    """{id: имя папки мода} для установленных модов.
+
+    Id берется из атрибута steamworkshopid в filelist.xml мода, а если его нет -
+    из имени папки, когда оно числовое (так Barotrauma называет папки скачанных модов).
+    Локальные моды без id в результат не попадают.
+    """
+    installed = {}
+    for entry in sorted(os.listdir(mods_root_directory)):
+        mod_directory = os.path.join(mods_root_directory, entry)
+        if not os.path.isdir(mod_directory):
+            continue
+        mod_id = None
+        filelist_path = os.path.join(mod_directory, "filelist.xml")
+        if os.path.exists(filelist_path):
+            try:
+                mod_id = ET.parse(filelist_path).getroot().get("steamworkshopid")
+            except ET.ParseError:
+                mod_id = None
+        if not mod_id and entry.isdigit():
+            mod_id = entry
+        if mod_id and mod_id != "0":
+            installed[mod_id] = entry
+    return installed
+
+
+# --- Кэш ---
+class WorkshopDetailsCache:
+    """Кэш сведений о модах на SQLite, ключ - (id, time_updated), плюс версии модов на момент перевода."""
+
+    def __init__(self, db_path):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " mod_id TEXT, time_updated INTEGER, details_json TEXT, fetched_at REAL,"
+            " PRIMARY KEY (mod_id, time_updated))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS translated (mod_id TEXT PRIMARY KEY, time_updated INTEGER, translated_at REAL)"
+        )
+        self.connection.commit()
+
+    def get_fresh(self, mod_ids, max_age_seconds):
+        """{id: сведения} для модов, последние сведения о которых получены не раньше max_age_seconds назад."""
+        oldest_allowed = time.time() - max_age_seconds
+        fresh = {}
+        for mod_id in mod_ids:
+            row = self.connection.execute(
+                "SELECT details_json, fetched_at FROM details WHERE mod_id = ? ORDER BY fetched_at DESC LIMIT 1", (mod_id,)
+            ).fetchone()
+            if row is not None and row[1] >= oldest_allowed:
+                fresh[mod_id] = json.loads(row[0])
+        return fresh
+
+    def put_many(self, details_list):
+        """Сохраняет ответы Steam; записи без time_updated (мод удален или скрыт) не кэшируются."""
+        now = time.time()
+        rows = [
+            (str(details["publishedfileid"]), int(details["time_updated"]), json.dumps(details, ensure_ascii=False), now)
+            for details in details_list if details.get("time_updated") is not None
+        ]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO details (mod_id, time_updated, details_json, fetched_at) VALUES (?, ?, ?, ?)", rows
+        )
+        self.connection.commit()
+
+    def translated_versions(self):
+        """{id: time_updated} версий модов, переведенных последними."""
+        return dict(self.connection.execute("SELECT mod_id, time_updated FROM translated"))
+
+    def mark_translated(self, versions):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO translated (mod_id, time_updated, translated_at) VALUES (?, ?, ?)",
+            [(mod_id, time_updated, now) for mod_id, time_updated in versions.items()],
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+# --- Загрузка ---
+class RateLimiter:
+    """Пропускает не больше requests_per_second запросов в секунду (равномерно)."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_allowed = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            delay = self.next_allowed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_allowed = max(self.next_allowed, loop.time()) + self.interval
+
+
+class WorkshopRequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+def _details_form(mod_ids):
+    form = {"itemcount": str(len(mod_ids))}
+    for index, mod_id in enumerate(mod_ids):
+        form[f"publishedfileids[{index}]"] = mod_id
+    return form
+
+
+def _post_form_urllib(endpoint, form, timeout):
+    request = urllib.request.Request(endpoint, data=urllib.parse.urlencode(form).encode("ascii"), method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        raise WorkshopRequestError(e.code, e.reason) from e
+
+
+async def _post_form(session, endpoint, form, timeout):
+    if session is None:
+        return await asyncio.to_thread(_post_form_urllib, endpoint, form, timeout)
+    async with session.post(endpoint, data=form) as response:
+        if response.status != 200:
+            raise WorkshopRequestError(response.status, response.reason)
+        return await response.json(content_type=None)
+
+
+def _is_retryable(error):
+    if isinstance(error, WorkshopRequestError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (OSError, asyncio.TimeoutError)) or (aiohttp is not None and isinstance(error, aiohttp.ClientError))
+
+
+async def _fetch_chunk(session, endpoint, mod_ids, semaphore, rate_limiter, timeout, max_retries, stats):
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            await rate_limiter.wait()
+            stats["requests"] += 1
+            try:
+                payload = await _post_form(session, endpoint, _details_form(mod_ids), timeout)
+                return payload["response"].get("publishedfiledetails", [])
+            except Exception as e:
+                if attempt == max_retries or not _is_retryable(e):
+                    raise
+                stats["retries"] += 1
+                await asyncio.sleep(RETRY_BASE_DELAY_SECONDS * 2 ** attempt * (1 + random.random() / 2))
+
+
+async def fetch_details_async(mod_ids, endpoint=WORKSHOP_DETAILS_ENDPOINT, chunk_size=DETAILS_CHUNK_SIZE,
+                              max_concurrent=MAX_CONCURRENT_REQUESTS, requests_per_second=REQUESTS_PER_SECOND,
+                              timeout=REQUEST_TIMEOUT_SECONDS, max_retries=MAX_RETRIES, stats=None):
+    """Запрашивает сведения о модах у Steam. Возвращает {id: сведения} (без кэша).
+
+    Пачка, не получившая ответа и после всех повторов, не отменяет остальные: ее id добавляются
+    в stats["failed_ids"], в результат они не попадают (changed_mods считает такие моды изменившимися).
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("requests", 0)
+    stats.setdefault("retries", 0)
+    stats.setdefault("failed_ids", [])
+    mod_ids = list(dict.fromkeys(str(mod_id) for mod_id in mod_ids))
+    if not mod_ids:
+        return {}
+    semaphore = asyncio.Semaphore(max_concurrent)
+    rate_limiter = RateLimiter(requests_per_second)
+    chunks = [mod_ids[start:start + chunk_size] for start in range(0, len(mod_ids), chunk_size)]
+
+    async def fetch_all(session):
+        return await asyncio.gather(*(
+            _fetch_chunk(session, endpoint, chunk, semaphore, rate_limiter, timeout, max_retries, stats) for chunk in chunks
+        ), return_exceptions=True)
+
+    if aiohttp is not None:
+        connector = aiohttp.TCPConnector(limit=max_concurrent)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            chunk_results = await fetch_all(session)
+    else:
+        chunk_results = await fetch_all(None)
+
+    details_by_id = {}
+    for chunk, details_list in zip(chunks, chunk_results):
+        if isinstance(details_list, BaseException):
+            if not isinstance(details_list, Exception):
+                raise details_list # KeyboardInterrupt, CancelledError и т.п. не глушатся
+            print(f"Warning: failed to fetch Workshop details of {len(chunk)} mods: {details_list}")
+            stats["failed_ids"].extend(chunk)
+            continue
+        for details in details_list:
+            details_by_id[str(details.get("publishedfileid"))] = details
+    return details_by_id
+
+
+def fetch_mod_details(mod_ids, endpoint=WORKSHOP_DETAILS_ENDPOINT, cache_path=WORKSHOP_CACHE_FILE,
+                      max_age_seconds=CACHE_MAX_AGE_SECONDS, stats=None, **fetch_options):
+    """{id: сведения} для модов: свежие - из кэша, остальные - из Steam (и сохраняются в кэш).
+
+    cache_path=None - без кэша. В stats (если передан) пишутся requests, retries, cache_hits
+    и failed_ids - id, сведения о которых получить не удалось (полученные остальные все равно кэшируются).
+    """
+    if stats is None:
+        stats = {}
+    mod_ids = list(dict.fromkeys(str(mod_id) for mod_id in mod_ids))
+    cache = WorkshopDetailsCache(cache_path) if cache_path else None
+    try:
+        details_by_id = cache.get_fresh(mod_ids, max_age_seconds) if cache is not None and max_age_seconds > 0 else {}
+        stats["cache_hits"] = len(details_by_id)
+        missing_ids = [mod_id for mod_id in mod_ids if mod_id not in details_by_id]
+        fetched = asyncio.run(fetch_details_async(missing_ids, endpoint, stats=stats, **fetch_options)) if missing_ids else {}
+        if cache is not None:
+            cache.put_many(fetched.values())
+        details_by_id.update(fetched)
+    finally:
+        if cache is not None:
+            cache.close()
+    return details_by_id
+
+
+# --- Выбор изменившихся модов ---
+def changed_mods(mods_root_directory, endpoint=WORKSHOP_DETAILS_ENDPOINT, cache_path=WORKSHOP_CACHE_FILE, **fetch_options):
+    """Установленные моды Workshop, обновленные после последнего перевода (или еще не переводившиеся).
+
+    Возвращает (список имен папок, {id: time_updated} текущих версий - для mark_translated).
+    Моды, сведений о которых Steam не вернул (удалены или скрыты) или которые не удалось запросить,
+    считаются изменившимися.
+    """
+    installed = find_installed_mods(mods_root_directory)
+    details_by_id = fetch_mod_details(installed, endpoint, cache_path, **fetch_options)
+    cache = WorkshopDetailsCache(cache_path)
+    try:
+        translated_versions = cache.translated_versions()
+    finally:
+        cache.close()
+
+    changed_directories = []
+    current_versions = {}
+    for mod_id, mod_directory in installed.items():
+        time_updated = details_by_id.get(mod_id, {}).get("time_updated")
+        if time_updated is not None:
+            current_versions[mod_id] = int(time_updated)
+        if time_updated is None or translated_versions.get(mod_id) != int(time_updated):
+            changed_directories.append(mod_directory)
+    return changed_directories, current_versions
+
+
+def save_extracted_versions(current_versions, versions_path=EXTRACTED_VERSIONS_FILE):
+    """Сохраняет {id: time_updated} модов на момент извлечения (второе значение changed_mods) для mark_translated."""
+    versions_dir = os.path.dirname(versions_path)
+    if versions_dir and not os.path.exists(versions_dir):
+        os.makedirs(versions_dir)
+    with open(versions_path, "w", encoding="utf-8") as f:
+        json.dump(current_versions, f, indent=2)
+
+
+def mark_translated(versions_path=EXTRACTED_VERSIONS_FILE, cache_path=WORKSHOP_CACHE_FILE):
+    """Запоминает как переведенные версии модов, сохраненные при извлечении. Возвращает число модов или None без файла версий."""
+    if not os.path.exists(versions_path):
+        print(f"Error: no extracted mod versions at {versions_path}. Extract with --only-changed-workshop-mods first.")
+        return None
+    with open(versions_path, "r", encoding="utf-8") as f:
+        current_versions = {str(mod_id): int(time_updated) for mod_id, time_updated in json.load(f).items()}
+    cache = WorkshopDetailsCache(cache_path)
+    try:
+        cache.mark_translated(current_versions)
+    finally:
+        cache.close()
+    return len(current_versions)
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch Steam Workshop details of installed mods and list mods changed since the last translation")
+    parser.add_argument("--mods-dir", default=".", help="Root directory with installed mods")
+    parser.add_argument("--mod-list", help="Game mod list XML (ModLists/*.xml) to fetch details for instead of installed mods")
+    parser.add_argument("--endpoint", default=WORKSHOP_DETAILS_ENDPOINT, help="GetPublishedFileDetails URL (e.g. a local stub server)")
+    parser.add_argument("--cache", default=WORKSHOP_CACHE_FILE, help="SQLite cache file")
+    parser.add_argument("--max-age", type=float, default=CACHE_MAX_AGE_SECONDS, help="Seconds cached details stay fresh (0 = always ask Steam)")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="Requests per second (0 = unlimited)")
+    parser.add_argument("--mark-translated", action="store_true", help="Record mod versions saved at extraction time as translated")
+    parser.add_argument("--versions", default=EXTRACTED_VERSIONS_FILE, help="Mod versions saved by --only-changed-workshop-mods extraction")
+    args = parser.parse_args()
+
+    fetch_options = dict(max_concurrent=args.concurrency, requests_per_second=args.rate or None)
+    stats = {}
+    if args.mod_list:
+        mods = parse_mod_list_ids(args.mod_list)
+        details_by_id = fetch_mod_details([mod_id for mod_id, _ in mods], args.endpoint, args.cache, args.max_age, stats, **fetch_options)
+        for mod_id, name in mods:
+            details = details_by_id.get(mod_id, {})
+            updated = details.get("time_updated")
+            updated_text = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(updated)) if updated else "unknown"
+            print(f"{mod_id} - {details.get('title', name)} (updated {updated_text})")
+        print(f"Fetched details of {len(details_by_id)} mods ({stats.get('cache_hits', 0)} from cache, {stats.get('requests', 0)} requests, "
+              f"{len(stats.get('failed_ids', []))} failed).")
+    elif args.mark_translated:
+        marked = mark_translated(args.versions, args.cache)
+        if marked is not None:
+            print(f"Recorded versions of {marked} Workshop mods extracted from {args.versions} as translated.")
+    else:
+        changed_directories, current_versions = changed_mods(args.mods_dir, args.endpoint, args.cache, max_age_seconds=args.max_age, stats=stats, **fetch_options)
+        print(f"{len(changed_directories)} of {len(find_installed_mods(args.mods_dir))} Workshop mods changed since the last translation:")
+        for mod_directory in changed_directories:
+            print(f"  {mod_directory}")